@@ -14,6 +14,7 @@ print("three version " + THREE_VERSION)
 gameDirPathString = None
 mapName = None
 editorMode = False
+infoMode = False
 
 flags = [ ]
 
@@ -24,6 +25,8 @@ if len(sys.argv) > 1:
                 flag = arg[1:]
                 if flag.lower() == "edit":
                     editorMode = True
+                elif flag.lower() == "info":
+                    infoMode = True
                 else:
                     flags.append(arg[1:])
             else:
@@ -42,6 +45,8 @@ if mapName is None:
     print("  - A map name or number")
     print("     (a number will read map names from maps.txt in the game"
         + " directory)")
+    print("Use -edit to open the map in the editor, or -info to list its"
+        + " contents")
     print("See the README")
     exit()
 
@@ -70,6 +75,24 @@ except ValueError: # mapName is not a number
         print("Map", mapName, "not found")
         exit()
 
+if infoMode:
+    # only the table of contents is read, not the whole map
+    contents = files.readMapContents(mapPath)
+    if contents is None:
+        print("Map", mapName, "could not be read")
+        exit()
+    print("File version:",
+          str(contents.majorVersion) + "." + str(contents.minorVersion))
+    print(len(contents.objects), "objects,", contents.numVertices(),
+          "vertices,", contents.numFaces(), "faces")
+    print("Bounds:", contents.getBounds())
+    print("Materials:", ", ".join(contents.materials))
+    for o in contents.objects:
+        print("  {} ({}) at {}, {} faces".format(
+            o.name if o.name != "" else "[Unnamed object]", o.type,
+            o.position, o.numFaces))
+    exit()
+
 state = files.loadMapState(mapPath)
 if editorMode:
     from threelib.appInstance.gl import GLAppInstance
@@ -4,6 +4,9 @@ MANUAL_FRAMERATE_TIMING = False
 
 from threelib.app import AppInterface
 from threelib.app import AppInstance
+from threelib.materials import loadAlbedoTextures, MIPMAP_FILTERS
+from threelib.materials import buildMipmaps
+from threelib.textureAtlas import TextureAtlas, PADDING
 
 import time # for fps
 import threading # for pyautogui mouse movement
@@ -22,6 +25,13 @@ from OpenGL.GLU import *
 
 mouseMovementLock = threading.Lock()
 
+# minifying filters for textures, by their names in config.ini
+TEXTURE_FILTERS = {
+    'nearest': GL_NEAREST,
+    'linear': GL_LINEAR,
+    'trilinear': GL_LINEAR_MIPMAP_LINEAR # requires mipmaps
+}
+
 
 class GLAppInstance(AppInstance):
 
@@ -50,6 +60,12 @@ class GLAppInstance(AppInstance):
         self.fpsCount = 0
         self.fps = 0
 
+        # see setTextureFilter
+        self.textureFilter = 'nearest'
+        self.mipmapFilter = 'box'
+        # see setTextureAtlasSize
+        self.textureAtlas = TextureAtlas()
+
         self.appInterface = appInterface
         appInterface.setAppInstance(self)\
 
@@ -330,14 +346,54 @@ class GLAppInstance(AppInstance):
         for m in world.materials:
             texName = m.getNumber()
             glDeleteTextures([texName])
+        for page in self.textureAtlas.getPages():
+            glDeleteTextures([page.getNumber()])
+        self.textureAtlas.clear()
+
+    def setTextureAtlasSize(self, maxTextureSize):
+        """
+        Pack the textures of materials up to ``maxTextureSize`` pixels wide and
+        tall into a TextureAtlas (see ``getTextureAtlas``), so they can be drawn
+        without binding a texture for each material. 0 disables the atlas. This
+        only applies to materials loaded afterwards.
+        """
+        self.textureAtlas = TextureAtlas(maxTextureSize)
+
+    def getTextureAtlas(self):
+        """
+        Get the TextureAtlas with the textures of loaded materials.
+        """
+        return self.textureAtlas
+
+    def setTextureFilter(self, textureFilter, mipmapFilter='box'):
+        """
+        Set how textures are filtered when they are minified: one of the keys
+        of TEXTURE_FILTERS. For 'trilinear' filtering, mipmaps are built with
+        ``mipmapFilter`` (see ``materials.MIPMAP_FILTERS``). This only applies
+        to materials loaded afterwards.
+        """
+        if textureFilter not in TEXTURE_FILTERS:
+            print("Unknown texture filter:", textureFilter)
+            return
+        if mipmapFilter not in MIPMAP_FILTERS:
+            print("Unknown mipmap filter:", mipmapFilter)
+            return
+        self.textureFilter = textureFilter
+        self.mipmapFilter = mipmapFilter
 
     def updateMaterials(self, world):
         """
         Should be called every loop
         """
-        for m in world.getAddedMaterials():
+        if self.textureFilter == 'trilinear':
+            mipmapFilter = self.mipmapFilter
+        else:
+            mipmapFilter = None
+
+        # textures are decoded on other threads while they are uploaded
+        for m, texture in loadAlbedoTextures(world.getAddedMaterials(),
+                                             mipmapFilter=mipmapFilter):
             m.setLoaded(True)
-            texture = m.loadAlbedoTexture()
             texName = glGenTextures(1)
             m.setNumber(texName)
 
@@ -350,21 +406,48 @@ class GLAppInstance(AppInstance):
             glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER,
                             GL_NEAREST)
             glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER,
-                            GL_NEAREST)
+                            TEXTURE_FILTERS[self.textureFilter])
 
             self.sendTexture(texture)
+            # the material keeps its own texture, for faces which repeat it
+            # too many times to be drawn from the atlas
+            self.textureAtlas.add(m, texture)
 
-        for m in world.getUpdatedMaterials():
+        for m, texture in loadAlbedoTextures(world.getUpdatedMaterials(),
+                                             mipmapFilter=mipmapFilter):
             m.setLoaded(True)
-            texture = m.loadAlbedoTexture()
             texName = m.getNumber()
 
             glBindTexture(GL_TEXTURE_2D, texName)
             self.sendTexture(texture)
+            self.textureAtlas.add(m, texture)
 
         for m in world.getRemovedMaterials():
             texName = m.getNumber()
             glDeleteTextures([texName])
+            self.textureAtlas.remove(m)
+
+        for page in self.textureAtlas.getChangedPages():
+            if page.getNumber() == 0:
+                page.setNumber(glGenTextures(1))
+                glBindTexture(GL_TEXTURE_2D, page.getNumber())
+                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP)
+                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP)
+                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER,
+                                GL_NEAREST)
+                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER,
+                                TEXTURE_FILTERS[self.textureFilter])
+                # smaller mipmaps would blend textures with their neighbors,
+                # past the padding
+                glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL,
+                                PADDING.bit_length() - 1)
+            else:
+                glBindTexture(GL_TEXTURE_2D, page.getNumber())
+            texture = page.getTexture()
+            if mipmapFilter is not None:
+                texture.mipmaps = buildMipmaps(texture, mipmapFilter)[
+                    :PADDING.bit_length() - 1]
+            self.sendTexture(texture)
 
     def sendTexture(self, texture):
         if texture is not None:
@@ -379,8 +462,13 @@ class GLAppInstance(AppInstance):
                 print("Unrecognized texture mode!")
                 return
 
-            glTexImage2D(GL_TEXTURE_2D, 0, glMode, texture.getXLen(),
-                         texture.getYLen(), 0, glMode, GL_UNSIGNED_BYTE,
-                         texture.getData())
+            # rows of pixels aren't padded
+            glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+            # the pixel arrays are passed to OpenGL without copying them
+            # level 0 is the full image, followed by the mipmaps
+            for level, image in enumerate([texture] + texture.getMipmaps()):
+                glTexImage2D(GL_TEXTURE_2D, level, glMode, image.getXLen(),
+                             image.getYLen(), 0, glMode, GL_UNSIGNED_BYTE,
+                             image.getData())
             print("Done sending")
 
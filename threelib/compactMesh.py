@@ -0,0 +1,509 @@
+__author__ = "jacobvanthoog"
+
+import numpy
+from threelib.vectorMath import Vector
+from threelib.mesh import Mesh, MeshVertex, MeshFace, MeshFaceVertex
+from threelib.mesh import calculateNormalArrays, calculateTextureVertexArrays
+from threelib.mesh import textureAspectScale
+
+
+class CompactMesh:
+    """
+    A mesh stored in contiguous NumPy arrays instead of MeshVertex and MeshFace
+    objects. It can be converted to and from a Mesh without losing any
+    information, and is much smaller and faster to iterate over.
+
+    Faces are stored as a flat list of "corners." Each corner is a face vertex:
+    an index into the positions array, and a texture coordinate. The corners of
+    face ``i`` are ``faceOffsets[i]`` up to (not including)
+    ``faceOffsets[i + 1]``.
+
+    The arrays should be treated as read-only.
+    """
+
+    def __init__(self, positions, faceOffsets, faceIndices, textureVertices,
+                 materialIds, materials, textureShifts, textureRotates,
+                 textureScales):
+        """
+        Create a CompactMesh from arrays. Usually you should use ``fromMesh``
+        instead.
+
+        - ``positions``: (numVertices, 3) float array of vertex positions
+        - ``faceOffsets``: (numFaces + 1) int array of the first corner of each
+          face. The last value is the total number of corners.
+        - ``faceIndices``: (numCorners) int array of vertex indices
+        - ``textureVertices``: (numCorners, 3) float array of texture
+          coordinates
+        - ``materialIds``: (numFaces) int array of indices into ``materials``,
+          or -1 for no material
+        - ``materials``: a list of MaterialReferences
+        - ``textureShifts``: (numFaces, 3) float array
+        - ``textureRotates``: (numFaces) float array
+        - ``textureScales``: (numFaces, 3) float array
+        """
+        self.positions = positions
+        self.faceOffsets = faceOffsets
+        self.faceIndices = faceIndices
+        self.textureVertices = textureVertices
+        self.materialIds = materialIds
+        self.materials = materials
+        self.textureShifts = textureShifts
+        self.textureRotates = textureRotates
+        self.textureScales = textureScales
+
+    @staticmethod
+    def fromMesh(mesh, materials=None):
+        """
+        Create a CompactMesh from a Mesh. ``materials`` is an optional list of
+        MaterialReferences to share between multiple CompactMeshes; any new
+        materials used by the mesh are added onto the end of it.
+
+        Vertices used by faces but missing from the mesh's vertex list are added
+        after the other vertices (like ``Mesh.addMissingVertices``).
+        """
+        if materials is None:
+            materials = [ ]
+        materialIndices = {id(m): i for i, m in enumerate(materials)}
+
+        vertices = list(mesh.getVertices())
+        vertexIndices = {id(v): i for i, v in enumerate(vertices)}
+
+        positions = [v.getPosition().getTuple() for v in vertices]
+        faceOffsets = [0]
+        faceIndices = [ ]
+        textureVertices = [ ]
+        materialIds = [ ]
+        textureShifts = [ ]
+        textureRotates = [ ]
+        textureScales = [ ]
+
+        for face in mesh.getFaces():
+            for faceVertex in face.getVertices():
+                vertex = faceVertex.vertex
+                try:
+                    index = vertexIndices[id(vertex)]
+                except KeyError:
+                    index = len(positions)
+                    vertexIndices[id(vertex)] = index
+                    positions.append(vertex.getPosition().getTuple())
+                faceIndices.append(index)
+                textureVertices.append(faceVertex.textureVertex.getTuple())
+            faceOffsets.append(len(faceIndices))
+
+            material = face.getMaterial()
+            if material is None:
+                materialIds.append(-1)
+            else:
+                try:
+                    materialIds.append(materialIndices[id(material)])
+                except KeyError:
+                    materialIndices[id(material)] = len(materials)
+                    materialIds.append(len(materials))
+                    materials.append(material)
+            textureShifts.append(face.textureShift.getTuple())
+            textureRotates.append(face.textureRotate)
+            textureScales.append(face.textureScale.getTuple())
+
+        return CompactMesh(
+            _floatArray(positions, (-1, 3)),
+            numpy.array(faceOffsets, dtype=numpy.int64),
+            numpy.array(faceIndices, dtype=numpy.int64),
+            _floatArray(textureVertices, (-1, 3)),
+            numpy.array(materialIds, dtype=numpy.int64),
+            materials,
+            _floatArray(textureShifts, (-1, 3)),
+            _floatArray(textureRotates, (-1,)),
+            _floatArray(textureScales, (-1, 3)))
+
+    def toMesh(self, addReferences=True):
+        """
+        Create a new Mesh with the same vertices, faces, texture coordinates
+        and materials. Texture vertices are copied exactly, not recalculated.
+        The reference counts of the materials are updated, unless
+        ``addReferences`` is False (for example if the counts were saved with
+        the materials).
+        """
+        mesh = Mesh()
+        vertices = [MeshVertex(Vector(p[0], p[1], p[2]))
+                    for p in self.positions.tolist()]
+        for v in vertices:
+            mesh.addVertex(v)
+
+        faceOffsets = self.faceOffsets.tolist()
+        faceIndices = self.faceIndices.tolist()
+        textureVertices = self.textureVertices.tolist()
+        materialIds = self.materialIds.tolist()
+        textureShifts = self.textureShifts.tolist()
+        textureRotates = self.textureRotates.tolist()
+        textureScales = self.textureScales.tolist()
+
+        for i in range(0, len(materialIds)):
+            face = MeshFace()
+            face.vertices = [
+                MeshFaceVertex(vertex=vertices[faceIndices[c]],
+                               textureVertex=Vector(textureVertices[c][0],
+                                                    textureVertices[c][1],
+                                                    textureVertices[c][2]))
+                for c in range(faceOffsets[i], faceOffsets[i + 1])]
+            if materialIds[i] != -1:
+                # same as setMaterial, without recalculating texture vertices
+                face.material = self.materials[materialIds[i]]
+                if addReferences:
+                    face.material.addReference()
+            shift = textureShifts[i]
+            scale = textureScales[i]
+            face.textureShift = Vector(shift[0], shift[1], shift[2])
+            face.textureRotate = textureRotates[i]
+            face.textureScale = Vector(scale[0], scale[1], scale[2])
+            mesh.addFace(face)
+
+        return mesh
+
+    def clone(self):
+        """
+        Create a copy of this CompactMesh with copies of the arrays. The list of
+        materials is copied, but the MaterialReferences are the same.
+        """
+        return CompactMesh(
+            self.positions.copy(), self.faceOffsets.copy(),
+            self.faceIndices.copy(), self.textureVertices.copy(),
+            self.materialIds.copy(), list(self.materials),
+            self.textureShifts.copy(), self.textureRotates.copy(),
+            self.textureScales.copy())
+
+    def numVertices(self):
+        """
+        Get the number of vertices.
+        """
+        return len(self.positions)
+
+    def numFaces(self):
+        """
+        Get the number of faces.
+        """
+        return len(self.faceOffsets) - 1
+
+    def numCorners(self):
+        """
+        Get the total number of face vertices, for all faces.
+        """
+        return len(self.faceIndices)
+
+    def getPositions(self):
+        """
+        Get a (numVertices, 3) array of vertex positions.
+        """
+        return self.positions
+
+    def getFaceSizes(self):
+        """
+        Get an array of the number of vertices of each face.
+        """
+        return numpy.diff(self.faceOffsets)
+
+    def getFaceIndices(self, face):
+        """
+        Get an array of the vertex indices of the face with the given index,
+        in counterclockwise order. This is a view, not a copy.
+        """
+        return self.faceIndices[self.faceOffsets[face]:
+                                self.faceOffsets[face + 1]]
+
+    def getFacePositions(self, face):
+        """
+        Get a (faceSize, 3) array of the vertex positions of the face with the
+        given index.
+        """
+        return self.positions[self.getFaceIndices(face)]
+
+    def getFaceTextureVertices(self, face):
+        """
+        Get a (faceSize, 3) array of the texture coordinates of the face with
+        the given index. This is a view, not a copy.
+        """
+        return self.textureVertices[self.faceOffsets[face]:
+                                    self.faceOffsets[face + 1]]
+
+    def getFaceMaterial(self, face):
+        """
+        Get the MaterialReference of the face with the given index, or None.
+        """
+        materialId = self.materialIds[face]
+        if materialId == -1:
+            return None
+        return self.materials[materialId]
+
+    def getCornerFaces(self):
+        """
+        Get an array of the face index of every corner.
+        """
+        return numpy.repeat(numpy.arange(self.numFaces()), self.getFaceSizes())
+
+    def getCornerPositions(self):
+        """
+        Get a (numCorners, 3) array of the position of every corner.
+        """
+        return self.positions[self.faceIndices]
+
+    def triangulate(self):
+        """
+        Split every face into a fan of triangles. Return a tuple of 2 arrays: a
+        (numTriangles, 3) array of corner indices (which can index
+        ``faceIndices`` or ``textureVertices``), and a (numTriangles) array of
+        the face index of each triangle. Faces with fewer than 3 vertices are
+        skipped.
+        """
+        sizes = self.getFaceSizes()
+        numTriangles = numpy.maximum(sizes - 2, 0)
+        triangleFaces = numpy.repeat(numpy.arange(self.numFaces()),
+                                     numTriangles)
+        # the index of each triangle within its face
+        triangleStarts = numpy.cumsum(numTriangles) - numTriangles
+        fanIndex = numpy.arange(len(triangleFaces)) \
+            - numpy.repeat(triangleStarts, numTriangles)
+        first = self.faceOffsets[:-1][triangleFaces]
+        triangles = numpy.stack([first, first + fanIndex + 1,
+                                 first + fanIndex + 2], axis=1)
+        return triangles, triangleFaces
+
+    def calculateTextureVertices(self, faces):
+        """
+        Recalculate the texture vertices of the faces with the given indices,
+        like ``MeshFace.calculateTextureVertices`` (within floating point
+        rounding error). Faces with fewer than 3 vertices are unchanged.
+        """
+        faces = numpy.asarray(faces, dtype=numpy.int64)
+        sizes = self.getFaceSizes()[faces]
+        faces = faces[sizes >= 3]
+        sizes = sizes[sizes >= 3]
+        starts = self.faceOffsets[faces]
+        normals = calculateNormalArrays(
+            self.positions[self.faceIndices[starts]],
+            self.positions[self.faceIndices[starts + 1]],
+            self.positions[self.faceIndices[starts + 2]])
+
+        aspectScales = [ ]
+        for material in self.materials:
+            aspectScale = textureAspectScale(material)
+            if aspectScale is None:
+                aspectScale = Vector(1, 1, 1)
+            aspectScales.append(aspectScale.getTuple())
+        aspectScales.append((1.0, 1.0, 1.0)) # for material id -1
+        aspectScales = _floatArray(aspectScales, (-1, 3))
+
+        cornerFaces = numpy.repeat(faces, sizes)
+        corners = _rangeIndices(starts, sizes)
+        self.textureVertices[corners] = calculateTextureVertexArrays(
+            self.positions[self.faceIndices[corners]],
+            numpy.repeat(normals, sizes, axis=0),
+            self.textureShifts[cornerFaces], self.textureRotates[cornerFaces],
+            self.textureScales[cornerFaces],
+            aspectScales[self.materialIds[cornerFaces]])
+
+    def subdivide(self, maxArea):
+        """
+        Split faces into smaller triangles until none are larger than
+        ``maxArea``. Faces larger than ``maxArea`` are first split into a fan
+        of triangles, then each triangle larger than ``maxArea`` is divided in
+        half along its longest edge, repeatedly. Edges that are divided by more
+        than one triangle share the same midpoint vertex. ``maxArea`` can be a
+        number, or an array with a maximum area for each face.
+
+        Return a new CompactMesh. The new triangles replace the face they came
+        from, in the same position in the list of faces, and their texture
+        vertices are recalculated (see ``calculateTextureVertices``). Other
+        faces are copied exactly.
+        """
+        sizes = self.getFaceSizes()
+        splitFaces, positions, doneTriangles, doneFaces = \
+            self._subdivideTriangles(maxArea)
+
+        # group the new triangles by the face they replace
+        order = numpy.argsort(doneFaces, kind='stable')
+        doneTriangles = doneTriangles[order]
+        doneFaces = doneFaces[order]
+
+        keptFaces = numpy.nonzero(~splitFaces)[0]
+        outputFaces = numpy.concatenate([keptFaces, doneFaces])
+        isNew = numpy.concatenate([numpy.zeros(len(keptFaces), dtype=bool),
+                                   numpy.ones(len(doneFaces), dtype=bool)])
+        order = numpy.argsort(outputFaces, kind='stable')
+        outputFaces = outputFaces[order]
+        isNew = isNew[order]
+
+        outputSizes = numpy.where(isNew, 3, sizes[outputFaces])
+        faceOffsets = numpy.zeros(len(outputFaces) + 1, dtype=numpy.int64)
+        numpy.cumsum(outputSizes, out=faceOffsets[1:])
+        faceIndices = numpy.empty(faceOffsets[-1], dtype=numpy.int64)
+        textureVertices = numpy.zeros((faceOffsets[-1], 3))
+
+        newCorners = _rangeIndices(faceOffsets[:-1][isNew], 3)
+        faceIndices[newCorners] = doneTriangles.reshape(-1)
+        keptCorners = _rangeIndices(faceOffsets[:-1][~isNew],
+                                    sizes[keptFaces])
+        oldCorners = _rangeIndices(self.faceOffsets[keptFaces],
+                                   sizes[keptFaces])
+        faceIndices[keptCorners] = self.faceIndices[oldCorners]
+        textureVertices[keptCorners] = self.textureVertices[oldCorners]
+
+        mesh = CompactMesh(
+            positions, faceOffsets, faceIndices, textureVertices,
+            self.materialIds[outputFaces], list(self.materials),
+            self.textureShifts[outputFaces], self.textureRotates[outputFaces],
+            self.textureScales[outputFaces])
+        mesh.calculateTextureVertices(numpy.nonzero(isNew)[0])
+        return mesh
+
+
+    def countTriangles(self, maxArea=None):
+        """
+        Count the triangles that would be drawn for the mesh if every face was
+        split into a fan of triangles. If ``maxArea`` is given, count the
+        triangles the mesh would have after ``subdivide(maxArea)``, without
+        creating it.
+        """
+        numTriangles = numpy.maximum(self.getFaceSizes() - 2, 0)
+        if maxArea is None:
+            return int(numTriangles.sum())
+        splitFaces, positions, doneTriangles, doneFaces = \
+            self._subdivideTriangles(maxArea)
+        return int(numTriangles[~splitFaces].sum()) + len(doneTriangles)
+
+    def estimateTriangles(self, maxArea):
+        """
+        Estimate the triangles the mesh would have after ``subdivide(maxArea)``
+        from the area of each triangle, without subdividing it. Every division
+        halves the area of a triangle, so this only differs from
+        ``countTriangles(maxArea)`` by floating point rounding, but it is much
+        faster.
+        """
+        maxArea = numpy.broadcast_to(
+            numpy.asarray(maxArea, dtype=numpy.float64), (self.numFaces(),))
+        triangles, triangleFaces = self.triangulate()
+        areas = _triangleAreas(self.positions, self.faceIndices[triangles])[0]
+        faceAreas = numpy.bincount(triangleFaces, areas,
+                                   minlength=self.numFaces())
+        splitFaces = faceAreas > maxArea
+        with numpy.errstate(divide='ignore'):
+            divisions = numpy.ceil(numpy.log2(
+                areas / maxArea[triangleFaces]))
+        divisions = numpy.where(splitFaces[triangleFaces],
+                                numpy.maximum(divisions, 0), 0)
+        return int((2 ** divisions.astype(numpy.int64)).sum())
+
+    def _subdivideTriangles(self, maxArea):
+        # the triangles of subdivide(). Return a tuple of a boolean array of
+        # which faces are split, the new positions array, an array of the
+        # vertex indices of every new triangle, and an array of the face each
+        # triangle came from.
+        positions = self.positions
+        numFaces = self.numFaces()
+        maxArea = numpy.broadcast_to(
+            numpy.asarray(maxArea, dtype=numpy.float64), (numFaces,))
+
+        triangles, triangleFaces = self.triangulate()
+        triangles = self.faceIndices[triangles]
+        faceAreas = numpy.bincount(
+            triangleFaces, _triangleAreas(positions, triangles)[0],
+            minlength=numFaces)
+        splitFaces = faceAreas > maxArea
+        queued = splitFaces[triangleFaces]
+        triangles = triangles[queued]
+        triangleFaces = triangleFaces[queued]
+
+        # every edge that has been divided, as a sorted array of keys, and the
+        # index of its midpoint vertex
+        edgeKeys = numpy.zeros(0, dtype=numpy.int64)
+        edgeMidpoints = numpy.zeros(0, dtype=numpy.int64)
+        newPositions = [positions]
+        numVertices = len(positions)
+        doneTriangles = [numpy.zeros((0, 3), dtype=numpy.int64)]
+        doneFaces = [numpy.zeros(0, dtype=numpy.int64)]
+
+        while len(triangles) != 0:
+            areas, dist1, dist2, dist3 = _triangleAreas(positions, triangles)
+            done = ~(areas > maxArea[triangleFaces])
+            doneTriangles.append(triangles[done])
+            doneFaces.append(triangleFaces[done])
+            split = ~done
+            triangles = triangles[split]
+            triangleFaces = triangleFaces[split]
+            dist1 = dist1[split]
+            dist2 = dist2[split]
+            dist3 = dist3[split]
+
+            # divide each triangle along the longest edge, with the same
+            # preference as subdivideMeshFace when edges are equal
+            v1, v2, v3 = triangles.T
+            case1 = (dist1 >= dist2) & (dist1 >= dist3)
+            case2 = ~case1 & (dist2 >= dist1) & (dist2 >= dist3)
+            case3 = ~(case1 | case2)
+            edgeStart = numpy.where(case1, v2, v1)
+            edgeEnd = numpy.where(case3, v2, v3)
+            low = numpy.minimum(edgeStart, edgeEnd)
+            high = numpy.maximum(edgeStart, edgeEnd)
+
+            keys, inverse = numpy.unique((low << 32) | high,
+                                         return_inverse=True)
+            found = numpy.searchsorted(edgeKeys, keys)
+            exists = found < len(edgeKeys)
+            exists[exists] = edgeKeys[found[exists]] == keys[exists]
+            midpoints = numpy.empty(len(keys), dtype=numpy.int64)
+            midpoints[exists] = edgeMidpoints[found[exists]]
+            addedKeys = keys[~exists]
+            addedMidpoints = numpy.arange(numVertices,
+                                          numVertices + len(addedKeys))
+            midpoints[~exists] = addedMidpoints
+            numVertices += len(addedKeys)
+
+            # Vector.lerp(v, .5)
+            start = positions[addedKeys >> 32]
+            end = positions[addedKeys & 0xffffffff]
+            newPositions.append(start + (end - start) * .5)
+            positions = numpy.concatenate(newPositions)
+            newPositions = [positions]
+
+            edgeKeys = numpy.concatenate([edgeKeys, addedKeys])
+            edgeMidpoints = numpy.concatenate([edgeMidpoints, addedMidpoints])
+            order = numpy.argsort(edgeKeys, kind='stable')
+            edgeKeys = edgeKeys[order]
+            edgeMidpoints = edgeMidpoints[order]
+
+            m = midpoints[inverse.reshape(-1)]
+            first = numpy.stack([v1, numpy.where(case3, m, v2),
+                                 numpy.where(case3, v3, m)], axis=1)
+            second = numpy.stack([numpy.where(case1, v1, m),
+                                  numpy.where(case1, m, v2), v3], axis=1)
+            triangles = numpy.concatenate([first, second])
+            triangleFaces = numpy.concatenate([triangleFaces, triangleFaces])
+
+        return (splitFaces, positions, numpy.concatenate(doneTriangles),
+                numpy.concatenate(doneFaces))
+
+def _triangleAreas(positions, triangles):
+    # Heron's formula, like MeshFace.getArea(). Return a tuple of the areas and
+    # the 3 edge lengths.
+    p1 = positions[triangles[:, 0]]
+    p2 = positions[triangles[:, 1]]
+    p3 = positions[triangles[:, 2]]
+    dist1 = _magnitudes(p2 - p3)
+    dist2 = _magnitudes(p1 - p3)
+    dist3 = _magnitudes(p1 - p2)
+    s = (dist1 + dist2 + dist3) / 2
+    areas = numpy.sqrt(numpy.maximum(
+        s * (s - dist1) * (s - dist2) * (s - dist3), 0.0))
+    return areas, dist1, dist2, dist3
+
+def _magnitudes(vectors):
+    return numpy.sqrt(vectors[:, 0] ** 2.0 + vectors[:, 1] ** 2.0
+                      + vectors[:, 2] ** 2.0)
+
+def _rangeIndices(starts, sizes):
+    # concatenated ranges of indices: starts[i] up to starts[i] + sizes[i]
+    sizes = numpy.broadcast_to(sizes, starts.shape)
+    total = int(sizes.sum())
+    rangeStarts = numpy.cumsum(sizes) - sizes
+    return numpy.arange(total) - numpy.repeat(rangeStarts - starts, sizes)
+
+def _floatArray(values, shape):
+    return numpy.array(values, dtype=numpy.float64).reshape(shape)
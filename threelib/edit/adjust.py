@@ -4,7 +4,7 @@ import math
 from threelib.vectorMath import Vector
 from threelib.vectorMath import Rotate
 from threelib.edit.state import Adjustor
-# used by ExtrudeAdjustor:
+# used by ExtrudeAdjustor and for batching mesh edits:
 from threelib.mesh import *
 from threelib.edit.objects import MeshObject
 
@@ -100,10 +100,11 @@ class MultiTranslateAdjustor(Adjustor):
 
     def setAxes(self, values):
         self.average = Vector.fromTuple(values)
-        i = 0
-        for a in self.adjustors:
-            a.setAxes((self.average + self.offsets[i]).getTuple())
-            i += 1
+        with MeshEditBatch():
+            i = 0
+            for a in self.adjustors:
+                a.setAxes((self.average + self.offsets[i]).getTuple())
+                i += 1
 
     def gridType(self):
         return Adjustor.TRANSLATE
@@ -195,14 +196,15 @@ class MultiRotateAdjustor(Adjustor):
         diff = newRotate - self.currentRotate
         self.currentRotate = newRotate
 
-        for i in range(0, len(self.translators)):
-            offset = self.offsets[i]
-            offset = offset.rotate(self.currentRotate)
-            self.translators[i].setAxes((offset + self.average).getTuple())
-            rotate = Rotate.fromTuple(
-                tupleToRadians(self.rotators[i].getAxes()))
-            rotate += diff
-            self.rotators[i].setAxes(tupleToDegrees(rotate.getTuple()))
+        with MeshEditBatch():
+            for i in range(0, len(self.translators)):
+                offset = self.offsets[i]
+                offset = offset.rotate(self.currentRotate)
+                self.translators[i].setAxes((offset + self.average).getTuple())
+                rotate = Rotate.fromTuple(
+                    tupleToRadians(self.rotators[i].getAxes()))
+                rotate += diff
+                self.rotators[i].setAxes(tupleToDegrees(rotate.getTuple()))
 
     def gridType(self):
         return Adjustor.ROTATE
@@ -306,10 +308,12 @@ class MultiVertexScaleAdjustor(Adjustor):
             v = v.setY(self.scale.y)
         if v.z <= 0:
             v = v.setZ(self.scale.z)
-        for vertex in self.vertices:
-            pos = vertex.getPosition()
-            pos = (pos - self.originPoint) * (v / self.scale) + self.originPoint
-            vertex.setPosition(pos)
+        with MeshEditBatch():
+            for vertex in self.vertices:
+                pos = vertex.getPosition()
+                pos = (pos - self.originPoint) * (v / self.scale) \
+                    + self.originPoint
+                vertex.setPosition(pos)
         self.scale = v
 
     def gridType(self):
@@ -574,7 +578,7 @@ class MaterialTranslateAdjustor(Adjustor):
 
         for face in self.faces:
             face.textureShift += diff
-            face.calculateTextureVertices()
+        calculateFacesTextureVertices(self.faces)
 
     def gridType(self):
         return Adjustor.TRANSLATE
@@ -599,7 +603,7 @@ class MaterialRotateAdjustor(Adjustor):
 
         for face in self.faces:
             face.textureRotate += math.radians(diff)
-            face.calculateTextureVertices()
+        calculateFacesTextureVertices(self.faces)
 
     def gridType(self):
         return Adjustor.ROTATE
@@ -630,7 +634,7 @@ class MaterialScaleAdjustor(Adjustor):
 
         for face in self.faces:
             face.textureScale *= factor
-            face.calculateTextureVertices()
+        calculateFacesTextureVertices(self.faces)
 
     def gridType(self):
         return Adjustor.SCALE
@@ -12,6 +12,7 @@ import threelib.vectorMath as vectorMath
 from threelib.app import AppInterface
 from threelib.edit.toolbar import *
 from threelib import files
+from threelib import mapCompression
 
 MATH_SYMBOLS = ['.', '+', '-', '*', '/', '(', ')']
 
@@ -41,6 +42,18 @@ class EditorInterface(EditorActions, AppInterface):
         builtins.print = self._printToStatusBar
 
         self.gameConfig = files.readGameConfig()
+        if 'editor' in self.gameConfig:
+            if 'autosave' in self.gameConfig['editor']:
+                self.saver.autosaveInterval = \
+                    float(self.gameConfig['editor']['autosave'])
+            if 'compression' in self.gameConfig['editor']:
+                codec = self.gameConfig['editor']['compression']
+                if codec == "none":
+                    self.journal.codec = None
+                elif codec in mapCompression.codecs:
+                    self.journal.codec = codec
+                else:
+                    print("Unknown compression codec:", codec)
 
     def _printToStatusBar(self, *args, **kwargs):
         self.printMessage = ' '.join([str(a) for a in args])
@@ -767,6 +780,10 @@ class EditorInterface(EditorActions, AppInterface):
     def getStatusBar(self):
         text = ""
 
+        saveStatus = self.saver.getStatus()
+        if saveStatus != "":
+            text += saveStatus + " | "
+
         if self.inAdjustMode:
             if self.movingCamera:
                 text += "Fly | "
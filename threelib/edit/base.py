@@ -273,6 +273,13 @@ class EditorObject:
         """
         pass
 
+    def isStatic(self):
+        """
+        Check if the representation of this object in the world will never
+        move. Override this; the default is False.
+        """
+        return False
+
 
 class WorldObject(EditorObject):
 
@@ -436,30 +443,7 @@ class MeshObject(EditorObject):
         return self.rotation
 
     def getBounds(self):
-        if len(self.mesh.getVertices()) == 0:
-            return Vector(0, 0, 0), Vector(0, 0, 0)
-        firstVertexPos = self.mesh.getVertices()[0].getPosition()
-        lowX = firstVertexPos.x
-        lowY = firstVertexPos.y
-        lowZ = firstVertexPos.z
-        highX = firstVertexPos.x
-        highY = firstVertexPos.y
-        highZ = firstVertexPos.z
-        for v in self.mesh.getVertices():
-            pos = v.getPosition()
-            if pos.x < lowX:
-                lowX = pos.x
-            if pos.x > highX:
-                highX = pos.x
-            if pos.y < lowY:
-                lowY = pos.y
-            if pos.y > highY:
-                highY = pos.y
-            if pos.z < lowZ:
-                lowZ = pos.z
-            if pos.z > highZ:
-                highZ = pos.z
-        return Vector(lowX, lowY, lowZ), Vector(highX, highY, highZ)
+        return self.mesh.getBounds()
 
     def setPosition(self, position):
         self.position = position
@@ -468,13 +452,18 @@ class MeshObject(EditorObject):
         self.rotation = rotation
 
     def applyRotation(self):
-        for v in self.mesh.getVertices():
-            v.setPosition(v.getPosition().rotate(self.rotation))
+        with MeshEditBatch():
+            vertices = self.mesh.getVertices()
+            positions = self.rotation.rotateVectors(
+                [v.getPosition() for v in vertices])
+            for v, position in zip(vertices, positions):
+                v.setPosition(position)
         self.rotation = Rotate(0, 0, 0)
 
     def scale(self, factor):
-        for v in self.mesh.getVertices():
-            v.setPosition(v.getPosition() * factor)
+        with MeshEditBatch():
+            for v in self.mesh.getVertices():
+                v.setPosition(v.getPosition() * factor)
 
     def getMesh(self):
         return self.mesh
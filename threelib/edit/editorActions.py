@@ -12,6 +12,8 @@ from threelib.materials import MaterialReference
 from threelib.edit.modelFile.load import loadModel
 
 from threelib import files
+from threelib.edit.journal import EditJournal
+from threelib.edit.mapSaver import MapSaver
 
 class EditorActions:
 
@@ -29,6 +31,10 @@ class EditorActions:
         else:
             self.state = state
         self.mapPath = mapPath
+        # saves only the changed objects
+        self.journal = EditJournal(mapPath, self.state)
+        # writes saves on a worker thread
+        self.saver = MapSaver(self.journal)
 
         self.movingCamera = False
         self.lookSpeed = .005
@@ -66,9 +72,7 @@ class EditorActions:
             self.adjustor = None
 
     def saveFile(self):
-        print("Saving map... ", end="")
-        files.saveMapState(self.mapPath, self.state)
-        print("Done")
+        self.saver.save()
 
     def editPropertiesOfSelected(self):
         if not self.state.selectMode == EditorState.SELECT_OBJECTS:
@@ -315,22 +319,18 @@ class EditorActions:
         mapPath = files.getMap(name, createIfNotFound=False)
         if mapPath is None:
             print("Could not find map", name)
-        map = files.loadMapState(mapPath)
+            return
+        # meshes are only decoded when they are first used, and faces use the
+        # materials that already exist in this map
+        map = files.loadMapState(mapPath, lazy=True, materials={
+            mat.getName(): mat for mat in self.state.world.materials})
         if map is None:
             print("Could not load map", name)
             return
 
-        for o in map.objects:
-            if o.getMesh() is None:
-                continue
-            for face in o.getMesh().getFaces():
-                mat = face.getMaterial()
-                if not mat in self.state.world.materials:
-                    foundMaterial = self.state.world.findMaterial(mat.getName())
-                    if foundMaterial is not None:
-                        face.setMaterial(foundMaterial)
-                    else:
-                        self.state.world.addMaterial(mat)
+        for mat in map.world.materials:
+            if not mat in self.state.world.materials:
+                self.state.world.addMaterial(mat)
 
         self.createObjects(map.objects)
 
@@ -686,14 +686,14 @@ class EditorActions:
             v2 = self.state.selectedVertices[1].vertex
             mesh = self.state.selectedVertices[0].editorObject.getMesh()
 
-            # faces that have both vertices
-            faces = self.findSharedFaces(v1, v2)
+            # faces that have an edge between the vertices
+            faces = mesh.getEdgeIndex().getEdgeFaces(v1, v2)
 
             if len(faces) < 2:
                 print("Please select the 2 vertices of an edge.")
                 return
             if len(faces) > 2:
-                print("WARNING: " + len(faces) + " have these vertices!")
+                print("WARNING: " + str(len(faces)) + " have this edge!")
                 print("This should never happen.")
                 # continue and hope it works
 
@@ -828,8 +828,8 @@ class EditorActions:
             v2 = self.state.selectedVertices[1].vertex
             mesh = self.state.selectedVertices[0].editorObject.getMesh()
 
-            # faces that have both vertices
-            faces = self.findSharedFaces(v1, v2)
+            # faces that have an edge between the vertices
+            faces = mesh.getEdgeIndex().getEdgeFaces(v1, v2)
 
             if len(faces) != 2:
                 print("The vertices of an edge dividing 2 faces must be "
@@ -870,17 +870,7 @@ class EditorActions:
 
     # find faces that have both vertices
     def findSharedFaces(self, v1, v2):
-        faces = list(v1.getReferences())
-
-        faces2 = v2.getReferences()
-        remove = [ ]
-        for face in faces:
-            if face not in faces2:
-                remove.append(face)
-        for face in remove:
-            faces.remove(face)
-
-        return faces
+        return [face for face in v1.getReferences() if v2.hasReference(face)]
 
 
     def clip(self):
@@ -937,7 +927,7 @@ class EditorActions:
 
         # pairs of vectors representing edges that have been created by clipping
         # faces. these edges will be used to create new faces
-        newFaceEdges = [ ]
+        newFaceEdges = PositionEdgeSet()
 
         facesToRemove = [ ]
 
@@ -987,7 +977,7 @@ class EditorActions:
                        vertexLocations[i-1] == ON_PLANE:
                         edge = (face.getVertices()[i].vertex.getPosition(),
                                 face.getVertices()[i-1].vertex.getPosition())
-                        self.addUniqueEdge(edge, newFaceEdges)
+                        newFaceEdges.add(edge)
                 # don't continue; clip as normal
 
             if not hasInside: # all vertices are OUTISDE or ON_PLANE
@@ -1084,7 +1074,7 @@ class EditorActions:
 
                 edge = ( newVertices[0].getPosition(),
                          newVertices[1].getPosition() )
-                self.addUniqueEdge(edge, newFaceEdges)
+                newFaceEdges.add(edge)
 
                 verticesToRemove = [ ]
                 i = 0
@@ -1110,32 +1100,25 @@ class EditorActions:
         # construct new faces from all of the edges that have been created
         while not len(newFaceEdges) == 0:
             newFace = mesh.addFace()
-            firstVertex = mesh.addVertex(MeshVertex(newFaceEdges[0][0]))
+            firstEdge = newFaceEdges.popFirst()
+            firstVertex = mesh.addVertex(MeshVertex(firstEdge[0]))
             newFace.addVertex(firstVertex)
-            prevVertex = MeshVertex(newFaceEdges[0][1])
-            del newFaceEdges[0]
+            prevVertex = MeshVertex(firstEdge[1])
 
             while not firstVertex.getPosition().isClose(
                     prevVertex.getPosition()):
                 mesh.addVertex(prevVertex)
                 newFace.addVertex(prevVertex)
-                foundEdge = None
-                for edge in newFaceEdges:
-                    if edge[0].isClose(prevVertex.getPosition()):
-                        prevVertex = MeshVertex(edge[1])
-                        foundEdge = edge
-                        break
-                    elif edge[1].isClose(prevVertex.getPosition()):
-                        prevVertex = MeshVertex(edge[0])
-                        foundEdge = edge
-                        break
+                foundEdge = newFaceEdges.popConnected(prevVertex.getPosition())
                 if foundEdge is None:
                     print("WARNING: Cannot complete face!",
                           len(newFace.getVertices()), "vertices so far.")
                     print("Vertices: ", str(newFace.getVertices()))
                     break
+                elif foundEdge[0].isClose(prevVertex.getPosition()):
+                    prevVertex = MeshVertex(foundEdge[1])
                 else:
-                    newFaceEdges.remove(foundEdge)
+                    prevVertex = MeshVertex(foundEdge[0])
 
             if len(newFace.getVertices()) < 3:
                 print("WARNING: Invalid face!")
@@ -1201,19 +1184,6 @@ class EditorActions:
             print("Objects must be selected")
 
 
-    # add the edge to the list only if it hasn't already been added
-    # check for reverse order of vertices
-    def addUniqueEdge(self, edge, edgeList):
-        for existingEdge in edgeList:
-            if existingEdge[0].isClose(edge[0]) and \
-               existingEdge[1].isClose(edge[1]):
-                return
-            if existingEdge[0].isClose(edge[1]) and \
-               existingEdge[1].isClose(edge[0]):
-                return
-        edgeList.append(edge)
-
-
     # ADJUST MODE ACTIONS:
 
     def selectAdjustAxis(self, axis):
@@ -106,3 +106,50 @@ def convert_1_8_to_1_9(state):
     state.MAJOR_VERSION = 1
     state.MINOR_VERSION = 9
     return state
+
+@editorStateConverter(1, 9)
+def convert_1_9_to_1_10(state):
+    # MeshVertex references changed from a list to a dict
+    for o in state.objects:
+        if o.getMesh() is not None:
+            mesh = o.getMesh()
+            vertices = list(mesh.getVertices())
+            for face in mesh.getFaces():
+                for vertex in face.getVertices():
+                    vertices.append(vertex.vertex)
+            for v in vertices:
+                if isinstance(v.references, list):
+                    v.references = dict.fromkeys(v.references)
+
+    state.MAJOR_VERSION = 1
+    state.MINOR_VERSION = 10
+    return state
+
+@editorStateConverter(1, 10)
+def convert_1_10_to_1_11(state):
+    # MeshFaces keep track of their Mesh
+    for o in state.objects:
+        if o.getMesh() is not None:
+            mesh = o.getMesh()
+            for face in mesh.getFaces():
+                face.mesh = mesh
+
+    state.MAJOR_VERSION = 1
+    state.MINOR_VERSION = 11
+    return state
+
+@editorStateConverter(1, 11)
+def convert_1_11_to_1_12(state):
+    # MeshVertex's keep track of their Mesh
+    for o in state.objects:
+        if o.getMesh() is not None:
+            mesh = o.getMesh()
+            for face in mesh.getFaces():
+                for vertex in face.getVertices():
+                    vertex.vertex.mesh = None
+            for v in mesh.getVertices():
+                v.mesh = mesh
+
+    state.MAJOR_VERSION = 1
+    state.MINOR_VERSION = 12
+    return state
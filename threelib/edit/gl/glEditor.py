@@ -61,8 +61,25 @@ class GLEditor(EditorInterface):
             if 'farclip' in self.gameConfig['camera']:
                 self.farClip = float(self.gameConfig['camera']['farclip'])
 
+        self.textureFilter = 'nearest'
+        self.mipmapFilter = 'box'
+        self.atlasTextureSize = 0
+        if 'graphics' in self.gameConfig:
+            if 'texturefilter' in self.gameConfig['graphics']:
+                self.textureFilter = \
+                    self.gameConfig['graphics']['texturefilter']
+            if 'mipmapfilter' in self.gameConfig['graphics']:
+                self.mipmapFilter = \
+                    self.gameConfig['graphics']['mipmapfilter']
+            if 'atlastexturesize' in self.gameConfig['graphics']:
+                self.atlasTextureSize = \
+                    int(self.gameConfig['graphics']['atlastexturesize'])
+
     def init(self):
         self._fullscreenMessage("Loading...")
+        self.editorMain.setTextureFilter(self.textureFilter, self.mipmapFilter)
+        self.editorMain.setTextureAtlasSize(self.atlasTextureSize)
+        self.graphicsTools.setTextureAtlas(self.editorMain.getTextureAtlas())
         self._resetProjection()
 
         glPolygonStipple(stipplePattern)
@@ -117,6 +134,7 @@ class GLEditor(EditorInterface):
         glMatrixMode(GL_MODELVIEW)
 
     def draw(self):
+        self.saver.update()
         self.editorMain.updateMaterials(self.state.world)
 
         glLoadIdentity() # reset the view
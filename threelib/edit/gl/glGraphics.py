@@ -1,6 +1,7 @@
 __author__ = "jacobvanthoog"
 
 from threelib.edit.graphics import GraphicsTools
+from threelib.textureAtlas import batchFaces
 
 import OpenGL
 OpenGL.ERROR_CHECKING = False
@@ -9,6 +10,15 @@ from OpenGL.GLU import *
 
 class GLGraphicsTools(GraphicsTools):
 
+    def __init__(self):
+        self.textureAtlas = None
+
+    def setTextureAtlas(self, textureAtlas):
+        """
+        Draw meshes with textures from a TextureAtlas where possible.
+        """
+        self.textureAtlas = textureAtlas
+
     def drawPoint(self, position, color, size):
         glColor(color[0], color[1], color[2])
         glPointSize(size)
@@ -18,25 +28,24 @@ class GLGraphicsTools(GraphicsTools):
 
     def drawMesh(self, mesh):
         glColor(0.8, 0.8, 0.8)
-        currentMat = None
         glDisable(GL_TEXTURE_2D)
-        for f in mesh.getFaces():
-            faceMat = f.getMaterial()
-            if faceMat is not currentMat:
-                if faceMat is None or not faceMat.isLoaded():
-                    glDisable(GL_TEXTURE_2D)
-                else:
-                    glEnable(GL_TEXTURE_2D)
-                    glBindTexture(GL_TEXTURE_2D, faceMat.getNumber())
-                currentMat = faceMat
-
-            glBegin(GL_POLYGON)
-            for v in f.getVertices():
-                pos = v.vertex.getPosition()
-                texPos = v.textureVertex
-                glTexCoord(texPos.x, texPos.y)
-                glVertex(pos.y, pos.z, pos.x)
-            glEnd()
+        # faces are drawn in groups which use the same texture. Meshes are
+        # drawn every frame in the editor, so faces aren't split to use the
+        # atlas; only faces inside one repetition of their texture use it.
+        for texture, polygons in batchFaces(mesh.getFaces(), self.textureAtlas,
+                                            maxPieces=1):
+            if texture is None:
+                glDisable(GL_TEXTURE_2D)
+            else:
+                glEnable(GL_TEXTURE_2D)
+                glBindTexture(GL_TEXTURE_2D, texture.getNumber())
+
+            for f, polygon in polygons:
+                glBegin(GL_POLYGON)
+                for pos, texPos in polygon:
+                    glTexCoord(texPos[0], texPos[1])
+                    glVertex(pos.y, pos.z, pos.x)
+                glEnd()
         glDisable(GL_TEXTURE_2D)
 
     def drawMeshSelectHull(self, mesh, color):
@@ -0,0 +1,413 @@
+__author__ = "jacobvanthoog"
+
+import os
+import struct
+import zlib
+import pickle
+import threelib.files
+from threelib import mapFile
+from threelib.mesh import Mesh
+from threelib.vectorMath import Vector, Rotate
+from threelib.world import Resource
+from threelib.edit.base import EditorObject
+
+# A journal is an append-only file next to a map, which records the changes
+# made since the map was last saved completely. This makes saving large maps
+# fast: only the objects that changed are written. When the map is loaded the
+# changes are applied again (see ``replay``), which also recovers the changes
+# if the editor crashed before the journal was compacted into the map.
+#
+# Objects are identified by a "key": objects in the map file have their index
+# in the list of objects as their key; new objects are numbered after them.
+#
+# The journal file starts with a header:
+#
+#     8 bytes     MAGIC
+#     uint32      FORMAT_VERSION
+#     uint64      size of the map file the journal applies to
+#     uint64      modification time of the map file, in nanoseconds
+#
+# followed by records:
+#
+#     uint32      size of the data
+#     uint32      CRC-32 of the data
+#     data        a map fragment (see ``mapFile.dumpFragment``) of a tuple,
+#                 one of:
+#                 ('object', key, class, attributes)
+#                 ('remove', key)
+#                 ('state', attributes, worldObject, materials, keys)
+#
+# A record that is incomplete or doesn't match its CRC (because the editor
+# crashed while writing it) ends the journal.
+
+MAGIC = b'THREEJNL'
+FORMAT_VERSION = 1
+
+# the journal is compacted into the map file when it grows larger than this
+# fraction of the map file size...
+COMPACT_RATIO = 0.5
+# ...or has more than this many records
+COMPACT_RECORDS = 1000
+
+_HEADER = struct.Struct('<8sIQQ')
+_RECORD = struct.Struct('<II')
+
+# attributes of EditorState which aren't saved in a 'state' record
+_STATE_EXCLUDE = {'objects', 'selectedObjects', 'selectedFaces',
+                  'selectedVertices', 'world', 'worldObject'}
+
+
+def journalPath(mapPath):
+    """
+    Get the Path to the journal file for a map Path.
+    """
+    return mapPath.with_name(mapPath.name + ".journal")
+
+
+class EditJournal:
+    """
+    Saves the changes to an EditorState by appending them to a journal file,
+    and occasionally compacts the journal by saving the whole map.
+    """
+
+    def __init__(self, mapPath, state):
+        """
+        Create a journal for the map file at ``mapPath``, which was loaded as
+        ``state``. If the map already has a journal, it is compacted on the
+        first save.
+        """
+        self.mapPath = mapPath
+        self.path = journalPath(mapPath)
+        self.state = state
+        self.mapSize = _fileSize(mapPath)
+        self.journalSize = _fileSize(self.path)
+        self.needsCompaction = self.path.exists() or self.mapSize == 0
+        self.numRecords = 0
+        # name of the compression codec for the map file (see mapCompression)
+        self.codec = None
+        # meshes are only converted again for compaction if they've changed
+        self.meshCache = mapFile.MeshCache()
+        self._resetKeys()
+
+    def save(self):
+        """
+        Save the changes since the last save. Usually only the changed objects
+        are appended to the journal; if the journal has grown too large, the
+        whole map is saved instead.
+        """
+        write = self.prepareSave()
+        if write is not None:
+            self._write(write)
+
+    def compact(self):
+        """
+        Save the whole map, and delete the journal.
+        """
+        self._write(self.prepareCompaction())
+
+    def prepareSave(self):
+        """
+        Take a snapshot of the changes since the last save, like ``save``, but
+        don't write them yet. Return a function which writes them, or None if
+        nothing has changed. The function doesn't use the EditorState or
+        change the journal, so it can be called on another thread while the
+        state keeps changing, but the functions must be called in the order
+        they were prepared. It takes an optional ``progress`` function (see
+        ``MapSnapshot.write``), and returns a value to pass to
+        ``writeFinished``. If it fails, ``writeFailed`` must be called, and
+        the functions prepared after it must not be called.
+        """
+        # the sizes are updated after writing, so they may be one save behind
+        if self.needsCompaction or self.numRecords > COMPACT_RECORDS \
+                or self.journalSize > self.mapSize * COMPACT_RATIO:
+            return self.prepareCompaction()
+
+        records = [ ]
+        currentKeys = [ ]
+        for o in self.state.objects:
+            key = self.keys.get(o)
+            if key is None:
+                key = self.nextKey
+                self.nextKey += 1
+                self.keys[o] = key
+            currentKeys.append(key)
+        for o, key in zip(self.state.objects, currentKeys):
+            fingerprint = self._objectFingerprint(o)
+            if self.fingerprints.get(key) != fingerprint:
+                records.append(('object', key, type(o), self._attributes(o)))
+                self.fingerprints[key] = fingerprint
+        removedKeys = set(self.fingerprints.keys()).difference(currentKeys)
+        for key in sorted(removedKeys):
+            records.append(('remove', key))
+            del self.fingerprints[key]
+        for o in [o for o, key in self.keys.items() if key in removedKeys]:
+            del self.keys[o]
+        stateFingerprint = self._stateFingerprint(currentKeys)
+        if stateFingerprint != self.stateFingerprint:
+            records.append(('state', _stateAttributes(self.state),
+                            self.state.worldObject,
+                            self.state.world.materials, currentKeys))
+            self.stateFingerprint = stateFingerprint
+
+        if len(records) == 0:
+            return None
+        snapshots = [mapFile.MapSnapshot(record, self._persistentId,
+                                         self.meshCache)
+                     for record in records]
+        self.numRecords += len(records)
+
+        mapPath = self.mapPath
+
+        def append(progress=None):
+            journalSize = self._append(snapshots, progress)
+            return (_fileSize(mapPath), journalSize)
+        return append
+
+    def prepareCompaction(self):
+        """
+        Take a snapshot of the whole map, like ``compact``. Return a function
+        which writes it, like ``prepareSave``.
+        """
+        snapshot = mapFile.MapSnapshot(self.state, meshCache=self.meshCache,
+                                       contents=True)
+        codec = self.codec
+        self.meshCache.forgetUnused()
+        self.needsCompaction = False
+        self.numRecords = 0
+        self._resetKeys()
+
+        mapPath = self.mapPath
+        path = self.path
+
+        def compact(progress=None):
+            threelib.files.writeMapSnapshot(mapPath, snapshot, progress, codec)
+            if path.exists():
+                path.unlink()
+            return (_fileSize(mapPath), 0)
+        return compact
+
+    def writeFinished(self, sizes):
+        """
+        Update the journal after a function from ``prepareSave`` has finished,
+        with the value it returned.
+        """
+        self.mapSize, self.journalSize = sizes
+
+    def writeFailed(self):
+        """
+        Update the journal after a function from ``prepareSave`` has failed.
+        """
+        # the records are lost, so save everything next time
+        self.needsCompaction = True
+
+    def _write(self, write):
+        try:
+            sizes = write()
+        except BaseException:
+            self.writeFailed()
+            raise
+        self.writeFinished(sizes)
+
+    def _resetKeys(self):
+        # the map file has been saved (or loaded) completely
+        self.keys = {o: i for i, o in enumerate(self.state.objects)}
+        self.nextKey = len(self.state.objects)
+        self.fingerprints = {i: self._objectFingerprint(o)
+                             for i, o in enumerate(self.state.objects)}
+        self.stateFingerprint = self._stateFingerprint(
+            list(range(0, len(self.state.objects))))
+
+    def _append(self, snapshots, progress=None):
+        data = [ ]
+        for i, snapshot in enumerate(snapshots):
+            fragment = snapshot.toBytes()
+            data.append(_RECORD.pack(len(fragment), zlib.crc32(fragment)))
+            data.append(fragment)
+            if progress is not None:
+                progress((i + 1) / len(snapshots))
+        if not self.path.exists():
+            stat = self.mapPath.stat()
+            data.insert(0, _HEADER.pack(MAGIC, FORMAT_VERSION, stat.st_size,
+                                        stat.st_mtime_ns))
+        with self.path.open('ab') as f:
+            f.write(b''.join(data))
+            f.flush()
+            os.fsync(f.fileno())
+            return f.tell()
+
+    def _persistentId(self, obj):
+        # other objects are referred to by their key
+        if isinstance(obj, EditorObject):
+            key = self.keys.get(obj)
+            if key is not None:
+                return key
+        return None
+
+    def _attributes(self, editorObject):
+        return dict(editorObject.__dict__)
+
+    def _objectFingerprint(self, editorObject):
+        return _fingerprint(
+            [(name, value) for name, value in editorObject.__dict__.items()
+             if name != 'selected'], self.keys)
+
+    def _stateFingerprint(self, keys):
+        return (_fingerprint(_stateAttributes(self.state), self.keys),
+                _fingerprint(self.state.worldObject.__dict__, self.keys),
+                tuple(id(m) for m in self.state.world.materials),
+                tuple(keys))
+
+
+def _fileSize(path):
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+def _stateAttributes(state):
+    return {name: value for name, value in state.__dict__.items()
+            if name not in _STATE_EXCLUDE}
+
+def _fingerprint(value, keys):
+    # a value which changes when anything saved with an object changes, but
+    # is much faster to calculate than saving the object. Meshes are compared
+    # by their version.
+    t = type(value)
+    if t is str or t is int or t is float or t is bool or value is None:
+        return value
+    if t is Vector or t is Rotate:
+        return (t, value.x, value.y, value.z)
+    if t is list or t is tuple:
+        return tuple(_fingerprint(v, keys) for v in value)
+    if t is dict:
+        return tuple((k, _fingerprint(v, keys)) for k, v in value.items())
+    if isinstance(value, Mesh):
+        return ('mesh', id(value), value.__dict__.get('version'))
+    if isinstance(value, EditorObject):
+        key = keys.get(value)
+        if key is not None:
+            return ('object', key)
+    if isinstance(value, Resource):
+        return ('resource', id(value))
+    return ('id', id(value))
+
+
+def replay(state, mapPath):
+    """
+    Apply the changes in the journal of a map to the EditorState loaded from
+    the map file. Return the number of records applied. Records that can't be
+    read are ignored; the journal is ignored completely if the map file was
+    changed after it was created.
+    """
+    path = journalPath(mapPath)
+    try:
+        with path.open('rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return 0
+    if len(data) < _HEADER.size:
+        return 0
+    magic, version, mapSize, mapTime = _HEADER.unpack_from(data, 0)
+    stat = mapPath.stat()
+    if magic != MAGIC or version > FORMAT_VERSION:
+        print("The journal for this map can't be read.")
+        return 0
+    if (mapSize, mapTime) != (stat.st_size, stat.st_mtime_ns):
+        print("The map was changed outside of the editor; ignoring journal.")
+        return 0
+
+    # only the last record of each object matters
+    fragments = [ ]
+    offset = _HEADER.size
+    while offset + _RECORD.size <= len(data):
+        size, crc = _RECORD.unpack_from(data, offset)
+        fragment = data[offset + _RECORD.size:offset + _RECORD.size + size]
+        if len(fragment) != size or zlib.crc32(fragment) != crc:
+            print("The journal is incomplete. The last changes may be lost.")
+            break
+        fragments.append(fragment)
+        offset += _RECORD.size + size
+    if len(fragments) == 0:
+        return 0
+
+    # loading records adds references to materials, so the counts are fixed
+    # afterwards (see _updateMaterialReferences)
+    usesBefore = _countMaterialUses(state)
+    references = {id(m): (m, m.references)
+                  for m in state.world.materials + [m for m, count
+                                                    in usesBefore.values()]}
+
+    objects = {i: o for i, o in enumerate(state.objects)}
+
+    def persistentLoad(key):
+        # objects which haven't been created yet start as an EditorObject,
+        # and their class is set when their record is loaded
+        try:
+            return objects[key]
+        except KeyError:
+            o = EditorObject.__new__(EditorObject)
+            objects[key] = o
+            return o
+
+    materials = {m.getName(): m for m in state.world.materials}
+    finalState = None
+    for fragment in fragments:
+        try:
+            record = mapFile.loadFragment(fragment, persistentLoad, materials)
+        except (pickle.UnpicklingError, ValueError, KeyError) as e:
+            print("A journal record couldn't be loaded:", e)
+            continue
+        if record[0] == 'object':
+            key, cls, attributes = record[1:]
+            o = persistentLoad(key)
+            o.__class__ = cls
+            o.__dict__.clear()
+            o.__dict__.update(attributes)
+        elif record[0] == 'remove':
+            objects.pop(record[1], None)
+        elif record[0] == 'state':
+            finalState = record
+
+    if finalState is not None:
+        attributes, worldObject, worldMaterials, keys = finalState[1:]
+        state.__dict__.update(attributes)
+        state.worldObject = worldObject
+        state.world.materials = list(worldMaterials)
+        state.objects = [objects[key] for key in keys if key in objects]
+    else:
+        state.objects = [objects[key] for key in sorted(objects.keys())]
+    state.selectedObjects = [o for o in state.objects if o.selected]
+    state.selectedFaces = [ ]
+    state.selectedVertices = [ ]
+    _updateMaterialReferences(state, references, usesBefore)
+    return len(fragments)
+
+def _countMaterialUses(state):
+    # map ids of materials to tuples of the material and the number of faces
+    # (and the current material) which use it in the state
+    uses = { }
+    meshes = {id(o.getMesh()): o.getMesh() for o in state.objects
+              if o.getMesh() is not None}
+    used = [face.getMaterial() for mesh in meshes.values()
+            for face in mesh.getFaces() if face.getMaterial() is not None]
+    if state.currentMaterial is not None:
+        used.append(state.currentMaterial)
+    for material in used:
+        count = uses.get(id(material), (material, 0))[1]
+        uses[id(material)] = (material, count + 1)
+    return uses
+
+def _updateMaterialReferences(state, references, usesBefore):
+    # Replaced objects leave behind references to materials, so the uses
+    # before the journal was replayed are replaced with the uses afterwards.
+    # References from outside the map are kept: materials passed to
+    # files.loadMapState (when a map is imported into the editor) are also
+    # used by the editor's own map.
+    usesAfter = _countMaterialUses(state)
+    for material in state.world.materials:
+        references.setdefault(id(material), (material, 0))
+    for key, (material, count) in usesAfter.items():
+        references.setdefault(key, (material, 0))
+    for key, (material, count) in references.items():
+        material.references = count - usesBefore.get(key, (None, 0))[1] \
+            + usesAfter.get(key, (None, 0))[1]
@@ -0,0 +1,152 @@
+__author__ = "jacobvanthoog"
+
+import time
+import threading
+import collections
+
+# Saving happens in two steps. First the EditJournal takes a snapshot of the
+# map, on the main thread, which is fast because meshes are only copied if
+# they've changed. Then the snapshot is encoded and written on a worker
+# thread, so the editor keeps drawing while the map is saved. Snapshots are
+# written in the order they were taken. Each snapshot only contains the
+# changes since the one before it, so if a write fails, the writes queued
+# after it are dropped, and the next save writes the whole map. The journal is
+# only updated on the main thread, when the results are collected.
+
+
+class MapSaver:
+    """
+    Saves a map with an EditJournal on a worker thread, and autosaves it
+    periodically. ``update`` must be called regularly on the main thread (for
+    example every frame) to report finished saves and start autosaves.
+    """
+
+    def __init__(self, journal, autosaveInterval=0):
+        """
+        ``autosaveInterval`` is the number of seconds between autosaves, or 0
+        to disable autosaving.
+        """
+        self.journal = journal
+        self.autosaveInterval = autosaveInterval
+        self.lastSaveTime = time.monotonic()
+
+        self._lock = threading.Lock()
+        self._thread = None
+        # tuples of a function from EditJournal.prepareSave and whether it is
+        # an autosave
+        self._pending = collections.deque()
+        self._current = None # the save being written
+        self._progress = 0.0
+        # tuples of a message and the result of a write, or None if it
+        # failed, from the worker thread; handled by update
+        self._results = [ ]
+
+    def save(self, autosave=False):
+        """
+        Take a snapshot of the map and start writing it in the background.
+        Autosaves are skipped if a save is already in progress.
+        """
+        if autosave and self.isSaving():
+            return
+        self.lastSaveTime = time.monotonic()
+        # the lock is held from collecting results to queueing the write, so
+        # a failed write is either handled before the snapshot is taken, or
+        # drops this write along with the rest of the queue
+        with self._lock:
+            self._finishWrites()
+            write = self.journal.prepareSave()
+            if write is not None:
+                self._pending.append((write, autosave))
+                if self._thread is None:
+                    # not a daemon thread, so the last save is finished before
+                    # the program exits
+                    self._thread = threading.Thread(target=self._run,
+                                                    name="MapSaver")
+                    self._thread.start()
+        if write is None and not autosave:
+            print("Map saved")
+
+    def update(self):
+        """
+        Print messages about finished saves, and autosave if it's time. Must
+        be called on the main thread.
+        """
+        with self._lock:
+            self._finishWrites()
+        if self.autosaveInterval > 0 and time.monotonic() - self.lastSaveTime \
+                >= self.autosaveInterval:
+            self.save(autosave=True)
+
+    def finish(self):
+        """
+        Wait until every save has been written, then print messages like
+        ``update``.
+        """
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        self.update()
+
+    def isSaving(self):
+        """
+        Check if any save hasn't been written yet.
+        """
+        with self._lock:
+            return self._current is not None or len(self._pending) != 0
+
+    def getStatus(self):
+        """
+        Get a description of the save in progress for the status bar, or an
+        empty string if nothing is being saved.
+        """
+        with self._lock:
+            current = self._current
+            numPending = len(self._pending)
+        if current is None and numPending == 0:
+            return ""
+        text = "Autosaving" if current is not None and current[1] \
+            else "Saving"
+        text += " " + str(int(self._progress * 100)) + "%"
+        if numPending != 0:
+            text += " (+" + str(numPending) + ")"
+        return text
+
+    def _finishWrites(self):
+        # update the journal with the results from the worker thread; called
+        # on the main thread with the lock held
+        for message, sizes in self._results:
+            if sizes is None:
+                self.journal.writeFailed()
+            else:
+                self.journal.writeFinished(sizes)
+            print(message)
+        self._results = [ ]
+
+    def _setProgress(self, fraction):
+        self._progress = fraction
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if len(self._pending) == 0:
+                    self._current = None
+                    self._thread = None
+                    return
+                self._current = self._pending.popleft()
+            write, autosave = self._current
+            self._progress = 0.0
+            try:
+                sizes = write(self._setProgress)
+            except Exception as e:
+                with self._lock:
+                    # the queued writes depend on the failed one
+                    message = "Error saving map: " + str(e)
+                    if len(self._pending) != 0:
+                        message += " (queued saves cancelled)"
+                    self._pending.clear()
+                    self._results.append((message, None))
+            else:
+                message = "Map autosaved" if autosave else "Map saved"
+                with self._lock:
+                    self._results.append((message, sizes))
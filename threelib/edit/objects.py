@@ -2,6 +2,7 @@ __author__ = "jacobvanthoog"
 
 import math
 
+from threelib.vectorMath import Vector
 import threelib.edit.base
 from threelib.edit.base import MeshObject
 from threelib.edit.base import PointObject
@@ -11,6 +12,7 @@ from threelib.sim.base import Entity
 from threelib.sim.graphics import RenderMesh
 from threelib.sim.rayCollision import RayCollisionMesh
 from threelib.sim.playerPhysics import CollisionMesh
+from threelib.world import LightBounds
 
 import threelib.script
 
@@ -132,6 +134,14 @@ class SolidMeshObject(MeshObject):
 
         return entity
 
+    def isStatic(self):
+        """
+        The object can only move if it has a script, a constructor, or a parent
+        that can move.
+        """
+        return self.script.strip() == "" and self.constructor.strip() == "" \
+            and (self.getParent() is None or self.getParent().isStatic())
+
     def getProperties(self):
         props = super().getProperties()
         props.update({ "constructor" : self.constructor,
@@ -221,11 +231,14 @@ class SolidMeshObject(MeshObject):
 
 class ScriptPointObject(PointObject):
 
+    # the constructor of new objects, used by isStatic
+    DEFAULT_CONSTRUCTOR = ""
+
     def __init__(self):
         super().__init__()
 
         # properties
-        self.constructor = ""
+        self.constructor = self.DEFAULT_CONSTRUCTOR
         self.script = "\n\n"
 
     def addToWorld(self, world):
@@ -250,6 +263,15 @@ class ScriptPointObject(PointObject):
 
         return entity
 
+    def isStatic(self):
+        """
+        The object can only move if it has a script, a parent that can move, or
+        a different constructor than usual.
+        """
+        return self.script.strip() == "" \
+            and self.constructor == self.DEFAULT_CONSTRUCTOR \
+            and (self.getParent() is None or self.getParent().isStatic())
+
     def getProperties(self):
         props = super().getProperties()
         props.update({ "constructor" : self.constructor,
@@ -279,11 +301,12 @@ class ScriptPointObject(PointObject):
 
 class DirectionalLightObject(ScriptPointObject):
 
+    DEFAULT_CONSTRUCTOR = "Light()"
+
     def __init__(self):
         super().__init__()
 
         # properties
-        self.constructor = "Light()"
         self.ambient = (0.0, 0.0, 0.0)
         self.diffuse = (1.0, 1.0, 1.0)
         self.specular = (1.0, 1.0, 1.0)
@@ -332,11 +355,12 @@ class DirectionalLightObject(ScriptPointObject):
 
 class PositionalLightObject(DirectionalLightObject):
 
+    DEFAULT_CONSTRUCTOR = "PositionalLight()"
+
     def __init__(self):
         super().__init__()
 
         # properties
-        self.constructor = "PositionalLight()"
         self.attenuationConstant = 0.0
         self.attenuationLinear = 0.03
         self.attenuationQuadratic = 0.0
@@ -355,6 +379,15 @@ class PositionalLightObject(DirectionalLightObject):
         world.positionalLights.append(light)
         return light
 
+    def getLightBounds(self):
+        """
+        Get the LightBounds of the light, at its current position.
+        """
+        return LightBounds(self.getPosition(),
+                           (self.attenuationConstant, self.attenuationLinear,
+                            self.attenuationQuadratic),
+                           (self.ambient, self.diffuse, self.specular))
+
     def getProperties(self):
         props = super().getProperties()
         props.update({ "attenuationConstant" : str(self.attenuationConstant),
@@ -388,11 +421,12 @@ class PositionalLightObject(DirectionalLightObject):
 
 class SpotLightObject(PositionalLightObject):
 
+    DEFAULT_CONSTRUCTOR = "SpotLight()"
+
     def __init__(self):
         super().__init__()
 
         # properties
-        self.constructor = "SpotLight()"
         self.exponent = 0.0
         self.cutoff = 45.0
 
@@ -412,6 +446,14 @@ class SpotLightObject(PositionalLightObject):
         world.spotLights.append(light)
         return light
 
+    def getLightBounds(self):
+        return LightBounds(self.getPosition(),
+                           (self.attenuationConstant, self.attenuationLinear,
+                            self.attenuationQuadratic),
+                           (self.ambient, self.diffuse, self.specular),
+                           Vector(1, 0, 0).rotate(self.getRotation()),
+                           math.radians(self.cutoff))
+
     def getProperties(self):
         props = super().getProperties()
         props.update({ "exponent" : str(self.exponent),
@@ -9,7 +9,7 @@ from threelib.world import World
 class EditorState:
 
     CURRENT_MAJOR_VERSION = 1
-    CURRENT_MINOR_VERSION = 9
+    CURRENT_MINOR_VERSION = 12
 
     SELECT_OBJECTS = 0
     SELECT_FACES = 1
@@ -4,10 +4,16 @@ import sys
 from pathlib import Path
 import os.path
 import pickle
+import hashlib
+import time
+import mmap
 import webbrowser
 import platform
 import configparser
 from threelib.edit.state import EditorState
+from threelib import mapFile
+from threelib import mapCompression
+from threelib.edit import journal
 
 
 gameDirPath = None
@@ -40,6 +46,20 @@ def getMapList():
     """
     return getGameDir() / "maps.txt"
 
+def getCacheDir():
+    """
+    Get the Path to the directory containing files which are generated from
+    other files in the game directory, and can be deleted at any time.
+    """
+    return getGameDir() / "cache"
+
+def getTextureCacheDir():
+    """
+    Get the Path to the directory containing textures which have been
+    decoded and resized from the images in the materials directory.
+    """
+    return getCacheDir() / "textures"
+
 def getMap(name, createIfNotFound=True):
     """
     Get the Path to the map with the specified name. If it doesn't exist,
@@ -94,24 +114,47 @@ def getResourcePath(directoryPath, name):
                 print("Please use correct case in file paths!")
                 return None
 
-        name = dirs[-1]
-        for child in parentDir.iterdir():
-            cName = ""
-            cNames = child.name.split('.')
-            if len(cNames) == 1 or len(cNames) == 2:
-                cName = cNames[0]
-            else:
-                cName = cNames[0]
-                for n in cNames[1:-1]:
-                    cName += "." + n
-
-            if cName == name:
-                return child
-
-        return None
+        return _resourceIndex(parentDir).get(dirs[-1])
     except (FileNotFoundError, OSError):
         return None
 
+# maps directory Paths to tuples of the modification time of the directory,
+# and a dictionary of resource names (without extensions) to Paths
+_resourceIndices = { }
+
+# a directory modified less than this many nanoseconds before it was indexed
+# could be modified again without its modification time changing, if the
+# file system stores times with low precision
+_RACY_INDEX_TIME = 2 * 10**9
+
+def _resourceIndex(directoryPath):
+    # get the names of the files in a directory, which are listed again only
+    # when the directory changes
+    mtime = directoryPath.stat().st_mtime_ns
+    try:
+        indexTime, index = _resourceIndices[directoryPath]
+        if indexTime == mtime:
+            return index
+    except KeyError:
+        pass
+
+    index = { }
+    for child in directoryPath.iterdir():
+        # if multiple files have the same name, the first one is used
+        index.setdefault(_stripExtension(child.name), child)
+    if time.time_ns() - mtime > _RACY_INDEX_TIME:
+        _resourceIndices[directoryPath] = (mtime, index)
+    else:
+        _resourceIndices.pop(directoryPath, None)
+    return index
+
+def _stripExtension(fileName):
+    # only the last extension is removed
+    names = fileName.split('.')
+    if len(names) == 1 or len(names) == 2:
+        return names[0]
+    return '.'.join(names[:-1])
+
 def getMaterialDir():
     """
     Get the Path to the directory containing materials.
@@ -167,44 +210,109 @@ def getAudio(name):
     """
     return getResourcePath(getAudioDir(), name)
 
-def saveMapState(path, state):
+def saveMapState(path, state, meshCache=None, codec=None):
+    """
+    Save map state to a file, in the binary map format (see mapFile). ``path``
+    is a Path to the map file. ``state`` is an EditorState object.
+    ``meshCache`` is an optional mapFile.MeshCache. ``codec`` is the name of
+    a compression codec (see mapCompression), or None to save the map
+    uncompressed.
+    """
+    writeMapSnapshot(path, mapFile.MapSnapshot(state, meshCache=meshCache,
+                                               contents=True), codec=codec)
+
+def writeMapSnapshot(path, snapshot, progress=None, codec=None):
+    """
+    Write a mapFile.MapSnapshot to the map file at ``path``. The map is first
+    written to a temporary file, which then replaces the map file, so the map
+    is never left half-written. This doesn't use the EditorState, so it can
+    run on another thread. ``progress`` is the same as for
+    ``MapSnapshot.write``. ``codec`` is the same as for ``saveMapState``.
+    """
+    tempPath = path.with_name(path.name + ".saving")
+    try:
+        with tempPath.open('wb') as f:
+            if codec is None:
+                snapshot.write(f, progress)
+            else:
+                f.writelines(mapCompression.compress(snapshot.toBytes(), codec,
+                                                     progress=progress))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(str(tempPath), str(path))
+    except BaseException:
+        if tempPath.exists():
+            tempPath.unlink()
+        raise
+
+def saveLegacyMapState(path, state):
     """
-    Save map state to a file. ``path`` is a Path to the map file. ``state`` is
-    an EditorState object
+    Save map state to a file by pickling the whole EditorState, like older
+    versions of three. ``loadMapState`` can still open these files.
     """
     # large meshes will cause a lot of recursion while pickling
     # the recursion limit will temporarily be increased
-    # TODO: some testing needs to be done for the best recursion depth value
-    # TODO: avoid recursion in meshes?
     oldRecursionLimit = sys.getrecursionlimit() # default is 1000 for me
     sys.setrecursionlimit(10000)
-    
+
     try:
         with path.open('wb') as f:
             pickle.dump(state, f, protocol=4)
     finally:
         sys.setrecursionlimit(oldRecursionLimit)
 
-def loadMapState(path):
+def _readMapState(f, lazy, materials):
+    # detect the format of the map file
+    magic = f.read(len(mapFile.MAGIC))
+    if mapFile.isMapFile(magic):
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return mapFile.loadMap(data, lazy, materials)
+    if mapCompression.isCompressed(magic):
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            data = mapCompression.decompress(data)
+        return mapFile.loadMap(data, lazy, materials)
+    f.seek(0)
+    state = pickle.load(f)
+    if materials:
+        _replaceMaterials(state, materials)
+    return state
+
+def _replaceMaterials(state, materials):
+    # like the materials argument of mapFile.loadMap, for legacy maps
+    for o in state.objects:
+        if o.getMesh() is None:
+            continue
+        for face in o.getMesh().getFaces():
+            mat = face.getMaterial()
+            if mat is not None and mat.getName() in materials \
+                    and materials[mat.getName()] is not mat:
+                face.setMaterial(materials[mat.getName()])
+    state.world.materials = [materials.get(m.getName(), m)
+                             for m in state.world.materials]
+
+def loadMapState(path, lazy=False, materials=None, useCache=True):
     """
     Load the map state at the specified file Path. Return an EditorState object,
-    or None.
-    """
-    try:
-        with path.open('rb') as f:
-            state = pickle.load(f)
-    except FileNotFoundError:
-        print("File not found:", path)
-        return None
-    except EOFError: # map is empty
-        return None
-    except (ImportError, AttributeError, pickle.UnpicklingError) as e:
-        print("The map couldn't be loaded.")
-        print(e)
-        return None
-    except BaseException as e:
-        print("Unknown error while loading map.")
-        print(str(e))
+    or None. Both the binary map format and legacy pickled maps can be loaded.
+    ``lazy`` and ``materials`` are passed to ``mapFile.loadMap``; legacy maps
+    are never loaded lazily.
+
+    Maps from older versions of three are converted to the current version.
+    If ``useCache`` is True and a game directory is set, the converted map is
+    saved in the cache directory (unless ``materials`` is given), and loaded
+    from there the next time the same map is loaded.
+    """
+    cachePath = _convertedMapCachePath(path) if useCache else None
+    state = None
+    if cachePath is not None and cachePath.exists():
+        state = _loadMapFile(cachePath, lazy, materials)
+        if state is not None and _isCurrentVersion(state):
+            print("Loaded the converted map from the cache")
+            return _finishLoadingMap(state, path)
+        state = None
+    if state is None:
+        state = _loadMapFile(path, lazy, materials)
+    if state is None:
         return None
 
     try:
@@ -213,6 +321,10 @@ def loadMapState(path):
         state.MAJOR_VERSION = -1
         state.MINOR_VERSION = 0
 
+    # faces would refer to the caller's materials, with their reference
+    # counts, so the converted map isn't cached
+    storePath = cachePath if materials is None else None
+
     print("File version:",
           str(state.MAJOR_VERSION) + "." + str(state.MINOR_VERSION))
     print("Current editor file version:", str(EditorState.CURRENT_MAJOR_VERSION)
@@ -226,6 +338,7 @@ def loadMapState(path):
               " save it now, you won't be able to open it with an older version"
               " again.")
         state = _convertStateToCurrentVersion(state)
+        _cacheConvertedMap(storePath, state)
     elif state.MINOR_VERSION > EditorState.CURRENT_MINOR_VERSION:
         print("This file was created with a newer version of three. Some"
               " features may be missing, and may be lost if you save.")
@@ -234,12 +347,155 @@ def loadMapState(path):
               " save it now, some features may be missing if you try to open"
               " it with an older version again.")
         state = _convertStateToCurrentVersion(state)
+        _cacheConvertedMap(storePath, state)
 
     if state is None:
         return None
+    return _finishLoadingMap(state, path)
+
+def _loadMapFile(path, lazy, materials):
+    try:
+        with path.open('rb') as f:
+            return _readMapState(f, lazy, materials)
+    except FileNotFoundError:
+        print("File not found:", path)
+        return None
+    except EOFError: # map is empty
+        return None
+    except (ImportError, AttributeError, pickle.UnpicklingError) as e:
+        print("The map couldn't be loaded.")
+        print(e)
+        return None
+    except BaseException as e:
+        print("Unknown error while loading map.")
+        print(str(e))
+        return None
+
+def _finishLoadingMap(state, path):
+    numChanges = journal.replay(state, path)
+    if numChanges != 0:
+        print("Applied", numChanges, "changes from the journal")
     state.onLoad()
     return state
 
+def _isCurrentVersion(state):
+    return (state.MAJOR_VERSION, state.MINOR_VERSION) \
+        == (EditorState.CURRENT_MAJOR_VERSION,
+            EditorState.CURRENT_MINOR_VERSION)
+
+def getConvertedMapCacheDir():
+    """
+    Get the Path to the directory containing maps that have been converted to
+    the current version.
+    """
+    return getCacheDir() / "convertedMaps"
+
+def mapNeedsConverting(path):
+    """
+    Check if the map at the specified file Path was saved by an older version
+    of three, without loading it. Legacy pickled maps could be any version,
+    so they always need converting. Raise an OSError if the file can't be
+    read, or a ``pickle.UnpicklingError`` if it's not valid.
+    """
+    with path.open('rb') as f:
+        contents = _readContents(f)
+    return contents is None or (contents.majorVersion, contents.minorVersion) \
+        < (EditorState.CURRENT_MAJOR_VERSION, EditorState.CURRENT_MINOR_VERSION)
+
+def convertedMapIsCached(path):
+    """
+    Check if the map at the specified file Path has been converted to the
+    current version and saved in the cache (see ``loadMapState``).
+    """
+    cachePath = _convertedMapCachePath(path)
+    return cachePath is not None and cachePath.exists()
+
+def _convertedMapCachePath(path):
+    # the Path of the map in the cache, or None if the map doesn't need to be
+    # converted. Cached maps are named by a hash of the map's path, its size
+    # and modification time, and the version they were converted to, so the
+    # map doesn't have to be read to find them. Legacy maps could already be
+    # the current version, in which case nothing is cached.
+    if getGameDir() is None:
+        return None
+    try:
+        if not mapNeedsConverting(path):
+            return None
+        stat = path.stat()
+    except (OSError, ValueError, pickle.UnpicklingError):
+        # ValueError if the map is empty
+        return None
+    pathHash = hashlib.sha256(
+        str(path.resolve()).encode('utf-8')).hexdigest()
+    return getConvertedMapCacheDir() / (pathHash + "-" + str(stat.st_size)
+        + "-" + str(stat.st_mtime_ns) + "-"
+        + str(EditorState.CURRENT_MAJOR_VERSION) + "."
+        + str(EditorState.CURRENT_MINOR_VERSION))
+
+def _cacheConvertedMap(cachePath, state):
+    if cachePath is None or state is None:
+        return
+    try:
+        cachePath.parent.mkdir(parents=True, exist_ok=True)
+        # older versions of the map, or maps converted to older versions of
+        # three, won't be used again
+        for oldPath in cachePath.parent.glob(
+                cachePath.name.split("-")[0] + "-*"):
+            if oldPath != cachePath:
+                oldPath.unlink()
+        saveMapState(cachePath, state)
+    except OSError as e:
+        print("The converted map couldn't be cached.")
+        print(e)
+
+def readMapContents(path):
+    """
+    Read the table of contents of the map at the specified file Path, without
+    loading its meshes. Return a ``mapFile.MapContents``, or None. Maps without
+    a table of contents, or with changes in a journal (see
+    ``edit.journal``), are loaded completely to create one.
+    """
+    if journal.journalPath(path).exists():
+        # the table of contents doesn't include the changes in the journal
+        state = loadMapState(path, lazy=True)
+        if state is None:
+            return None
+        return mapFile.MapContents.fromState(state)
+    try:
+        with path.open('rb') as f:
+            contents = _readContents(f)
+        if contents is not None:
+            return contents
+    except FileNotFoundError:
+        print("File not found:", path)
+        return None
+    except (ValueError, pickle.UnpicklingError) as e:
+        print("The map contents couldn't be read.")
+        print(e)
+        return None
+
+    state = loadMapState(path, lazy=True)
+    if state is None:
+        return None
+    return mapFile.MapContents.fromState(state)
+
+def _readContents(f):
+    # read the MapContents of an open map file, or None if it doesn't have
+    # any
+    magic = f.read(len(mapFile.MAGIC))
+    if mapFile.isMapFile(magic):
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return mapFile.readContents(data)
+    elif mapCompression.isCompressed(magic):
+        # only decompress the start of the map
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = mapCompression.decompress(data, end=1)
+            end = mapFile.contentsEnd(start)
+            if end > len(start):
+                start = mapCompression.decompress(data, end=end)
+        return mapFile.readContents(start)
+    return None
+
 # maps tuples of (majorVersion, minorVersion) to functions
 editorStateConverters = { }
 
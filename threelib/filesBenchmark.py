@@ -0,0 +1,162 @@
+__author__ = "jacobvanthoog"
+
+# run from the root directory with: python3 -m threelib.filesBenchmark
+
+import time
+import io
+import contextlib
+import os
+import tempfile
+from pathlib import Path
+from threelib.vectorMath import Vector
+from threelib.mesh import Mesh, MeshVertex
+from threelib import files
+from threelib.edit.state import EditorState
+from threelib.edit.objects import SolidMeshObject
+from threelib.materials import MaterialReference
+from threelib.edit.journal import EditJournal
+from threelib.edit.mapSaver import MapSaver
+import threelib.edit.fileVersions.converters
+
+
+def makeGrid(size):
+    # a grid of quads which share vertices
+    mesh = Mesh()
+    vertices = [[mesh.addVertex(MeshVertex(Vector(x, y, 0)))
+                 for y in range(0, size + 1)] for x in range(0, size + 1)]
+    for x in range(0, size):
+        for y in range(0, size):
+            mesh.addFace().addVertex(vertices[x][y]) \
+                .addVertex(vertices[x + 1][y]) \
+                .addVertex(vertices[x + 1][y + 1]) \
+                .addVertex(vertices[x][y + 1])
+    return mesh
+
+def makeState(numObjects, gridSize):
+    state = EditorState()
+    material = MaterialReference("test")
+    state.world.addMaterial(material)
+    for i in range(0, numObjects):
+        o = SolidMeshObject()
+        o.setPosition(Vector(i * 64, 0, 0))
+        if gridSize != 0:
+            o.setMesh(makeGrid(gridSize))
+        for face in o.getMesh().getFaces():
+            face.setMaterial(material)
+        state.objects.append(o)
+    return state
+
+def timeCall(function, *args):
+    startTime = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - startTime
+
+
+print("{:>24} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+    "map", "save", "load", "size", "old save", "old load", "old size"))
+with tempfile.TemporaryDirectory() as directory:
+    path = Path(directory) / "map"
+    legacyPath = Path(directory) / "legacy"
+    for numObjects, gridSize in ((100, 0), (1000, 0), (10, 16), (10, 64),
+                                 (1, 128)):
+        state = makeState(numObjects, gridSize)
+        saveTime = timeCall(files.saveMapState, path, state)
+        loadTime = timeCall(files.loadMapState, path)
+        try:
+            legacySaveTime = timeCall(files.saveLegacyMapState, legacyPath,
+                                      state)
+            legacy = "{:10.4f} {:10.4f} {:10d}".format(
+                legacySaveTime, timeCall(files.loadMapState, legacyPath),
+                legacyPath.stat().st_size)
+        except RecursionError:
+            legacy = "{:>10} {:>10} {:>10}".format("recursion", "-", "-")
+        print("{:>24} {:10.4f} {:10.4f} {:10d} {}".format(
+            "{} objects, {}x{}".format(numObjects, gridSize, gridSize)
+            if gridSize != 0 else "{} boxes".format(numObjects),
+            saveTime, loadTime, path.stat().st_size, legacy))
+
+print()
+print("{:>24} {:>10} {:>10} {:>10}".format(
+    "import map", "contents", "lazy", "full"))
+with tempfile.TemporaryDirectory() as directory:
+    path = Path(directory) / "map"
+    for numObjects, gridSize in ((100, 0), (10, 64), (1, 128)):
+        files.saveMapState(path, makeState(numObjects, gridSize))
+        print("{:>24} {:10.4f} {:10.4f} {:10.4f}".format(
+            "{} objects, {}x{}".format(numObjects, gridSize, gridSize)
+            if gridSize != 0 else "{} boxes".format(numObjects),
+            timeCall(files.readMapContents, path),
+            timeCall(files.loadMapState, path, True),
+            timeCall(files.loadMapState, path)))
+
+print()
+print("{:>24} {:>10} {:>10}".format("save 1 changed object", "journal",
+                                    "full"))
+with tempfile.TemporaryDirectory() as directory:
+    for numObjects, gridSize in ((1000, 0), (10, 64), (40, 32)):
+        path = Path(directory) / "map{}-{}".format(numObjects, gridSize)
+        state = makeState(numObjects, gridSize)
+        files.saveMapState(path, state)
+        editJournal = EditJournal(path, state)
+        state.objects[0].setPosition(Vector(1, 2, 3))
+        print("{:>24} {:10.4f} {:10.4f}".format(
+            "{} objects, {}x{}".format(numObjects, gridSize, gridSize)
+            if gridSize != 0 else "{} boxes".format(numObjects),
+            timeCall(editJournal.save),
+            timeCall(files.saveMapState, path, state)))
+
+print()
+print("{:>24} {:>10} {:>10}".format("background save", "blocked", "total"))
+with tempfile.TemporaryDirectory() as directory:
+    for numObjects, gridSize in ((1000, 0), (10, 64), (1, 128)):
+        path = Path(directory) / "map{}-{}".format(numObjects, gridSize)
+        state = makeState(numObjects, gridSize)
+        files.saveMapState(path, state)
+        saver = MapSaver(EditJournal(path, state))
+        # saves the whole map, with every mesh already converted once
+        saver.journal.prepareCompaction()
+        saver.journal.needsCompaction = True
+        state.objects[0].setPosition(Vector(1, 2, 3))
+        startTime = time.perf_counter()
+        blockedTime = timeCall(saver.save)
+        with contextlib.redirect_stdout(io.StringIO()):
+            saver.finish()
+        print("{:>24} {:10.4f} {:10.4f}".format(
+            "{} objects, {}x{}".format(numObjects, gridSize, gridSize)
+            if gridSize != 0 else "{} boxes".format(numObjects),
+            blockedTime, time.perf_counter() - startTime))
+
+print()
+print("{:>24} {:>10} {:>10} {:>10} {:>10}".format(
+    "compression", "codec", "save", "load", "size"))
+with tempfile.TemporaryDirectory() as directory:
+    path = Path(directory) / "map"
+    for numObjects, gridSize in ((1000, 0), (10, 64), (1, 128)):
+        state = makeState(numObjects, gridSize)
+        for codec in (None, "zlib", "lzma"):
+            saveTime = timeCall(files.saveMapState, path, state, None, codec)
+            print("{:>24} {:>10} {:10.4f} {:10.4f} {:10d}".format(
+                "{} objects, {}x{}".format(numObjects, gridSize, gridSize)
+                if gridSize != 0 else "{} boxes".format(numObjects),
+                str(codec), saveTime, timeCall(files.loadMapState, path),
+                path.stat().st_size))
+
+print()
+print("{:>24} {:>10} {:>10}".format("200 resource lookups", "indexed",
+                                    "rescanned"))
+with tempfile.TemporaryDirectory() as directory:
+    directory = Path(directory)
+    for numFiles in (10, 1000, 5000):
+        for i in range(0, numFiles):
+            (directory / "material{}.png".format(i)).touch()
+        os.utime(str(directory), ns=(0, 0))
+        names = ["material{}".format(i % numFiles) for i in range(0, 200)]
+
+        def lookup(rescan):
+            for name in names:
+                if rescan:
+                    files._resourceIndices.clear()
+                files.getResourcePath(directory, name)
+        print("{:>24} {:10.4f} {:10.4f}".format(
+            "{} files".format(numFiles), timeCall(lookup, False),
+            timeCall(lookup, True)))
@@ -0,0 +1,625 @@
+__author__ = "jacobvanthoog"
+
+# run from the root directory with: python3 -m threelib.filesTest
+
+import io
+import pickle
+import tempfile
+from pathlib import Path
+from threelib.vectorMath import Vector, Rotate
+from threelib import files
+from threelib import mapFile
+from threelib.edit.state import EditorState, FaceSelection, VertexSelection
+from threelib.edit.objects import SolidMeshObject, PositionalLightObject
+from threelib.materials import MaterialReference
+import threelib.edit.fileVersions.converters
+
+
+def makeState(numObjects=4):
+    state = EditorState()
+    bricks = MaterialReference("bricks")
+    state.world.addMaterial(bricks)
+    state.setCurrentMaterial(bricks)
+    for i in range(0, numObjects):
+        o = SolidMeshObject()
+        o.setName("box" + str(i))
+        o.setPosition(Vector(i * 64, 0, 0))
+        o.setRotation(Rotate(0, 0, i * 0.5))
+        o.script = "print('box " + str(i) + "')\n\n"
+        for face in o.getMesh().getFaces()[::2]:
+            face.setMaterial(bricks)
+        state.objects.append(o)
+    light = PositionalLightObject()
+    light.setName("light")
+    state.objects[0].addChild(light)
+    state.objects.append(light)
+    state.select(state.objects[1])
+    state.selectedFaces.append(FaceSelection(
+        state.objects[2], state.objects[2].getMesh().getFaces()[3]))
+    state.selectedVertices.append(VertexSelection(
+        state.objects[2], state.objects[2].getMesh().getVertices()[5]))
+    state.worldObject.script = "ünïcode\n"
+    return state
+
+def meshesMatch(a, b):
+    if [v.getPosition() for v in a.getVertices()] \
+            != [v.getPosition() for v in b.getVertices()]:
+        return False
+    aIndices = {id(v): i for i, v in enumerate(a.getVertices())}
+    bIndices = {id(v): i for i, v in enumerate(b.getVertices())}
+    for f1, f2 in zip(a.getFaces(), b.getFaces()):
+        if [(aIndices[id(v.vertex)], v.textureVertex)
+                for v in f1.getVertices()] != \
+                [(bIndices[id(v.vertex)], v.textureVertex)
+                 for v in f2.getVertices()]:
+            return False
+        if (f1.getMaterial() is None) != (f2.getMaterial() is None) \
+                or f1.textureShift != f2.textureShift \
+                or f1.textureRotate != f2.textureRotate \
+                or f1.textureScale != f2.textureScale:
+            return False
+    return len(a.getFaces()) == len(b.getFaces())
+
+def checkState(state, loaded):
+    assert len(loaded.objects) == len(state.objects)
+    for a, b in zip(state.objects, loaded.objects):
+        assert type(a) is type(b)
+        assert a.getName() == b.getName()
+        assert a.getPosition() == b.getPosition()
+        assert a.script == b.script
+        if isinstance(a, SolidMeshObject):
+            assert b.getMesh() is not None
+    bricks = loaded.world.materials[0]
+    assert loaded.currentMaterial is bricks
+    assert bricks.getName() == "bricks"
+    assert bricks.references == state.world.materials[0].references
+    for a, b in zip(state.objects[:-1], loaded.objects[:-1]):
+        mesh = b.getMesh()
+        for face in mesh.getFaces():
+            assert face.mesh is mesh
+            assert face.getMaterial() is None or face.getMaterial() is bricks
+        for v in mesh.getVertices():
+            assert v.mesh is mesh
+            assert v.numReferences() == 3
+        assert meshesMatch(a.getMesh(), mesh)
+    assert loaded.objects[-1].getParent() is loaded.objects[0]
+    assert loaded.objects[0].getChildren() == [loaded.objects[-1]]
+    assert loaded.selectedObjects == [loaded.objects[1]]
+    assert loaded.selectedFaces[0].editorObject is loaded.objects[2]
+    assert loaded.selectedFaces[0].face \
+        is loaded.objects[2].getMesh().getFaces()[3]
+    assert loaded.selectedVertices[0].vertex \
+        is loaded.objects[2].getMesh().getVertices()[5]
+    assert loaded.worldObject.script == "ünïcode\n"
+
+
+# test binary map files
+
+state = makeState()
+f = io.BytesIO()
+mapFile.saveMap(f, state)
+data = f.getvalue()
+assert mapFile.isMapFile(data)
+checkState(state, mapFile.loadMap(data))
+
+with tempfile.TemporaryDirectory() as directory:
+    path = Path(directory) / "test.map"
+    files.saveMapState(path, state)
+    with path.open('rb') as f:
+        assert mapFile.isMapFile(f.read())
+    checkState(state, files.loadMapState(path))
+
+    # legacy pickled maps can still be loaded
+    legacyPath = Path(directory) / "legacy.map"
+    files.saveLegacyMapState(legacyPath, state)
+    with legacyPath.open('rb') as f:
+        assert not mapFile.isMapFile(f.read())
+    checkState(state, files.loadMapState(legacyPath))
+
+    emptyPath = Path(directory) / "empty.map"
+    emptyPath.touch()
+    assert files.loadMapState(emptyPath) is None
+
+# only threelib classes can be loaded
+class NotAllowed:
+    pass
+state = EditorState()
+state.worldObject.notAllowed = NotAllowed()
+f = io.BytesIO()
+mapFile.saveMap(f, state)
+try:
+    mapFile.loadMap(f.getvalue())
+    assert False
+except pickle.UnpicklingError:
+    pass
+
+try:
+    mapFile.loadMap(data[:len(data) // 2])
+    assert False
+except pickle.UnpicklingError:
+    pass
+
+
+# test map contents
+
+state = makeState()
+f = io.BytesIO()
+mapFile.saveMap(f, state)
+data = f.getvalue()
+contents = mapFile.readContents(data)
+assert (contents.majorVersion, contents.minorVersion) == \
+    (EditorState.CURRENT_MAJOR_VERSION, EditorState.CURRENT_MINOR_VERSION)
+assert contents.materials == ["bricks"]
+assert [o.name for o in contents.objects] == [o.getName() for o in state.objects]
+assert contents.objects[0].type == state.objects[0].getType()
+assert contents.objects[-1].parent == 0 and contents.objects[0].parent is None
+assert contents.objects[1].position == Vector(64, 0, 0)
+assert contents.objects[1].numVertices == 8
+assert contents.objects[1].numFaces == 6
+assert contents.objects[-1].numFaces == 0
+for o, info in zip(state.objects, contents.objects):
+    if o.getMesh() is not None:
+        for v in o.getMesh().getVertices():
+            p = v.getPosition().rotate(o.getRotation()) + o.getPosition()
+            assert info.bounds[0].x <= p.x + 1e-9 \
+                and p.x - 1e-9 <= info.bounds[1].x
+assert contents.numFaces() == 24
+assert contents.getBounds()[0].x == contents.objects[0].bounds[0].x
+
+with tempfile.TemporaryDirectory() as directory:
+    path = Path(directory) / "test.map"
+    files.saveMapState(path, state)
+    assert files.readMapContents(path).toJSON() == contents.toJSON()
+    legacyPath = Path(directory) / "legacy.map"
+    files.saveLegacyMapState(legacyPath, state)
+    assert files.readMapContents(legacyPath).toJSON() == contents.toJSON()
+
+# test lazy loading
+
+from threelib.mesh import Mesh
+
+loaded = mapFile.loadMap(data, lazy=True)
+mesh = loaded.objects[1].mesh
+assert isinstance(mesh, Mesh) and type(mesh) is not Mesh
+assert 'faces' not in mesh.__dict__
+assert len(mesh.getFaces()) == 6
+assert type(mesh) is Mesh
+for face in mesh.getFaces():
+    assert face.mesh is mesh
+for v in mesh.getVertices():
+    assert v.mesh is mesh
+assert meshesMatch(state.objects[1].getMesh(), mesh)
+# a lazy mesh is decoded if it is saved again
+loaded = mapFile.loadMap(data, lazy=True)
+f = io.BytesIO()
+mapFile.saveMap(f, loaded)
+checkState(state, mapFile.loadMap(f.getvalue()))
+loaded = mapFile.loadMap(data, lazy=True)
+assert meshesMatch(pickle.loads(pickle.dumps(loaded.objects[3].mesh)),
+                   state.objects[3].getMesh())
+
+# test replacing materials
+
+existing = MaterialReference("bricks")
+other = MaterialReference("other")
+loaded = mapFile.loadMap(data, lazy=True,
+                         materials={"bricks": existing, "other": other})
+assert loaded.world.materials == [existing] and loaded.currentMaterial is existing
+# 3 faces of each of 4 objects
+assert existing.references == 12 and other.references == 0
+for o in loaded.objects[:-1]:
+    for face in o.getMesh().getFaces():
+        assert face.getMaterial() in (None, existing)
+
+with tempfile.TemporaryDirectory() as directory:
+    legacyPath = Path(directory) / "legacy.map"
+    files.saveLegacyMapState(legacyPath, state)
+    existing = MaterialReference("bricks")
+    loaded = files.loadMapState(legacyPath, materials={"bricks": existing})
+    assert loaded.world.materials == [existing]
+    assert existing.references == 12
+    for o in loaded.objects[:-1]:
+        for face in o.getMesh().getFaces():
+            assert face.getMaterial() in (None, existing)
+
+
+# test the edit journal
+
+from threelib.edit import journal
+from threelib.edit.journal import EditJournal, journalPath
+
+with tempfile.TemporaryDirectory() as directory:
+    path = Path(directory) / "journal.map"
+    path.touch()
+    state = makeState(40)
+    editJournal = EditJournal(path, state)
+    editJournal.save() # empty map file, so the whole map is saved
+    assert not journalPath(path).exists()
+    mapSize = path.stat().st_size
+    editJournal.save() # nothing changed
+    assert not journalPath(path).exists()
+
+    # modify, add and remove objects
+    state.objects[1].setPosition(Vector(1, 2, 3))
+    state.objects[2].getMesh().getVertices()[0].setPosition(Vector(-5, -5, -5))
+    newObject = SolidMeshObject()
+    newObject.setName("new")
+    newObject.script = "new script\n"
+    state.objects[0].addChild(newObject)
+    state.objects.append(newObject)
+    removed = state.objects.pop(3)
+    removed.getMesh().removeMaterials()
+    glass = MaterialReference("glass")
+    state.world.addMaterial(glass)
+    newObject.getMesh().getFaces()[0].setMaterial(glass)
+    state.objects[0].getMesh().getFaces()[0].setMaterial(glass)
+    state.translateGridSize = 8.0
+    editJournal.save()
+    assert path.stat().st_size == mapSize
+    journalSize = journalPath(path).stat().st_size
+    assert 0 < journalSize < mapSize
+
+    # changing one object only appends that object
+    state.objects[1].setName("renamed")
+    editJournal.save()
+    assert journalPath(path).stat().st_size - journalSize < mapSize / 4
+
+    def checkJournalState(loaded):
+        assert [o.getName() for o in loaded.objects] \
+            == [o.getName() for o in state.objects]
+        for a, b in zip(state.objects, loaded.objects):
+            assert type(a) is type(b) and a.getPosition() == b.getPosition()
+            if a.getMesh() is not None:
+                assert meshesMatch(a.getMesh(), b.getMesh())
+        assert loaded.objects[-1].getParent() is loaded.objects[0]
+        assert loaded.objects[-1] in loaded.objects[0].getChildren()
+        assert loaded.objects[-1].script == "new script\n"
+        assert loaded.translateGridSize == 8.0
+        assert [m.getName() for m in loaded.world.materials] \
+            == ["bricks", "glass"]
+        bricks, glass = loaded.world.materials
+        assert loaded.currentMaterial is bricks
+        for o in loaded.objects:
+            for face in o.getMesh().getFaces() if o.getMesh() else []:
+                assert face.getMaterial() in (None, bricks, glass)
+        assert glass.references == 2
+        assert bricks.references == state.world.materials[0].references
+
+    loaded = files.loadMapState(path)
+    checkJournalState(loaded)
+    # the table of contents includes the changes in the journal
+    assert files.readMapContents(path).toJSON() \
+        == mapFile.MapContents.fromState(state).toJSON()
+
+    # an incomplete record at the end is ignored
+    with journalPath(path).open('ab') as f:
+        f.write(b'\x10\x00\x00\x00garbage')
+    checkJournalState(files.loadMapState(path))
+
+    # importing a map with a journal keeps the references to the importing
+    # map's materials
+    editorBricks = MaterialReference("bricks")
+    for i in range(0, 6):
+        editorBricks.addReference()
+    imported = files.loadMapState(path, lazy=True,
+                                  materials={"bricks": editorBricks})
+    assert imported.world.materials[0] is editorBricks
+    numFaces = sum(1 for o in imported.objects if o.getMesh() is not None
+                   for face in o.getMesh().getFaces()
+                   if face.getMaterial() is editorBricks)
+    assert numFaces > 0
+    assert editorBricks.references == 6 + numFaces
+    assert imported.world.materials[1].references == 2
+
+    # a journal that doesn't match the map file is ignored
+    files.saveMapState(path, makeState())
+    assert files.loadMapState(path).objects[1].getName() == "box1"
+    journalPath(path).unlink()
+
+    # the journal is compacted when the map is opened again
+    files.saveMapState(path, state)
+    editJournal = EditJournal(path, state)
+    state.objects[0].setName("first")
+    editJournal.save()
+    assert journalPath(path).exists()
+    editJournal = EditJournal(path, files.loadMapState(path))
+    editJournal.save()
+    assert not journalPath(path).exists()
+    assert files.loadMapState(path).objects[0].getName() == "first"
+
+    # the journal is compacted when it grows too large
+    state = files.loadMapState(path)
+    editJournal = EditJournal(path, state)
+    for i in range(0, 100):
+        state.objects[0].setName("name" + str(i))
+        editJournal.save()
+        assert journalPath(path).exists() == (editJournal.numRecords != 0)
+    assert files.loadMapState(path).objects[0].getName() == "name99"
+
+
+# test saving on a worker thread
+
+import time
+import threading
+from threelib.edit.mapSaver import MapSaver
+
+with tempfile.TemporaryDirectory() as directory:
+    path = Path(directory) / "saver.map"
+    path.touch()
+    state = makeState(40)
+    saver = MapSaver(EditJournal(path, state))
+    saver.save()
+    # the state can change while it's being written
+    state.objects[0].setName("changed")
+    state.objects[1].getMesh().getVertices()[0].setPosition(Vector(9, 9, 9))
+    saver.finish()
+    assert not saver.isSaving() and saver.getStatus() == ""
+    loaded = files.loadMapState(path)
+    assert loaded.objects[0].getName() == "box0"
+    assert meshesMatch(loaded.objects[2].getMesh(),
+                       state.objects[2].getMesh())
+    assert loaded.objects[1].getMesh().getVertices()[0].getPosition() \
+        != Vector(9, 9, 9)
+    # no temporary file is left behind
+    assert [p.name for p in Path(directory).iterdir()] == ["saver.map"]
+
+    # saves are written in order
+    saver.save()
+    state.objects[0].setName("second")
+    saver.save()
+    saver.finish()
+    loaded = files.loadMapState(path)
+    assert loaded.objects[0].getName() == "second"
+    assert loaded.objects[1].getMesh().getVertices()[0].getPosition() \
+        == Vector(9, 9, 9)
+
+    # autosave
+    saver.autosaveInterval = 0.01
+    state.objects[0].setName("autosaved")
+    time.sleep(0.02)
+    saver.update()
+    saver.finish()
+    assert files.loadMapState(path).objects[0].getName() == "autosaved"
+
+    # a failed save is reported, and the next save writes the whole map
+    state.objects[0].setName("failed")
+    journalPath(path).unlink()
+    journalPath(path).mkdir()
+    saver.save()
+    saver.finish()
+    assert saver.journal.needsCompaction
+    journalPath(path).rmdir()
+    saver.save()
+    saver.finish()
+    assert not journalPath(path).exists()
+    assert files.loadMapState(path).objects[0].getName() == "failed"
+
+    # saves queued after a failed save are dropped, since they depend on it
+    gate = threading.Event()
+    def failingSave():
+        EditJournal.prepareSave(saver.journal)
+        def write(progress=None):
+            gate.wait()
+            raise OSError("disk full")
+        return write
+    saver.journal.prepareSave = failingSave
+    state.objects[0].setName("lost")
+    saver.save()
+    del saver.journal.prepareSave
+    state.objects[1].setName("queued")
+    saver.save()
+    gate.set()
+    saver.finish()
+    assert not saver.isSaving() and saver.journal.needsCompaction
+    assert files.loadMapState(path).objects[1].getName() != "queued"
+    saver.save()
+    saver.finish()
+    loaded = files.loadMapState(path)
+    assert loaded.objects[0].getName() == "lost"
+    assert loaded.objects[1].getName() == "queued"
+
+# test compressed maps
+
+from threelib import mapCompression
+
+state = makeState()
+data = mapFile.MapSnapshot(state, contents=True).toBytes()
+for codec in ("zlib", "lzma"):
+    # small blocks, so there are many to compress in parallel
+    compressed = b''.join(mapCompression.compress(data, codec,
+                                                  blockSize=256))
+    assert mapCompression.isCompressed(compressed)
+    assert not mapFile.isMapFile(compressed)
+    assert len(compressed) < len(data)
+    assert mapCompression.decompress(compressed) == data
+    start = mapCompression.decompress(compressed, end=300)
+    assert len(start) == 512 and start == data[:512]
+    end = mapFile.contentsEnd(start)
+    assert end > 0 and mapFile.readContents(
+        mapCompression.decompress(compressed, end=end)).toJSON() \
+        == mapFile.readContents(data).toJSON()
+try:
+    mapCompression.decompress(compressed[:-10])
+    assert False
+except pickle.UnpicklingError:
+    pass
+try:
+    mapCompression.compress(data, "unknown")
+    assert False
+except ValueError:
+    pass
+
+with tempfile.TemporaryDirectory() as directory:
+    path = Path(directory) / "compressed.map"
+    for codec in ("zlib", "lzma"):
+        files.saveMapState(path, state, codec=codec)
+        with path.open('rb') as f:
+            assert mapCompression.isCompressed(f.read(8))
+        checkState(state, files.loadMapState(path))
+        checkState(state, files.loadMapState(path, lazy=True))
+        assert files.readMapContents(path).toJSON() \
+            == mapFile.readContents(data).toJSON()
+
+    # the journal works with compressed maps
+    state = makeState(40)
+    files.saveMapState(path, state, codec="zlib")
+    editJournal = EditJournal(path, state)
+    editJournal.codec = "zlib"
+    state.objects[0].setName("journal")
+    editJournal.save()
+    assert journalPath(path).exists()
+    assert files.loadMapState(path).objects[0].getName() == "journal"
+    editJournal.compact()
+    with path.open('rb') as f:
+        assert mapCompression.isCompressed(f.read(8))
+    assert files.loadMapState(path).objects[0].getName() == "journal"
+
+# test the cache of converted maps
+
+from threelib import upgradeMaps
+
+numConversions = 0
+convert_1_11 = files.editorStateConverters[(1, 11)]
+def countConversions(state):
+    global numConversions
+    numConversions += 1
+    return convert_1_11(state)
+files.editorStateConverters[(1, 11)] = countConversions
+
+with tempfile.TemporaryDirectory() as directory:
+    files.setGameDir(Path(directory))
+    files.getMapDir().mkdir()
+    state = makeState()
+    oldState = makeState()
+    oldState.MINOR_VERSION = 11
+    oldPath = files.getMapDir() / "old"
+    legacyPath = files.getMapDir() / "legacy"
+    currentPath = files.getMapDir() / "current"
+    files.saveMapState(oldPath, oldState)
+    files.saveLegacyMapState(legacyPath, oldState)
+    files.saveMapState(currentPath, makeState())
+    assert files.mapNeedsConverting(oldPath)
+    assert files.mapNeedsConverting(legacyPath)
+    assert not files.mapNeedsConverting(currentPath)
+
+    checkState(state, files.loadMapState(oldPath, useCache=False))
+    assert numConversions == 1
+    assert not files.getCacheDir().exists()
+    checkState(state, files.loadMapState(oldPath))
+    assert numConversions == 2
+    assert len(list(files.getConvertedMapCacheDir().iterdir())) == 1
+    # the second time, the map is loaded from the cache
+    loaded = files.loadMapState(oldPath)
+    assert numConversions == 2
+    checkState(state, loaded)
+    assert loaded.MINOR_VERSION == EditorState.CURRENT_MINOR_VERSION
+    checkState(state, files.loadMapState(legacyPath))
+    checkState(state, files.loadMapState(legacyPath, lazy=True))
+    assert numConversions == 3
+    files.loadMapState(currentPath)
+    assert len(list(files.getConvertedMapCacheDir().iterdir())) == 2
+
+    # changes to the map aren't hidden by the cache
+    oldState.objects[0].setName("changed")
+    files.saveMapState(oldPath, oldState)
+    assert files.loadMapState(oldPath).objects[0].getName() == "changed"
+    assert numConversions == 4
+    # the old version was replaced in the cache
+    assert len(list(files.getConvertedMapCacheDir().iterdir())) == 2
+
+    # legacy maps which are already the current version aren't cached
+    legacyCurrentPath = files.getMapDir() / "legacyCurrent"
+    files.saveLegacyMapState(legacyCurrentPath, makeState())
+    assert files.mapNeedsConverting(legacyCurrentPath)
+    checkState(state, files.loadMapState(legacyCurrentPath))
+    assert not files.convertedMapIsCached(legacyCurrentPath)
+    assert not upgradeMaps.upgradeMap(legacyCurrentPath, cacheOnly=True)
+    # maps which are already cached are up to date
+    assert files.convertedMapIsCached(oldPath)
+    assert not upgradeMaps.upgradeMap(oldPath, cacheOnly=True)
+    assert numConversions == 4
+
+    # upgrading a folder of maps
+    upgradeMaps.main([directory, "-cache"])
+    assert files.mapNeedsConverting(oldPath)
+    assert numConversions == 4
+    (files.getMapDir() / "empty").touch()
+    upgradeMaps.main([directory, "-compress=zlib"])
+    assert numConversions == 6
+    assert not files.mapNeedsConverting(oldPath)
+    assert not files.mapNeedsConverting(legacyPath)
+    with legacyPath.open('rb') as f:
+        assert mapCompression.isCompressed(f.read(8))
+    checkState(state, files.loadMapState(legacyPath))
+    assert files.loadMapState(oldPath).objects[0].getName() == "changed"
+    assert numConversions == 6
+
+    # maps loaded with other materials aren't cached with them
+    importPath = files.getMapDir() / "imported"
+    oldState.objects[0].setName("imported")
+    files.saveMapState(importPath, oldState)
+    editorBricks = MaterialReference("bricks")
+    for i in range(0, 5):
+        editorBricks.addReference()
+    imported = files.loadMapState(importPath,
+                                  materials={"bricks": editorBricks})
+    assert imported.world.materials[0] is editorBricks
+    assert editorBricks.references == 5 + 12
+    loaded = files.loadMapState(importPath)
+    assert loaded.world.materials[0] is not editorBricks
+    assert loaded.world.materials[0].references == files.loadMapState(
+        importPath, useCache=False).world.materials[0].references
+    assert editorBricks.references == 5 + 12
+files.setGameDir(None)
+files.editorStateConverters[(1, 11)] = convert_1_11
+
+# test finding resources
+
+import os
+
+with tempfile.TemporaryDirectory() as directory:
+    directory = Path(directory)
+    (directory / "sub").mkdir()
+    for name in ("bricks.png", "wood.old.jpg", "README", "sub/stone.png"):
+        (directory / name).touch()
+    # an old modification time, so the directory can be indexed
+    for path in (directory, directory / "sub"):
+        os.utime(str(path), ns=(0, 0))
+    for i in range(0, 2):
+        assert files.getResourcePath(directory, "bricks") \
+            == directory / "bricks.png"
+        assert files.getResourcePath(directory, "wood.old") \
+            == directory / "wood.old.jpg"
+        assert files.getResourcePath(directory, "wood") is None
+        assert files.getResourcePath(directory, "README") \
+            == directory / "README"
+        assert files.getResourcePath(directory, "sub/stone") \
+            == (directory / "sub").resolve() / "stone.png"
+        assert files.getResourcePath(directory, "Sub/stone") is None
+        assert files.getResourcePath(directory, "missing/stone") is None
+    assert directory in files._resourceIndices
+    # the index is updated when the directory changes
+    (directory / "bricks.png").unlink()
+    (directory / "glass.png").touch()
+    assert files.getResourcePath(directory, "bricks") is None
+    assert files.getResourcePath(directory, "glass") \
+        == directory / "glass.png"
+    # a directory modified just now isn't indexed, because it could change
+    # again without its modification time changing
+    assert directory not in files._resourceIndices
+    (directory / "metal.png").touch()
+    assert files.getResourcePath(directory, "metal") \
+        == directory / "metal.png"
+
+# unchanged meshes are reused from the MeshCache
+meshCache = mapFile.MeshCache()
+state = makeState()
+first = mapFile.MapSnapshot(state, meshCache=meshCache)
+state.objects[1].getMesh().getVertices()[0].setPosition(Vector(9, 9, 9))
+second = mapFile.MapSnapshot(state, meshCache=meshCache)
+assert first.meshes[0][0] is second.meshes[0][0]
+assert first.meshes[1][0] is not second.meshes[1][0]
+checkState(state, mapFile.loadMap(second.toBytes()))
+
+
+print("Done.")
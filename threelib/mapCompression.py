@@ -0,0 +1,158 @@
+__author__ = "jacobvanthoog"
+
+# Compressed map files. A compressed map is a map file (see mapFile) which is
+# split into blocks that are compressed independently, so they can be
+# compressed and decompressed in parallel, and the start of the map (with the
+# table of contents) can be read without decompressing the rest.
+#
+# All numbers are little-endian. The file starts with a header:
+#
+#     8 bytes     MAGIC
+#     uint32      FORMAT_VERSION
+#     8 bytes     name of the codec, padded with zeros
+#     uint64      size of the uncompressed map file
+#     uint64      size of each uncompressed block (except the last)
+#     uint32      number of blocks
+#     for each block:
+#         uint64      compressed size
+#
+# followed by the compressed blocks.
+
+import os
+import struct
+import pickle
+import zlib
+import lzma
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+MAGIC = b'THREEMPZ'
+FORMAT_VERSION = 1
+
+BLOCK_SIZE = 1 << 20
+
+_HEADER = struct.Struct('<8sI8sQQI')
+_BLOCK = struct.Struct('<Q')
+
+# a codec has a function to compress a block of bytes, and one to decompress
+# it. They are called from multiple threads at once.
+Codec = namedtuple('Codec', ['compress', 'decompress'])
+
+# maps codec names to Codecs
+codecs = { }
+
+_executor = None
+
+
+def registerCodec(name, compress, decompress):
+    """
+    Add a codec which can be used to compress maps. ``name`` is stored in
+    the file, and can be up to 8 ASCII characters. ``compress`` and
+    ``decompress`` take a bytes-like object and return bytes.
+    """
+    if len(name.encode('ascii')) > 8:
+        raise ValueError("Codec name is too long: " + name)
+    codecs[name] = Codec(compress, decompress)
+
+registerCodec('zlib', lambda data: zlib.compress(data, 6), zlib.decompress)
+registerCodec('lzma', lzma.compress, lzma.decompress)
+
+
+def isCompressed(data):
+    """
+    Check if the bytes at the start of a file are the start of a compressed
+    map file.
+    """
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+def compress(data, codecName, blockSize=BLOCK_SIZE, progress=None):
+    """
+    Compress a buffer containing a map file with the named codec. Return a
+    list of bytes objects, which together make the compressed file.
+    ``progress`` is an optional function, which is called with the fraction
+    of blocks that have been compressed.
+    """
+    try:
+        codec = codecs[codecName]
+    except KeyError:
+        raise ValueError("Unknown compression codec: " + str(codecName))
+    with memoryview(data) as view:
+        view = view.cast('B')
+        blocks = [view[start:start + blockSize]
+                  for start in range(0, len(view), blockSize)]
+        compressedBlocks = [ ]
+        for block in _map(codec.compress, blocks):
+            compressedBlocks.append(block)
+            if progress is not None:
+                progress(len(compressedBlocks) / len(blocks))
+        header = [_HEADER.pack(MAGIC, FORMAT_VERSION,
+                               codecName.encode('ascii'), len(view),
+                               blockSize, len(blocks))]
+    header += [_BLOCK.pack(len(block)) for block in compressedBlocks]
+    return [b''.join(header)] + compressedBlocks
+
+def decompress(data, end=None):
+    """
+    Decompress a buffer containing a compressed map file. Return a bytearray
+    with the map file. If ``end`` is given, only the blocks needed for the
+    first ``end`` bytes are decompressed, and the result may be shorter than
+    the map file. Raise a ``pickle.UnpicklingError`` if the file is not
+    valid.
+    """
+    with memoryview(data) as view:
+        if len(view) < _HEADER.size:
+            raise pickle.UnpicklingError("Compressed map file is too short")
+        magic, version, codecName, size, blockSize, numBlocks = \
+            _HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise pickle.UnpicklingError("Not a compressed map file")
+        if version > FORMAT_VERSION:
+            raise pickle.UnpicklingError(
+                "Compressed map format version " + str(version)
+                + " is newer than this version of three")
+        codecName = codecName.rstrip(b'\0').decode('ascii', 'replace')
+        try:
+            codec = codecs[codecName]
+        except KeyError:
+            raise pickle.UnpicklingError(
+                "Unknown compression codec: " + codecName)
+        offset = _HEADER.size + _BLOCK.size * numBlocks
+        if len(view) < offset:
+            raise pickle.UnpicklingError("Compressed map file is truncated")
+        if end is not None and end < size:
+            numBlocks = min(numBlocks, -(-end // blockSize))
+            size = min(size, numBlocks * blockSize)
+
+        blocks = [ ]
+        for i in range(0, numBlocks):
+            compressedSize, = _BLOCK.unpack_from(view, _HEADER.size
+                                                 + _BLOCK.size * i)
+            blocks.append(view[offset:offset + compressedSize])
+            offset += compressedSize
+        if offset > len(view):
+            raise pickle.UnpicklingError("Compressed map file is truncated")
+
+        result = bytearray(size)
+        position = 0
+        try:
+            for block in _map(codec.decompress, blocks):
+                result[position:position + len(block)] = block
+                position += len(block)
+        except (zlib.error, lzma.LZMAError) as e:
+            raise pickle.UnpicklingError("Compressed map file is corrupt: "
+                                         + str(e))
+        if position != size:
+            raise pickle.UnpicklingError("Compressed map file is corrupt")
+        return result
+
+
+def _map(function, blocks):
+    # zlib and lzma release the GIL, so blocks are processed in parallel with
+    # threads. Results are in the same order as the blocks.
+    global _executor
+    if len(blocks) <= 1:
+        return map(function, blocks)
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=os.cpu_count(),
+                                       thread_name_prefix="mapCompression")
+    return _executor.map(function, blocks)
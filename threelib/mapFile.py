@@ -0,0 +1,778 @@
+__author__ = "jacobvanthoog"
+
+# The binary map file format. A map file is a header followed by sections:
+#
+# - ``contents``: a table of contents (see MapContents), encoded as JSON. It
+#   can be read without loading anything else.
+# - ``objects``: the EditorState, pickled. Meshes, faces, vertices, resources
+#   (like MaterialReferences) and scripts are not included in the pickle;
+#   instead they are saved as "persistent IDs" which refer to the other
+#   sections. Without meshes the object graph is shallow, so pickling doesn't
+#   need a large recursion limit.
+# - ``meshes``: every Mesh, stored as flat arrays (see CompactMesh).
+# - ``materials``: a pickled list of every Resource used by the objects and
+#   meshes.
+# - ``scripts``: the text of every multi-line string (scripts and
+#   constructors), encoded as UTF-8.
+#
+# All numbers are little-endian. The header is::
+#
+#     8 bytes     MAGIC
+#     uint32      FORMAT_VERSION
+#     uint32      number of sections
+#     for each section:
+#         16 bytes    name, padded with zeros
+#         uint64      offset from the start of the file
+#         uint64      size in bytes
+#
+# Each section starts at a multiple of 8 bytes, so the arrays of the meshes
+# section can be read directly from a memory-mapped file.
+#
+# Only classes from threelib (and a few harmless builtins) can be loaded from
+# the objects section.
+
+import struct
+import pickle
+import io
+import gc
+import contextlib
+import json
+from collections import namedtuple
+import numpy
+from threelib.vectorMath import Vector, Rotate
+from threelib.mesh import Mesh, MeshFace, MeshVertex
+from threelib.compactMesh import CompactMesh
+from threelib.world import Resource
+
+MAGIC = b'THREEMAP'
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct('<8sII')
+_SECTION = struct.Struct('<16sQQ')
+_COUNT = struct.Struct('<Q')
+_MESH_HEADER = struct.Struct('<QQQ')
+
+# files are written in pieces of this size when progress is reported
+_WRITE_CHUNK_SIZE = 1 << 20
+
+_SAFE_BUILTINS = {
+    ('builtins', 'set'), ('builtins', 'frozenset'), ('builtins', 'object'),
+    ('builtins', 'complex'), ('builtins', 'bytearray'),
+    ('collections', 'OrderedDict'), ('copyreg', '_reconstructor')
+}
+
+
+# information about one object in MapContents. ``parent`` is an index in the
+# list of objects, or None. ``bounds`` is a tuple of 2 Vectors, the minimum
+# and maximum in world space. ``numVertices`` and ``numFaces`` are 0 for
+# objects without a mesh.
+ObjectContents = namedtuple('ObjectContents', ['name', 'type', 'parent',
+                                               'position', 'bounds',
+                                               'numVertices', 'numFaces'])
+
+class MapContents:
+    """
+    A summary of a map which can be read without loading the whole map: the
+    file version, the names of the materials, and a list of ObjectContents.
+    """
+
+    @staticmethod
+    def fromState(state):
+        """
+        Create the contents of an EditorState.
+        """
+        contents = MapContents()
+        contents.majorVersion = state.MAJOR_VERSION
+        contents.minorVersion = state.MINOR_VERSION
+        contents.materials = [m.getName() for m in state.world.materials]
+        objectIndices = {id(o): i for i, o in enumerate(state.objects)}
+        for o in state.objects:
+            parent = objectIndices.get(id(o.getParent()))
+            position = o.getPosition()
+            mesh = o.getMesh()
+            if mesh is None:
+                bounds = (position, position)
+                numVertices = 0
+                numFaces = 0
+            else:
+                bounds = _rotatedBounds(mesh.getBounds(), o.getRotation())
+                bounds = (bounds[0] + position, bounds[1] + position)
+                numVertices = len(mesh.getVertices())
+                numFaces = len(mesh.getFaces())
+            contents.objects.append(ObjectContents(
+                o.getName(), o.getType(), parent, position, bounds,
+                numVertices, numFaces))
+        return contents
+
+    @staticmethod
+    def fromJSON(text):
+        """
+        Decode MapContents from a string created with ``toJSON``.
+        """
+        values = json.loads(text)
+        contents = MapContents()
+        contents.majorVersion, contents.minorVersion = values['version']
+        contents.materials = values['materials']
+        for o in values['objects']:
+            contents.objects.append(ObjectContents(
+                o['name'], o['type'], o['parent'],
+                Vector.fromTuple(o['position']),
+                (Vector.fromTuple(o['bounds'][0]),
+                 Vector.fromTuple(o['bounds'][1])),
+                o['vertices'], o['faces']))
+        return contents
+
+    def __init__(self):
+        self.majorVersion = 0
+        self.minorVersion = 0
+        self.materials = [ ]
+        self.objects = [ ]
+
+    def toJSON(self):
+        """
+        Encode the contents as a JSON string.
+        """
+        return json.dumps({
+            'version': [self.majorVersion, self.minorVersion],
+            'materials': self.materials,
+            'objects': [{
+                'name': o.name, 'type': o.type, 'parent': o.parent,
+                'position': o.position.getTuple(),
+                'bounds': [o.bounds[0].getTuple(), o.bounds[1].getTuple()],
+                'vertices': o.numVertices, 'faces': o.numFaces
+            } for o in self.objects]
+        })
+
+    def numVertices(self):
+        """
+        Get the total number of mesh vertices of all objects.
+        """
+        return sum(o.numVertices for o in self.objects)
+
+    def numFaces(self):
+        """
+        Get the total number of mesh faces of all objects.
+        """
+        return sum(o.numFaces for o in self.objects)
+
+    def getBounds(self):
+        """
+        Get the bounds of all objects, as a tuple of 2 Vectors. Return None if
+        there are no objects.
+        """
+        if len(self.objects) == 0:
+            return None
+        lows = [o.bounds[0] for o in self.objects]
+        highs = [o.bounds[1] for o in self.objects]
+        return (Vector(min(v.x for v in lows), min(v.y for v in lows),
+                       min(v.z for v in lows)),
+                Vector(max(v.x for v in highs), max(v.y for v in highs),
+                       max(v.z for v in highs)))
+
+
+def _rotatedBounds(bounds, rotate):
+    # the bounds of a box after rotating it
+    if rotate is None or rotate.isZero():
+        return bounds
+    low, high = bounds
+    corners = rotate.rotateVectors(
+        [Vector(x, y, z) for x in (low.x, high.x) for y in (low.y, high.y)
+         for z in (low.z, high.z)])
+    return (Vector(min(c.x for c in corners), min(c.y for c in corners),
+                   min(c.z for c in corners)),
+            Vector(max(c.x for c in corners), max(c.y for c in corners),
+                   max(c.z for c in corners)))
+
+
+def isMapFile(data):
+    """
+    Check if the bytes at the start of a file are the start of a binary map
+    file (as opposed to a legacy pickled map).
+    """
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+def saveMap(f, state):
+    """
+    Write an EditorState to a binary file object in the map format.
+    """
+    MapSnapshot(state, contents=True).write(f)
+
+def dumpFragment(obj, persistentId=None):
+    """
+    Encode any object that could be part of a map (for example a single
+    EditorObject) in the same format as a map file, without a table of
+    contents. Return bytes.
+
+    ``persistentId`` is an optional function, called for each object in the
+    graph. If it returns something other than None, the object is not saved;
+    instead the return value is passed to the ``persistentLoad`` function of
+    ``loadFragment``. It can be used to refer to objects outside of the
+    fragment.
+    """
+    return MapSnapshot(obj, persistentId).toBytes()
+
+def loadFragment(data, persistentLoad=None, materials=None):
+    """
+    Load an object from a buffer created with ``dumpFragment``.
+    ``persistentLoad`` is a function which takes the values returned by
+    the ``persistentId`` function. ``materials`` is the same as for
+    ``loadMap``.
+    """
+    return loadMap(data, materials=materials, persistentLoad=persistentLoad)
+
+
+class MeshCache:
+    """
+    Remembers the CompactMesh made from each Mesh, until the Mesh is modified.
+    MapSnapshots taken with the same MeshCache only have to convert the meshes
+    that changed since the last snapshot.
+    """
+
+    def __init__(self):
+        # maps the id of a Mesh to a tuple of the Mesh (so the id isn't
+        # reused), its version, and the CompactMesh
+        self.meshes = { }
+        self.used = set()
+
+    def get(self, mesh):
+        """
+        Get a CompactMesh with the current contents of a Mesh.
+        """
+        self.used.add(id(mesh))
+        version = mesh.getVersion()
+        entry = self.meshes.get(id(mesh))
+        if entry is not None and entry[0] is mesh and entry[1] == version:
+            return entry[2]
+        compact = CompactMesh.fromMesh(mesh)
+        self.meshes[id(mesh)] = (mesh, version, compact)
+        return compact
+
+    def forgetUnused(self):
+        """
+        Forget every Mesh that hasn't been used since the last time this was
+        called.
+        """
+        self.meshes = {key: entry for key, entry in self.meshes.items()
+                       if key in self.used}
+        self.used = set()
+
+
+class MapSnapshot:
+    """
+    A copy of an object (usually an EditorState) prepared for saving in the
+    map format. Taking the snapshot pickles the objects and copies the meshes
+    into CompactMeshes; after that the object can keep changing while the
+    snapshot is encoded and written, for example on another thread.
+    """
+
+    def __init__(self, obj, persistentId=None, meshCache=None,
+                 contents=False):
+        """
+        ``persistentId`` is the same as for ``dumpFragment``. ``meshCache`` is
+        an optional MeshCache to reuse meshes from earlier snapshots. If
+        ``contents`` is True, the snapshot includes a table of contents, which
+        requires ``obj`` to be an EditorState.
+        """
+        if meshCache is None:
+            meshCache = MeshCache()
+        with _pauseGarbageCollection():
+            if contents:
+                self.contentsData = MapContents.fromState(obj).toJSON() \
+                    .encode('utf-8')
+            else:
+                self.contentsData = None
+            pickler = _MapPickler(persistentId)
+            self.objectsData = pickler.dumps(obj)
+            # meshes must be copied before the materials are pickled, because
+            # they find more resources
+            self.meshes = [ ]
+            for mesh in pickler.meshes:
+                compact = meshCache.get(mesh)
+                # material IDs are indices into the shared list of resources
+                materialIds = numpy.array(
+                    [_addResource(m, pickler.resources,
+                                  pickler.resourceIndices)
+                     for m in compact.materials] + [-1], dtype='<i8')
+                self.meshes.append((compact,
+                                    materialIds[compact.materialIds]))
+            self.materialsData = pickle.dumps(pickler.resources, protocol=4)
+            self.scripts = pickler.scripts
+
+    def sections(self):
+        """
+        Encode the snapshot. Return a list of tuples of section name and
+        bytes.
+        """
+        sections = [(b'objects', self.objectsData),
+                    (b'meshes', _encodeMeshes(self.meshes)),
+                    (b'materials', self.materialsData),
+                    (b'scripts', _encodeScripts(self.scripts))]
+        if self.contentsData is not None:
+            sections.insert(0, (b'contents', self.contentsData))
+        return sections
+
+    def write(self, f, progress=None):
+        """
+        Write the snapshot to a binary file object. ``progress`` is an
+        optional function, which is called with the fraction of the file
+        that has been written.
+        """
+        _writeSections(f, self.sections(), progress)
+
+    def toBytes(self):
+        """
+        Encode the snapshot as a map file in memory. Return bytes.
+        """
+        f = io.BytesIO()
+        self.write(f)
+        return f.getvalue()
+
+
+def readContents(data):
+    """
+    Read the MapContents of a buffer containing a binary map file, without
+    loading anything else. The buffer only needs to contain the start of the
+    file, up to ``contentsEnd``. Return None if the file doesn't have a table
+    of contents. Raise a ``pickle.UnpicklingError`` if the file is not valid.
+    """
+    with memoryview(data) as view:
+        # the rest of the file isn't needed
+        sections = _readSections(view, checkSize=False)
+        if b'contents' not in sections:
+            return None
+        if sections[b'contents'].stop > len(view):
+            raise pickle.UnpicklingError("Map file is truncated")
+        try:
+            return MapContents.fromJSON(
+                str(view[sections[b'contents']], 'utf-8'))
+        except (ValueError, KeyError, TypeError) as e:
+            raise pickle.UnpicklingError("Invalid map contents: " + str(e))
+
+def contentsEnd(data):
+    """
+    Get the offset in a binary map file where the table of contents ends,
+    which is all ``readContents`` needs. ``data`` is a buffer containing at
+    least the header of the file. Return 0 if the file doesn't have a table
+    of contents.
+    """
+    with memoryview(data) as view:
+        sections = _readSections(view, checkSize=False)
+    if b'contents' not in sections:
+        return 0
+    return sections[b'contents'].stop
+
+def loadMap(data, lazy=False, materials=None, persistentLoad=None):
+    """
+    Load an EditorState from a buffer (like bytes or an mmap) containing a
+    binary map file. Raise a ``pickle.UnpicklingError`` if the file is not
+    valid, or can't be read by this version.
+
+    If ``lazy`` is True, the vertices and faces of each mesh are only decoded
+    the first time the mesh is used. The buffer doesn't need to stay open.
+
+    ``materials`` is an optional dictionary of material names to
+    MaterialReferences, which will be used instead of the materials with the
+    same names saved in the map. A reference is added to them for each face
+    that uses them. Other materials found in the map are added to the
+    dictionary.
+    """
+    with _pauseGarbageCollection(), memoryview(data) as view:
+        sections = _readSections(view)
+        try:
+            loader = _MapLoader(view, sections, lazy, materials,
+                                persistentLoad)
+            try:
+                return loader.loads(view[sections[b'objects']])
+            finally:
+                loader.close()
+        except KeyError as e:
+            raise pickle.UnpicklingError("Missing map section " + str(e))
+
+
+@contextlib.contextmanager
+def _pauseGarbageCollection():
+    # saving and loading create many objects at once but very little garbage,
+    # so the garbage collector would run many times for nothing
+    gcEnabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gcEnabled:
+            gc.enable()
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+def _writeSections(f, sections, progress=None):
+    offset = _align(_HEADER.size + _SECTION.size * len(sections))
+    header = [_HEADER.pack(MAGIC, FORMAT_VERSION, len(sections))]
+    for name, data in sections:
+        header.append(_SECTION.pack(name, offset, len(data)))
+        offset = _align(offset + len(data))
+    totalSize = offset
+    f.write(b''.join(header))
+    position = _HEADER.size + _SECTION.size * len(sections)
+    for name, data in sections:
+        f.write(bytes(_align(position) - position))
+        position = _align(position)
+        if progress is None:
+            f.write(data)
+            position += len(data)
+            continue
+        with memoryview(data) as view:
+            for start in range(0, len(view), _WRITE_CHUNK_SIZE):
+                chunk = view[start:start + _WRITE_CHUNK_SIZE]
+                f.write(chunk)
+                position += len(chunk)
+                progress(position / totalSize)
+    if progress is not None:
+        progress(1.0)
+
+def _readSections(view, checkSize=True):
+    # returns a dictionary of section names to slices
+    if len(view) < _HEADER.size:
+        raise pickle.UnpicklingError("Map file is too short")
+    magic, version, numSections = _HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise pickle.UnpicklingError("Not a map file")
+    if version > FORMAT_VERSION:
+        raise pickle.UnpicklingError(
+            "Map file format version " + str(version)
+            + " is newer than this version of three")
+    sections = { }
+    for i in range(0, numSections):
+        name, offset, size = _SECTION.unpack_from(
+            view, _HEADER.size + _SECTION.size * i)
+        if checkSize and offset + size > len(view):
+            raise pickle.UnpicklingError("Map file is truncated")
+        sections[name.rstrip(b'\0')] = slice(offset, offset + size)
+    return sections
+
+
+class _MapPickler:
+    # pickles the object graph, and collects the objects that are stored in
+    # other sections
+
+    def __init__(self, extraPersistentId=None):
+        self.extraPersistentId = extraPersistentId
+        self.meshes = [ ]
+        self.meshIndices = { }
+        self.faceIndices = { } # maps mesh index to dict of face indices
+        self.vertexIndices = { }
+        self.resources = [ ]
+        self.resourceIndices = { }
+        self.scripts = [ ]
+        self.scriptIndices = { }
+
+    def dumps(self, obj):
+        f = io.BytesIO()
+        pickler = pickle.Pickler(f, protocol=4)
+        pickler.persistent_id = self.persistentId
+        pickler.dump(obj)
+        return f.getvalue()
+
+    def persistentId(self, obj):
+        if self.extraPersistentId is not None:
+            pid = self.extraPersistentId(obj)
+            if pid is not None:
+                return ('extra', pid)
+        t = type(obj)
+        if t is str:
+            if '\n' not in obj:
+                return None
+            try:
+                return ('script', self.scriptIndices[obj])
+            except KeyError:
+                self.scriptIndices[obj] = len(self.scripts)
+                self.scripts.append(obj)
+                return ('script', len(self.scripts) - 1)
+        if t is Mesh or t is _UnloadedMesh:
+            return ('mesh', self._meshIndex(obj))
+        if t is MeshFace or t is MeshVertex:
+            # faces and vertices of saved meshes, usually from selections
+            mesh = getattr(obj, 'mesh', None)
+            if type(mesh) is not Mesh:
+                return None
+            meshIndex = self._meshIndex(mesh)
+            if t is MeshFace:
+                indices = self.faceIndices.get(meshIndex)
+                if indices is None:
+                    indices = {id(f): i for i, f in enumerate(mesh.getFaces())}
+                    self.faceIndices[meshIndex] = indices
+                kind = 'face'
+            else:
+                indices = self.vertexIndices.get(meshIndex)
+                if indices is None:
+                    indices = {id(v): i
+                               for i, v in enumerate(mesh.getVertices())}
+                    self.vertexIndices[meshIndex] = indices
+                kind = 'vertex'
+            try:
+                return (kind, meshIndex, indices[id(obj)])
+            except KeyError:
+                return None
+        if isinstance(obj, Resource):
+            return ('resource', _addResource(obj, self.resources,
+                                             self.resourceIndices))
+        return None
+
+    def _meshIndex(self, mesh):
+        try:
+            return self.meshIndices[id(mesh)]
+        except KeyError:
+            self.meshIndices[id(mesh)] = len(self.meshes)
+            self.meshes.append(mesh)
+            return len(self.meshes) - 1
+
+
+def _addResource(resource, resources, resourceIndices):
+    try:
+        return resourceIndices[id(resource)]
+    except KeyError:
+        resourceIndices[id(resource)] = len(resources)
+        resources.append(resource)
+        return len(resources) - 1
+
+def _encodeMeshes(meshes):
+    # ``meshes`` is a list of tuples of CompactMesh and material IDs
+    blocks = [ ]
+    for compact, materialIds in meshes:
+        arrays = (compact.positions, compact.faceOffsets, compact.faceIndices,
+                  compact.textureVertices, materialIds,
+                  compact.textureShifts, compact.textureRotates,
+                  compact.textureScales)
+        blocks.append(_MESH_HEADER.pack(compact.numVertices(),
+                                        compact.numFaces(),
+                                        compact.numCorners())
+                      + b''.join(_littleEndian(a).tobytes() for a in arrays))
+
+    offset = _COUNT.size * (len(blocks) + 1)
+    table = [_COUNT.pack(len(blocks))]
+    for block in blocks:
+        table.append(_COUNT.pack(offset))
+        offset += len(block)
+    return b''.join(table + blocks)
+
+def _littleEndian(array):
+    if array.dtype.kind == 'f':
+        return array.astype('<f8', copy=False)
+    return array.astype('<i8', copy=False)
+
+def _encodeScripts(scripts):
+    encoded = [s.encode('utf-8') for s in scripts]
+    offsets = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    return _COUNT.pack(len(encoded)) \
+        + numpy.array(offsets, dtype='<i8').tobytes() + b''.join(encoded)
+
+
+class _MapUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, loader):
+        super().__init__(file)
+        self.loader = loader
+
+    def persistent_load(self, pid):
+        return self.loader.persistentLoad(pid)
+
+    def find_class(self, module, name):
+        if (module, name) in _SAFE_BUILTINS \
+                or (module.startswith('threelib.') and '.' not in name):
+            cls = super().find_class(module, name)
+            if isinstance(cls, type) or (module, name) in _SAFE_BUILTINS:
+                return cls
+        raise pickle.UnpicklingError(
+            "Map files can't contain " + module + "." + name)
+
+
+class _MapLoader:
+    # decodes the meshes, resources and scripts which are referred to by
+    # persistent IDs in the objects section
+
+    def __init__(self, view, sections, lazy=False, materials=None,
+                 extraPersistentLoad=None):
+        self.lazy = lazy
+        self.extraPersistentLoad = extraPersistentLoad
+        if lazy:
+            # meshes are decoded after the buffer is closed
+            self.meshesView = memoryview(bytes(view[sections[b'meshes']]))
+        else:
+            self.meshesView = view[sections[b'meshes']]
+        self.scriptsView = view[sections[b'scripts']]
+        self.resources = _MapUnpickler(
+            _BufferReader(view[sections[b'materials']]), self).load()
+        if materials is not None:
+            self._replaceResources(materials)
+        self.meshes = { }
+        self.scripts = { }
+        self.scriptOffsets = numpy.frombuffer(
+            self.scriptsView, dtype='<i8',
+            count=_COUNT.unpack_from(self.scriptsView, 0)[0] + 1,
+            offset=_COUNT.size).tolist()
+        self.scriptsStart = _COUNT.size * (len(self.scriptOffsets) + 1)
+
+    def loads(self, data):
+        return _MapUnpickler(_BufferReader(data), self).load()
+
+    def close(self):
+        # release views of the buffer, so an mmap can be closed
+        if not self.lazy:
+            self.meshesView.release()
+        self.scriptsView.release()
+
+    def _replaceResources(self, materials):
+        replaced = [ ]
+        for i, resource in enumerate(self.resources):
+            name = getattr(resource, 'name', None)
+            replacement = materials.get(name)
+            if replacement is None:
+                if name is not None:
+                    materials[name] = resource
+            elif replacement is not resource:
+                self.resources[i] = replacement
+                replaced.append(i)
+        if len(replaced) == 0:
+            return
+        # count the faces that use each resource, without decoding meshes
+        counts = numpy.zeros(len(self.resources), dtype=numpy.int64)
+        for index in range(0, self._numMeshes()):
+            materialIds = self._meshArrays(index)[4]
+            counts += numpy.bincount(materialIds[materialIds >= 0],
+                                     minlength=len(self.resources))
+        for i in replaced:
+            for j in range(0, int(counts[i])):
+                self.resources[i].addReference()
+
+    def _numMeshes(self):
+        return _COUNT.unpack_from(self.meshesView, 0)[0]
+
+    def persistentLoad(self, pid):
+        kind = pid[0]
+        if kind == 'script':
+            return self._script(pid[1])
+        if kind == 'mesh':
+            return self._mesh(pid[1])
+        if kind == 'face':
+            return self._mesh(pid[1]).getFaces()[pid[2]]
+        if kind == 'vertex':
+            return self._mesh(pid[1]).getVertices()[pid[2]]
+        if kind == 'resource':
+            return self.resources[pid[1]]
+        if kind == 'extra' and self.extraPersistentLoad is not None:
+            return self.extraPersistentLoad(pid[1])
+        raise pickle.UnpicklingError("Unknown persistent ID " + repr(pid))
+
+    def _script(self, index):
+        try:
+            return self.scripts[index]
+        except KeyError:
+            start = self.scriptsStart + self.scriptOffsets[index]
+            end = self.scriptsStart + self.scriptOffsets[index + 1]
+            script = str(self.scriptsView[start:end], 'utf-8')
+            self.scripts[index] = script
+            return script
+
+    def _mesh(self, index):
+        try:
+            return self.meshes[index]
+        except KeyError:
+            if self.lazy:
+                mesh = _UnloadedMesh(self, index)
+            else:
+                mesh = self.decodeMesh(index)
+            self.meshes[index] = mesh
+            return mesh
+
+    def decodeMesh(self, index):
+        compact = CompactMesh(*self._meshArrays(index))
+        # reference counts were saved with the resources
+        return compact.toMesh(addReferences=False)
+
+    def _meshArrays(self, index):
+        # the arguments for a CompactMesh
+        view = self.meshesView
+        offset = _COUNT.unpack_from(view, _COUNT.size * (index + 1))[0]
+        numVertices, numFaces, numCorners = \
+            _MESH_HEADER.unpack_from(view, offset)
+        offset += _MESH_HEADER.size
+
+        def read(dtype, count, shape):
+            nonlocal offset
+            array = numpy.frombuffer(view, dtype=dtype, count=count,
+                                     offset=offset)
+            offset += array.nbytes
+            return array.reshape(shape)
+
+        positions = read('<f8', numVertices * 3, (-1, 3))
+        faceOffsets = read('<i8', numFaces + 1, (-1, ))
+        faceIndices = read('<i8', numCorners, (-1, ))
+        textureVertices = read('<f8', numCorners * 3, (-1, 3))
+        materialIds = read('<i8', numFaces, (-1, ))
+        textureShifts = read('<f8', numFaces * 3, (-1, 3))
+        textureRotates = read('<f8', numFaces, (-1, ))
+        textureScales = read('<f8', numFaces * 3, (-1, 3))
+        return (positions, faceOffsets, faceIndices, textureVertices,
+                materialIds, self.resources, textureShifts, textureRotates,
+                textureScales)
+
+
+class _UnloadedMesh(Mesh):
+    # a Mesh from a map loaded with lazy=True. The first time any attribute
+    # that a Mesh would have is used, the mesh is decoded and this object
+    # becomes a normal Mesh.
+
+    def __init__(self, loader, index):
+        # Mesh.__init__ is not called
+        self._mapLoader = loader
+        self._mapIndex = index
+
+    def __getattr__(self, name):
+        # only called for attributes that don't exist yet
+        if name.startswith('__') or '_mapLoader' not in self.__dict__:
+            raise AttributeError(name)
+        self._load()
+        return getattr(self, name)
+
+    def __reduce_ex__(self, protocol):
+        self._load()
+        return self.__reduce_ex__(protocol)
+
+    def _load(self):
+        mesh = self._mapLoader.decodeMesh(self._mapIndex)
+        self.__dict__.clear()
+        self.__dict__.update(mesh.__dict__)
+        self.__class__ = Mesh
+        for v in self.vertices:
+            v.mesh = self
+        for face in self.faces:
+            face.mesh = self
+
+
+class _BufferReader:
+    # a minimal file object for reading a memoryview without copying it
+
+    def __init__(self, view):
+        self.view = view
+        self.position = 0
+
+    def read(self, size=-1):
+        if size < 0:
+            size = len(self.view) - self.position
+        data = self.view[self.position:self.position + size]
+        self.position += len(data)
+        return bytes(data)
+
+    def readinto(self, b):
+        data = self.view[self.position:self.position + len(b)]
+        b[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def readline(self):
+        end = self.position
+        while end < len(self.view) and self.view[end] != ord('\n'):
+            end += 1
+        return self.read(end + 1 - self.position)
@@ -4,11 +4,54 @@ from threelib import files
 from array import array
 import struct
 import math
+import os
+import hashlib
+import numpy
+import collections
+from concurrent.futures import ThreadPoolExecutor
 from threelib.world import Resource
 
 # for texture scaling
 from PIL import Image
 
+# Textures are cached in the cache directory of the game, so images don't have
+# to be decoded and resized every time they are loaded. A cached texture file
+# has a header:
+#
+#     8 bytes     TEXTURE_CACHE_MAGIC
+#     uint32      TEXTURE_CACHE_VERSION
+#     uint64      size of the image file
+#     uint64      modification time of the image file, in nanoseconds
+#     8 bytes     PIL image mode, padded with zeros
+#     uint32      width
+#     uint32      height
+#     double      aspect ratio
+#     8 bytes     mipmap filter (see MIPMAP_FILTERS), or zeros if there are no
+#                 mipmaps
+#     uint32      number of mipmap levels, not including the full image
+#
+# followed by the pixels of the full image, then the pixels of each mipmap. If
+# the image file changes, its size or modification time won't match and the
+# texture is loaded again.
+
+TEXTURE_CACHE_MAGIC = b'THREETEX'
+TEXTURE_CACHE_VERSION = 2
+
+_TEXTURE_HEADER = struct.Struct('<8sIQQ8sIId8sI')
+
+# ways to filter each mipmap from the level above it: 'box' averages each 2x2
+# block of pixels, 'lanczos' uses a Lanczos-3 filter which keeps textures
+# sharper
+MIPMAP_FILTERS = ('box', 'lanczos')
+
+# the Lanczos-3 filter for halving an image, for pixels at these offsets from
+# twice the output pixel
+_LANCZOS_OFFSETS = numpy.arange(-5, 7)
+_LANCZOS_WEIGHTS = numpy.sinc((_LANCZOS_OFFSETS - 0.5) / 2) \
+    * numpy.sinc((_LANCZOS_OFFSETS - 0.5) / 6)
+_LANCZOS_WEIGHTS = (_LANCZOS_WEIGHTS / _LANCZOS_WEIGHTS.sum()) \
+    .astype(numpy.float32)
+
 def isPowerOf2(num):
     # from:
     # code.activestate.com/recipes/577514-chek-if-a-number-is-a-power-of-two/
@@ -18,15 +61,21 @@ class Texture:
     """
     A texture image
     """
-    def __init__(self, data, dataType, xLen, yLen):
-        self.data = data
+    def __init__(self, data, dataType, xLen, yLen, mipmaps=None):
+        """
+        ``data`` is a bytes-like object with the pixels. It isn't copied.
+        ``mipmaps`` is an optional list of Textures (see ``getMipmaps``).
+        """
+        self.data = numpy.frombuffer(data, dtype=numpy.uint8)
         self.dataType = dataType
         self.xLen = xLen
         self.yLen = yLen
+        self.mipmaps = [ ] if mipmaps is None else mipmaps
 
     def getData(self):
         """
-        An array of chars, of size xLen * yLen * numChannels.
+        A NumPy array of unsigned bytes, of size xLen * yLen * numChannels. It
+        shares memory with the buffer the Texture was created with.
         """
         return self.data
 
@@ -49,6 +98,64 @@ class Texture:
         """
         return self.dataType
 
+    def getMipmaps(self):
+        """
+        Get a list of Textures for each mipmap level after the full image,
+        each half the size of the one before, down to 1x1. The list is empty
+        if the texture doesn't have mipmaps.
+        """
+        return self.mipmaps
+
+
+def buildMipmaps(texture, mipmapFilter='box'):
+    """
+    Build the mipmaps of a Texture with power of 2 dimensions. ``mipmapFilter``
+    is one of MIPMAP_FILTERS. Return a list of Textures, like
+    ``Texture.getMipmaps``. The texture wraps around at the edges, like it
+    does when it's drawn.
+    """
+    if mipmapFilter == 'box':
+        downsample = _boxDownsample
+    elif mipmapFilter == 'lanczos':
+        downsample = _lanczosDownsample
+    else:
+        raise ValueError("Unknown mipmap filter: " + str(mipmapFilter))
+    xLen = texture.getXLen()
+    yLen = texture.getYLen()
+    # each level is filtered from the one above it, without rounding
+    pixels = texture.getData().reshape(yLen, xLen, -1).astype(numpy.float32)
+    mipmaps = [ ]
+    while xLen > 1 or yLen > 1:
+        if yLen > 1:
+            pixels = downsample(pixels, 0)
+            yLen //= 2
+        if xLen > 1:
+            pixels = downsample(pixels, 1)
+            xLen //= 2
+        numpy.clip(pixels, 0, 255, out=pixels)
+        data = numpy.rint(pixels).astype(numpy.uint8)
+        mipmaps.append(Texture(data.ravel(), texture.getDataType(),
+                               xLen, yLen))
+    return mipmaps
+
+def _boxDownsample(pixels, axis):
+    # average each pair of pixels along the axis
+    if axis == 0:
+        return (pixels[0::2] + pixels[1::2]) * 0.5
+    return (pixels[:, 0::2] + pixels[:, 1::2]) * 0.5
+
+def _lanczosDownsample(pixels, axis):
+    size = pixels.shape[axis]
+    outputIndices = numpy.arange(0, size // 2) * 2
+    result = None
+    for offset, weight in zip(_LANCZOS_OFFSETS, _LANCZOS_WEIGHTS):
+        tap = numpy.take(pixels, (outputIndices + offset) % size, axis=axis)
+        if result is None:
+            result = tap * weight
+        else:
+            result += tap * weight
+    return result
+
 
 class MaterialReference(Resource):
     """
@@ -110,16 +217,30 @@ class MaterialReference(Resource):
         # TODO: what is this used for?
         return self.hasTexture
 
-    def loadAlbedoTexture(self):
+    def loadAlbedoTexture(self, mipmapFilter=None):
         """
         Load the albedo texture for this material, and return a Texture object.
-        The albedo is the base color of the material.
+        The albedo is the base color of the material. If ``mipmapFilter`` is
+        one of MIPMAP_FILTERS, the texture includes mipmaps built with that
+        filter.
         """
         materialPath = files.getMaterial(self.name)
         if materialPath is None:
             print("Material not found:", self.name)
             return None
 
+        cached = _readCachedTexture(materialPath)
+        if cached is not None:
+            print("Read cached texture for", materialPath)
+            texture, self.aspectRatio, cachedFilter = cached
+            self.hasTexture = True
+            if mipmapFilter is None:
+                texture.mipmaps = [ ]
+            elif mipmapFilter != cachedFilter:
+                texture.mipmaps = buildMipmaps(texture, mipmapFilter)
+                _cacheTexture(materialPath, texture, mipmapFilter)
+            return texture
+
         print("Reading image at", materialPath)
         image = Image.open(materialPath)
         image.load()
@@ -130,18 +251,151 @@ class MaterialReference(Resource):
 
         # dimensions need to be a power of 2
         if not (isPowerOf2(xLen) and isPowerOf2(yLen)):
-            print("Scaling from", str(xLen) + ", " + str(yLen), end=' ')
+            oldSize = str(xLen) + ", " + str(yLen)
             # search upwards for the next power of 2
             xLen = 2 ** math.ceil(math.log(xLen, 2))
             yLen = 2 ** math.ceil(math.log(yLen, 2))
-            print("to", str(xLen) + ", " + str(yLen))
+            # one print, because textures can be loaded on multiple threads
+            print("Scaling from", oldSize, "to", str(xLen) + ", " + str(yLen))
 
             image = image.resize((xLen, yLen), Image.BICUBIC)
         else:
             print("Size is", str(xLen) + ", " + str(yLen))
 
-        texture = list(image.tobytes())
+        texture = Texture(image.tobytes(), image.mode, xLen, yLen)
+        if mipmapFilter is not None:
+            texture.mipmaps = buildMipmaps(texture, mipmapFilter)
+        _cacheTexture(materialPath, texture, mipmapFilter)
         self.hasTexture = True
         self.aspectRatio = float(xLen) / float(yLen)
-        return Texture(texture, image.mode, xLen, yLen)
+        return texture
+
+
+def loadAlbedoTextures(materials, numThreads=None, mipmapFilter=None):
+    """
+    Load the albedo textures of a list of MaterialReferences on a pool of
+    threads (``numThreads`` defaults to the number of CPUs). ``mipmapFilter``
+    is passed to ``loadAlbedoTexture``. Return an iterator
+    of tuples of a material and its Texture, or None if it couldn't be loaded,
+    in the same order as the list. Each texture is returned as soon as it has
+    loaded, while the threads keep loading the next ones. Errors are printed
+    by the thread using the iterator, in order.
+    """
+    if len(materials) == 0:
+        return
+    if numThreads is None:
+        numThreads = os.cpu_count() or 1
+    if len(materials) == 1 or numThreads == 1:
+        for material in materials:
+            yield material, _loadAlbedoTexture(material, mipmapFilter)
+        return
+
+    # only a few textures are loaded ahead, so they don't all have to be in
+    # memory at once
+    with ThreadPoolExecutor(max_workers=numThreads,
+                            thread_name_prefix="loadTextures") as executor:
+        futures = collections.deque()
+        materialIter = iter(materials)
+
+        def loadNext():
+            material = next(materialIter, None)
+            if material is not None:
+                futures.append((material,
+                                executor.submit(_loadTexture, material,
+                                                mipmapFilter)))
+
+        for i in range(0, numThreads * 2):
+            loadNext()
+        while len(futures) != 0:
+            material, future = futures.popleft()
+            loadNext()
+            texture, error = future.result()
+            if error is not None:
+                _printTextureError(material, error)
+            yield material, texture
+
+def _loadAlbedoTexture(material, mipmapFilter):
+    texture, error = _loadTexture(material, mipmapFilter)
+    if error is not None:
+        _printTextureError(material, error)
+    return texture
+
+def _loadTexture(material, mipmapFilter):
+    # return a tuple of the Texture and an exception
+    try:
+        return material.loadAlbedoTexture(mipmapFilter), None
+    except Exception as e:
+        return None, e
+
+def _printTextureError(material, error):
+    print("Error loading material", material.getName() + ":", error)
+
+
+def _textureCachePath(materialPath):
+    # cached textures are named by the hash of the full path of the image
+    if files.getGameDir() is None:
+        return None
+    key = str(materialPath.resolve()).encode('utf-8')
+    return files.getTextureCacheDir() / (hashlib.sha1(key).hexdigest()
+                                         + ".tex")
+
+def _readCachedTexture(materialPath):
+    # return a tuple of a Texture, the aspect ratio, and the mipmap filter (or
+    # None), or None if it isn't cached or the image has changed
+    cachePath = _textureCachePath(materialPath)
+    if cachePath is None:
+        return None
+    try:
+        stat = materialPath.stat()
+        with cachePath.open('rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < _TEXTURE_HEADER.size:
+        return None
+    magic, version, size, mtime, mode, xLen, yLen, aspectRatio, \
+        mipmapFilter, numMipmaps = _TEXTURE_HEADER.unpack_from(data, 0)
+    if magic != TEXTURE_CACHE_MAGIC or version != TEXTURE_CACHE_VERSION \
+            or (size, mtime) != (stat.st_size, stat.st_mtime_ns):
+        return None
+    mode = mode.rstrip(b'\0').decode('ascii')
+    mipmapFilter = mipmapFilter.rstrip(b'\0').decode('ascii') or None
+
+    # the full image and the mipmaps share the buffer that was read
+    view = memoryview(data)
+    offset = _TEXTURE_HEADER.size
+    textures = [ ]
+    for level in range(0, numMipmaps + 1):
+        levelSize = max(xLen >> level, 1) * max(yLen >> level, 1) * len(mode)
+        if offset + levelSize > len(view):
+            return None
+        textures.append(Texture(view[offset:offset + levelSize], mode,
+                                max(xLen >> level, 1), max(yLen >> level, 1)))
+        offset += levelSize
+    if offset != len(view):
+        return None
+    textures[0].mipmaps = textures[1:]
+    return textures[0], aspectRatio, mipmapFilter
 
+def _cacheTexture(materialPath, texture, mipmapFilter):
+    cachePath = _textureCachePath(materialPath)
+    if cachePath is None:
+        return
+    tempPath = cachePath.with_name(cachePath.name + ".saving")
+    mipmaps = texture.getMipmaps()
+    try:
+        stat = materialPath.stat()
+        cachePath.parent.mkdir(parents=True, exist_ok=True)
+        with tempPath.open('wb') as f:
+            f.write(_TEXTURE_HEADER.pack(
+                TEXTURE_CACHE_MAGIC, TEXTURE_CACHE_VERSION, stat.st_size,
+                stat.st_mtime_ns, texture.getDataType().encode('ascii'),
+                texture.getXLen(), texture.getYLen(),
+                float(texture.getXLen()) / float(texture.getYLen()),
+                (mipmapFilter or "").encode('ascii'), len(mipmaps)))
+            for level in [texture] + mipmaps:
+                f.write(level.getData())
+        os.replace(str(tempPath), str(cachePath))
+    except OSError as e:
+        print("The texture couldn't be cached.")
+        print(e)
@@ -0,0 +1,69 @@
+__author__ = "jacobvanthoog"
+
+# run from the root directory with: python3 -m threelib.materialsBenchmark
+
+import os
+import io
+import time
+import shutil
+import tempfile
+import contextlib
+from pathlib import Path
+import numpy
+from PIL import Image
+from threelib import files
+from threelib.materials import MaterialReference, loadAlbedoTextures
+from threelib.materials import Texture, buildMipmaps
+
+
+def makeMaterials(numMaterials, size):
+    # noisy images, which take a while to decode, and aren't a power of 2
+    random = numpy.random.RandomState(0)
+    for i in range(0, numMaterials):
+        pixels = random.randint(0, 256, (size[1], size[0], 3), numpy.uint8)
+        Image.fromarray(pixels, 'RGB').save(
+            str(files.getMaterialDir() / "material{}.png".format(i)))
+
+def timeLoad(numMaterials, numThreads):
+    materials = [MaterialReference("material{}".format(i))
+                 for i in range(0, numMaterials)]
+    startTime = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for material, texture in loadAlbedoTextures(materials, numThreads):
+            assert texture is not None
+    return time.perf_counter() - startTime
+
+
+print(os.cpu_count(), "CPUs")
+print("{:>24} {:>10} {:>10} {:>10}".format(
+    "load textures", "serial", "parallel", "cached"))
+with tempfile.TemporaryDirectory() as directory:
+    files.setGameDir(Path(directory))
+    for numMaterials, size in ((100, (100, 60)), (50, (500, 300)),
+                               (10, (1500, 1000))):
+        shutil.rmtree(str(files.getMaterialDir()), ignore_errors=True)
+        files.getMaterialDir().mkdir()
+        makeMaterials(numMaterials, size)
+        shutil.rmtree(str(files.getCacheDir()), ignore_errors=True)
+        serialTime = timeLoad(numMaterials, 1)
+        shutil.rmtree(str(files.getCacheDir()), ignore_errors=True)
+        parallelTime = timeLoad(numMaterials, None)
+        cachedTime = timeLoad(numMaterials, None)
+        print("{:>24} {:10.4f} {:10.4f} {:10.4f}".format(
+            "{} x {}x{}".format(numMaterials, size[0], size[1]),
+            serialTime, parallelTime, cachedTime))
+files.setGameDir(None)
+
+print()
+print("{:>24} {:>10} {:>10}".format("build mipmaps", "box", "lanczos"))
+random = numpy.random.RandomState(0)
+for size in (64, 256, 1024):
+    texture = Texture(random.randint(0, 256, size * size * 4, numpy.uint8),
+                      "RGBA", size, size)
+    times = [ ]
+    for mipmapFilter in ("box", "lanczos"):
+        startTime = time.perf_counter()
+        buildMipmaps(texture, mipmapFilter)
+        times.append(time.perf_counter() - startTime)
+    print("{:>24} {:10.4f} {:10.4f}".format(
+        "{}x{} RGBA".format(size, size), *times))
@@ -0,0 +1,148 @@
+__author__ = "jacobvanthoog"
+
+# run from the root directory with: python3 -m threelib.materialsTest
+
+import tempfile
+from pathlib import Path
+import numpy
+from PIL import Image
+from threelib import files
+from threelib.materials import MaterialReference, loadAlbedoTextures
+from threelib.materials import Texture, buildMipmaps
+
+
+def makeImage(path, size, mode='RGB'):
+    image = Image.frombytes(mode, size, bytes(
+        (x * 7 + y * 3 + c * 50) % 256 for y in range(0, size[1])
+        for x in range(0, size[0]) for c in range(0, len(mode))))
+    image.save(str(path))
+    return image
+
+
+with tempfile.TemporaryDirectory() as directory:
+    files.setGameDir(Path(directory))
+    files.getMaterialDir().mkdir()
+    makeImage(files.getMaterialDir() / "bricks.png", (16, 8))
+    makeImage(files.getMaterialDir() / "glass.png", (12, 5), 'RGBA')
+    makeImage(files.getMaterialDir() / "gray.png", (4, 4), 'L')
+
+    # test the texture cache
+
+    def loadTexture(name):
+        material = MaterialReference(name)
+        texture = material.loadAlbedoTexture()
+        return material, texture
+
+    for i in range(0, 2):
+        # the second time, the textures are read from the cache
+        material, bricks = loadTexture("bricks")
+        assert (bricks.getXLen(), bricks.getYLen()) == (16, 8)
+        assert bricks.getDataType() == "RGB"
+        assert material.getAspectRatio() == 2.0
+        assert bytes(bricks.getData()) == Image.open(
+            str(files.getMaterialDir() / "bricks.png")).tobytes()
+        # the pixels aren't copied into the Texture
+        assert isinstance(bricks.getData(), numpy.ndarray)
+        assert bricks.getData().dtype == numpy.uint8
+        assert not bricks.getData().flags.owndata
+
+        material, glass = loadTexture("glass")
+        assert (glass.getXLen(), glass.getYLen()) == (16, 8)
+        assert glass.getDataType() == "RGBA"
+        assert len(glass.getData()) == 16 * 8 * 4
+        assert material.getAspectRatio() == 2.0
+
+        material, gray = loadTexture("gray")
+        assert gray.getDataType() == "RGB"
+        assert len(gray.getData()) == 4 * 4 * 3
+
+        assert len(list(files.getTextureCacheDir().iterdir())) == 3
+
+    cachedGlass = glass
+
+    # changing the image replaces the cached texture
+    makeImage(files.getMaterialDir() / "bricks.png", (32, 32))
+    material, bricks = loadTexture("bricks")
+    assert (bricks.getXLen(), bricks.getYLen()) == (32, 32)
+    assert material.getAspectRatio() == 1.0
+    assert len(list(files.getTextureCacheDir().iterdir())) == 3
+
+    # a damaged cache file is ignored
+    for path in files.getTextureCacheDir().iterdir():
+        with path.open('r+b') as f:
+            f.truncate(40)
+    material, glass = loadTexture("glass")
+    assert bytes(glass.getData()) == bytes(cachedGlass.getData())
+
+    assert loadTexture("missing")[1] is None
+
+    # test loading textures in parallel
+
+    for i in range(0, 10):
+        makeImage(files.getMaterialDir() / ("tile" + str(i) + ".png"),
+                  (9 + i % 7, 6))
+    with (files.getMaterialDir() / "broken.png").open('wb') as f:
+        f.write(b'not an image')
+    names = ["tile" + str(i) for i in range(0, 10)]
+    names[3:3] = ["broken", "missing"]
+    for numThreads in (1, 3, None):
+        materials = [MaterialReference(name) for name in names]
+        loaded = list(loadAlbedoTextures(materials, numThreads))
+        assert [m for m, texture in loaded] == materials
+        for m, texture in loaded:
+            if m.getName() in ("broken", "missing"):
+                assert texture is None
+            else:
+                assert texture.getXLen() == 16 and texture.getYLen() == 8
+                assert bytes(texture.getData()) == bytes(
+                    loadTexture(m.getName())[1].getData())
+    assert list(loadAlbedoTextures([ ])) == [ ]
+
+    # test mipmaps in the cache
+
+    for mipmapFilter in ("box", "box", "lanczos", None, "lanczos"):
+        material = MaterialReference("bricks")
+        texture = material.loadAlbedoTexture(mipmapFilter)
+        if mipmapFilter is None:
+            assert texture.getMipmaps() == [ ]
+            continue
+        expected = buildMipmaps(texture, mipmapFilter)
+        assert [(m.getXLen(), m.getYLen()) for m in texture.getMipmaps()] \
+            == [(16, 16), (8, 8), (4, 4), (2, 2), (1, 1)]
+        for a, b in zip(texture.getMipmaps(), expected):
+            assert bytes(a.getData()) == bytes(b.getData())
+files.setGameDir(None)
+
+
+# test building mipmaps
+
+pixels = numpy.arange(0, 8 * 4 * 3, dtype=numpy.uint8)
+texture = Texture(pixels, "RGB", 8, 4)
+mipmaps = buildMipmaps(texture, "box")
+assert [(m.getXLen(), m.getYLen(), len(m.getData())) for m in mipmaps] \
+    == [(4, 2, 24), (2, 1, 6), (1, 1, 3)]
+for m in mipmaps:
+    assert m.getDataType() == "RGB"
+grid = pixels.reshape(4, 8, 3).astype(float)
+boxes = (grid[0::2, 0::2] + grid[1::2, 0::2] + grid[0::2, 1::2]
+         + grid[1::2, 1::2]) / 4
+assert numpy.array_equal(mipmaps[0].getData(),
+                         numpy.rint(boxes).astype(numpy.uint8).ravel())
+assert mipmaps[-1].getData().tolist() == \
+    numpy.rint(grid.mean(axis=(0, 1))).astype(numpy.uint8).tolist()
+
+# a solid color stays the same
+solid = Texture(bytes([10, 200, 30, 255]) * 64, "RGBA", 16, 4)
+for mipmapFilter in ("box", "lanczos"):
+    mipmaps = buildMipmaps(solid, mipmapFilter)
+    assert len(mipmaps) == 4
+    for m in mipmaps:
+        assert bytes(m.getData()) \
+            == bytes([10, 200, 30, 255]) * (m.getXLen() * m.getYLen())
+try:
+    buildMipmaps(solid, "unknown")
+    assert False
+except ValueError:
+    pass
+
+print("Done.")
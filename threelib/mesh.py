@@ -1,7 +1,10 @@
 __author__ = "jacobvanthoog"
 
 import math
+import numpy
 from threelib.vectorMath import Vector, isclose
+from threelib.vectorMath import ISCLOSE_REL_TOL, ISCLOSE_ABS_TOL
+import collections
 from collections import namedtuple
 from threelib import vectorMath
 
@@ -17,7 +20,11 @@ class MeshVertex:
     """
     def __init__(self, position):
         self.v = position
-        self.references = [ ] # list of MeshFaces that reference this vertex
+        self.mesh = None # the Mesh this vertex has been added to
+        # MeshFaces that reference this vertex, as the keys of a dict (values are
+        # unused). Unlike a list, faces can be added and removed in constant
+        # time, and unlike a set, the order is preserved.
+        self.references = { }
 
     def __repr__(self):
         return "MeshVertex @ " + str(self.v)
@@ -40,6 +47,8 @@ class MeshVertex:
         all faces that use this vertex.
         """
         self.v = position
+        if self.mesh is not None:
+            self.mesh.modified()
         for face in self.references:
             face.calculateTextureVertices()
             face.verticesChanged()
@@ -50,8 +59,7 @@ class MeshVertex:
         outside of internal mesh code! It is automatically called as vertices
         are added to faces.
         """
-        if face not in self.references:
-            self.references.append(face)
+        self.references[face] = None
 
     def removeReference(self, face):
         """
@@ -59,15 +67,14 @@ class MeshVertex:
         outside of internal mesh code! It is automatically called as vertices
         are removed from faces.
         """
-        if face in self.references:
-            self.references.remove(face)
+        self.references.pop(face, None)
 
     def clearReferences(self):
         """
         Clear the list of faces that use this vertex. This should not be
         called directly outside of internal mesh code!
         """
-        self.references = [ ]
+        self.references = { }
 
     def numReferences(self):
         """
@@ -77,9 +84,16 @@ class MeshVertex:
 
     def getReferences(self):
         """
-        Get a list of MeshFaces that use this vertex.
+        Get a list of MeshFaces that use this vertex, in the order they were
+        added. This is a copy, so it can be modified.
         """
-        return self.references
+        return list(self.references)
+
+    def hasReference(self, face):
+        """
+        Check if the MeshFace uses this vertex.
+        """
+        return face in self.references
 
 
 
@@ -100,6 +114,8 @@ class MeshFace:
         self.normal = None
         self.normalUpdated = False
 
+        self.mesh = None # the Mesh this face has been added to
+
     def __repr__(self):
         return "Face with " + str(self.vertices)
     
@@ -110,6 +126,16 @@ class MeshFace:
         # this should never call calculateTextureVertices
         # unless something changes with addVertex
         self.normalUpdated = False
+        if self.mesh is not None:
+            self.mesh.modified()
+
+    def edgesChanged(self):
+        """
+        Called when the vertices that make up the face, or their order, have
+        changed. Updates the edge index of the mesh, if it has one.
+        """
+        if self.mesh is not None and self.mesh.edgeIndex is not None:
+            self.mesh.edgeIndex.updateFace(self)
 
     def getVertices(self):
         """
@@ -142,6 +168,7 @@ class MeshFace:
         if calculate:
             self.calculateTextureVertices()
         self.verticesChanged()
+        self.edgesChanged()
 
         return self
 
@@ -163,6 +190,7 @@ class MeshFace:
             self.vertices.remove(meshFaceVertex)
         meshFaceVertex.vertex.removeReference(self)
         self.verticesChanged()
+        self.edgesChanged()
 
     def replaceVertex(self, old, new):
         """
@@ -174,6 +202,8 @@ class MeshFace:
         new.vertex.addReference(self)
         self.calculateTextureVertices()
         self.verticesChanged()
+        if old.vertex is not new.vertex:
+            self.edgesChanged()
 
     def indexOf(self, meshVertex):
         """
@@ -205,6 +235,7 @@ class MeshFace:
             v.vertex.removeReference(self)
         self.vertices = [ ]
         self.verticesChanged()
+        self.edgesChanged()
 
     def setTextureTransform(self, shift, rotate, scale):
         """
@@ -227,40 +258,30 @@ class MeshFace:
     def calculateTextureVertices(self):
         """
         Recalculate the texture coordinates for each vertex, using the texture
-        transformation of the face.
+        transformation of the face. If a MeshEditBatch is active, this is
+        deferred until the batch ends.
         """
-        normal = self.getNormal()
-        if normal is None:
+        if MeshEditBatch.depth != 0:
+            MeshEditBatch.dirtyFaces[self] = None
             return
-        # fix for unpredictable texture vertices with up or down normals
-        if isclose(normal.x, 0.0):
-            normal = normal.setX(0)
-        if isclose(normal.y, 0.0):
-            normal = normal.setY(0)
-        if isclose(normal.z, 1.0):
-            normal = normal.setZ(1)
-        if isclose(normal.z, -1.0):
-            normal = normal.setZ(-1)
-
-        normalRot = normal.rotation()
+        if self.mesh is not None:
+            self.mesh.modified()
+        normalRot = self._textureNormalRotation()
+        if normalRot is None:
+            return
+        aspectScale = self._textureAspectScale()
+        projected = (-normalRot).inverseRotateVectors(
+            [v.vertex.getPosition() for v in self.vertices])
 
         i = 0
-        for oldVertex in self.vertices:
-            pos = oldVertex.vertex.getPosition()
-            textureVertex = pos.inverseRotate(-normalRot)
+        for oldVertex, textureVertex in zip(self.vertices, projected):
             textureVertex = Vector(textureVertex.y, -textureVertex.z)
 
             textureVertex = textureVertex.rotate2(self.textureRotate)
             textureVertex += self.textureShift
             textureVertex /= self.textureScale.setZ(1) # prevent divide z by 0
-            # scale for correct aspect ratio of texture
-            if self.material is not None:
-                if self.material.isLoaded():
-                    aspect = self.material.getAspectRatio()
-                    if aspect > 1:
-                        textureVertex *= Vector(1, aspect, 1)
-                    elif aspect < 1:
-                        textureVertex *= Vector(1.0 / aspect, 1, 1)
+            if aspectScale is not None:
+                textureVertex *= aspectScale
 
             newVertex = MeshFaceVertex(vertex = oldVertex.vertex,
                                        textureVertex = textureVertex)
@@ -268,6 +289,27 @@ class MeshFace:
 
             i += 1
 
+    def _textureNormalRotation(self):
+        # the rotation of the face normal, used to project vertices onto the
+        # face to generate texture vertices. None if there is no normal.
+        normal = self.getNormal()
+        if normal is None:
+            return None
+        # fix for unpredictable texture vertices with up or down normals
+        if isclose(normal.x, 0.0):
+            normal = normal.setX(0)
+        if isclose(normal.y, 0.0):
+            normal = normal.setY(0)
+        if isclose(normal.z, 1.0):
+            normal = normal.setZ(1)
+        if isclose(normal.z, -1.0):
+            normal = normal.setZ(-1)
+        return normal.rotation()
+
+    def _textureAspectScale(self):
+        # scale for correct aspect ratio of texture, or None
+        return textureAspectScale(self.material)
+
     def getMaterial(self):
         """
         Get the face's material. Return a MaterialReference.
@@ -284,6 +326,8 @@ class MeshFace:
         self.material = material
         if self.material is not None:
             self.material.addReference()
+        if self.mesh is not None:
+            self.mesh.modified()
         self.calculateTextureVertices()
 
     def getNormal(self):
@@ -295,7 +339,10 @@ class MeshFace:
         is called.
         """
         if not self.normalUpdated:
-            if len(self.vertices) >= 3:
+            table = self._getAttributeTable()
+            if table is not None:
+                self.normal = table.getNormal(self)
+            elif len(self.vertices) >= 3:
                 self.normal = Vector.normal(
                     self.vertices[0].vertex.getPosition(),
                     self.vertices[1].vertex.getPosition(),
@@ -309,6 +356,9 @@ class MeshFace:
         """
         Calculate the area of the face.
         """
+        table = self._getAttributeTable()
+        if table is not None:
+            return table.getArea(self)
         if len(self.vertices) < 3:
             return None
         area = 0
@@ -321,7 +371,8 @@ class MeshFace:
             dist3 = v1.distanceTo(v2)
             # Heron's formula!
             s = (dist1 + dist2 + dist3) / 2
-            area += math.sqrt(s * (s-dist1) * (s-dist2) * (s-dist3))
+            # can be slightly negative for a degenerate triangle
+            area += math.sqrt(max(s * (s-dist1) * (s-dist2) * (s-dist3), 0.0))
         return area
 
     def getPlane(self):
@@ -329,6 +380,9 @@ class MeshFace:
         Get the constants for the plane equation of the face
         (ax + by + cz + d = 0). Return a tuple of (a, b, c, d).
         """
+        table = self._getAttributeTable()
+        if table is not None:
+            return table.getPlane(self)
         if len(self.vertices) >= 3:
             return vectorMath.calculatePlaneConstants(
                 self.vertices[0].vertex.getPosition(),
@@ -341,11 +395,17 @@ class MeshFace:
         Reverse the order of the vertices on this face.
         """
         self.vertices.reverse()
+        self.edgesChanged()
 
     def getCentroid(self):
         """
         Calculate the centroid of the face polygon.
         """
+        table = self._getAttributeTable()
+        if table is not None:
+            centroid = table.getCentroid(self)
+            if centroid is not None:
+                return centroid
 
         normal = self.getNormal()
         normalRot = normal.rotation()
@@ -379,12 +439,784 @@ class MeshFace:
 
         return centroid
 
+    def _getAttributeTable(self):
+        # the MeshAttributeTable of the mesh, if it exists and is up to date
+        if self.mesh is None:
+            return None
+        return self.mesh.getCachedIfCurrent('attributes')
+
+
+class MeshEditBatch:
+    """
+    A context manager for making many changes to mesh vertices and faces, from
+    any number of meshes. Inside a ``with MeshEditBatch():`` block, texture
+    vertices are not recalculated each time a face changes. Instead every
+    changed face is recalculated once when the block ends, all at once (see
+    ``calculateFacesTextureVertices``). Until then texture vertices may be out
+    of date. Batches can be nested; faces are recalculated when the outermost
+    batch ends.
+    """
+    depth = 0
+    # faces to recalculate, as the keys of a dict
+    dirtyFaces = { }
+
+    def __enter__(self):
+        MeshEditBatch.depth += 1
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        MeshEditBatch.depth -= 1
+        if MeshEditBatch.depth == 0 and len(MeshEditBatch.dirtyFaces) != 0:
+            faces = list(MeshEditBatch.dirtyFaces)
+            MeshEditBatch.dirtyFaces.clear()
+            calculateFacesTextureVertices(faces)
+        return False
+
+
+def calculateFacesTextureVertices(faces):
+    """
+    Recalculate the texture vertices of a list of MeshFaces. The result is
+    exactly the same as calling ``calculateTextureVertices`` for each face, but
+    the vertices of all faces are transformed together in NumPy arrays. If a
+    MeshEditBatch is active, this is deferred until the batch ends.
+    """
+    if MeshEditBatch.depth != 0:
+        MeshEditBatch.dirtyFaces.update(dict.fromkeys(faces))
+        return
+    batchFaces = [ ]
+    positions = [ ]
+    faceSizes = [ ]
+    # for each face: sin and cos of each axis of the inverse normal rotation,
+    # sin and cos of the texture rotation, texture shift, texture scale, aspect
+    # ratio scale
+    faceValues = [ ]
+    for face in faces:
+        if face.mesh is not None:
+            face.mesh.modified()
+        if face.textureScale.x == 0 or face.textureScale.y == 0:
+            face.calculateTextureVertices() # raises ZeroDivisionError
+            continue
+        normalRot = face._textureNormalRotation()
+        if normalRot is None:
+            continue
+        rotate = -normalRot
+        shift = face.textureShift
+        scale = face.textureScale
+        aspectScale = face._textureAspectScale()
+        if aspectScale is None:
+            aspectScale = Vector(1, 1, 1)
+        faceValues.append((
+            math.sin(rotate.z), math.cos(rotate.z),
+            math.sin(rotate.y), math.cos(rotate.y),
+            math.sin(rotate.x), math.cos(rotate.x),
+            math.sin(face.textureRotate), math.cos(face.textureRotate),
+            shift.x, shift.y, shift.z, scale.x, scale.y,
+            aspectScale.x, aspectScale.y, aspectScale.z))
+        for vertex in face.vertices:
+            positions.append(vertex.vertex.getPosition().getTuple())
+        faceSizes.append(len(face.vertices))
+        batchFaces.append(face)
+    if len(batchFaces) == 0:
+        return
+
+    x, y, z = numpy.array(positions, dtype=numpy.float64).T
+    sinZ, cosZ, sinY, cosY, sinX, cosX, sinT, cosT, shiftX, shiftY, shiftZ, \
+        scaleX, scaleY, aspectX, aspectY, aspectZ = numpy.repeat(
+            numpy.array(faceValues, dtype=numpy.float64), faceSizes, axis=0).T
+
+    x, y, z = _inverseRotateArrays(x, y, z,
+                                   sinX, cosX, sinY, cosY, sinZ, cosZ)
+    u, v, w = _projectedTextureArrays(y, z, sinT, cosT, shiftX, shiftY,
+                                      shiftZ, scaleX, scaleY,
+                                      aspectX, aspectY, aspectZ)
+
+    textureVertices = zip(u.tolist(), v.tolist(), w.tolist())
+    for face in batchFaces:
+        faceVertices = face.vertices
+        for i in range(0, len(faceVertices)):
+            faceVertices[i] = MeshFaceVertex(
+                vertex=faceVertices[i].vertex,
+                textureVertex=Vector(*next(textureVertices)))
+
+
+def calculateTextureVertexArrays(positions, normals, shifts, rotates, scales,
+                                aspectScales):
+    """
+    Calculate texture vertices with the same steps as
+    ``MeshFace.calculateTextureVertices``, for NumPy arrays instead of faces.
+    ``rotates`` is an array of texture rotations, the other arguments are
+    (n, 3) arrays, all with one row for each vertex: its position, and the
+    normal, texture shift, texture scale and aspect ratio scale (see
+    ``textureAspectScale``) of its face. Return a (n, 3) array of texture
+    vertices. The result matches ``calculateTextureVertices`` within floating
+    point rounding error.
+    """
+    if numpy.any(scales[:, 0:2] == 0):
+        raise ZeroDivisionError
+    normalX, normalY, normalZ = normals.T
+    # the same fix as MeshFace._textureNormalRotation()
+    normalX = numpy.where(numpy.abs(normalX) <= ISCLOSE_ABS_TOL, 0.0, normalX)
+    normalY = numpy.where(numpy.abs(normalY) <= ISCLOSE_ABS_TOL, 0.0, normalY)
+    for z in (1.0, -1.0):
+        normalZ = numpy.where(
+            numpy.abs(normalZ - z) <= numpy.maximum(
+                ISCLOSE_REL_TOL * numpy.maximum(numpy.abs(normalZ), 1.0),
+                ISCLOSE_ABS_TOL), z, normalZ)
+    # Vector.rotation()
+    rotY = numpy.arctan2(normalZ, numpy.sqrt(normalX ** 2.0 + normalY ** 2.0))
+    rotZ = numpy.arctan2(normalY, normalX)
+    # inverse rotate by the negative normal rotation
+    x, y, z = _inverseRotateArrays(
+        *positions.T, 0.0, 1.0, -numpy.sin(rotY), numpy.cos(rotY),
+        -numpy.sin(rotZ), numpy.cos(rotZ))
+    u, v, w = _projectedTextureArrays(
+        y, z, numpy.sin(rotates), numpy.cos(rotates), *shifts.T,
+        scales[:, 0], scales[:, 1], *aspectScales.T)
+    return numpy.stack(numpy.broadcast_arrays(u, v, w), axis=1)
+
+def calculateNormalArrays(v1, v2, v3):
+    """
+    Calculate normals with the same steps as ``Vector.normal``, for (n, 3)
+    arrays of the vertices of n triangles. Return a (n, 3) array.
+    """
+    a = v2 - v1
+    b = v3 - v1
+    cross = numpy.stack([a[:, 1] * b[:, 2] - a[:, 2] * b[:, 1],
+                         a[:, 2] * b[:, 0] - a[:, 0] * b[:, 2],
+                         a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]], axis=1)
+    magnitude = _magnitudes(cross)
+    # Vector.setMagnitude() leaves vectors close to zero unchanged
+    small = magnitude <= ISCLOSE_ABS_TOL
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        factor = 1.0 / numpy.where(small, 1.0, magnitude)
+    return numpy.where(small[:, None], cross, cross * factor[:, None])
+
+def textureAspectScale(material):
+    """
+    Get the scale Vector to correct the aspect ratio of a material's texture,
+    used for texture vertices. Return None if no correction is needed.
+    """
+    if material is not None:
+        if material.isLoaded():
+            aspect = material.getAspectRatio()
+            if aspect > 1:
+                return Vector(1, aspect, 1)
+            elif aspect < 1:
+                return Vector(1.0 / aspect, 1, 1)
+    return None
+
+def _projectedTextureArrays(u, v, sinT, cosT, shiftX, shiftY, shiftZ,
+                            scaleX, scaleY, aspectX, aspectY, aspectZ):
+    # the rest of calculateTextureVertices(), after the vertex has been
+    # projected onto the face
+    v = -v
+    u, v = u * cosT - v * sinT, v * cosT + u * sinT
+    u = (u + shiftX) / scaleX * aspectX
+    v = (v + shiftY) / scaleY * aspectY
+    w = (0.0 + shiftZ) / 1.0 * aspectZ
+    return u, v, w
+
+def _inverseRotateArrays(x, y, z, sinX, cosX, sinY, cosY, sinZ, cosZ):
+    # the same operations as Vector.inverseRotate(), in the same order
+    x, y = x * cosZ - y * sinZ, y * cosZ + x * sinZ
+    x, z = x * cosY - z * sinY, z * cosY + x * sinY
+    y, z = y * cosX - z * sinX, z * cosX + y * sinX
+    return x, y, z
+
+def _rotateArrays(x, y, z, sinX, cosX, sinY, cosY, sinZ, cosZ):
+    # the same operations as Vector.rotate(), in the same order
+    y, z = y * cosX - z * sinX, z * cosX + y * sinX
+    x, z = x * cosY - z * sinY, z * cosY + x * sinY
+    x, y = x * cosZ - y * sinZ, y * cosZ + x * sinZ
+    return x, y, z
+
+
+class MeshAttributeTable:
+    """
+    The normals, planes, areas and centroids of a list of MeshFaces, calculated
+    for all faces at once with NumPy. The values match the MeshFace methods that
+    calculate them for a single face, within floating point rounding error
+    (NumPy squares numbers slightly differently than Python's ``**``). Get the
+    table for a mesh with ``Mesh.getAttributeTable``.
+
+    The arrays have one row per face: ``normals`` (numFaces, 3), ``planes``
+    (numFaces, 4), ``areas`` (numFaces) and ``centroids`` (numFaces, 3). Rows
+    of faces with fewer than 3 vertices are NaN, as are centroids which can't
+    be calculated.
+    """
+
+    def __init__(self, faces):
+        self.faceRows = {face: i for i, face in enumerate(faces)}
+        numFaces = len(self.faceRows)
+        sizes = numpy.array([len(face.vertices) for face in faces],
+                            dtype=numpy.int64)
+        offsets = numpy.zeros(numFaces + 1, dtype=numpy.int64)
+        numpy.cumsum(sizes, out=offsets[1:])
+        positions = numpy.array(
+            [vertex.vertex.getPosition().getTuple()
+             for face in faces for vertex in face.vertices],
+            dtype=numpy.float64).reshape(-1, 3)
+
+        self.normals = numpy.full((numFaces, 3), numpy.nan)
+        self.planes = numpy.full((numFaces, 4), numpy.nan)
+        self.areas = numpy.full(numFaces, numpy.nan)
+        self.centroids = numpy.full((numFaces, 3), numpy.nan)
+
+        valid = numpy.nonzero(sizes >= 3)[0]
+        if len(valid) != 0:
+            self._calculate(valid, sizes[valid], offsets[valid], positions)
+
+        # lists are faster than arrays for accessing single values
+        self.normalList = self.normals.tolist()
+        self.planeList = self.planes.tolist()
+        self.areaList = self.areas.tolist()
+        self.centroidList = self.centroids.tolist()
+
+    def _calculate(self, rows, sizes, offsets, positions):
+        first = positions[offsets]
+        second = positions[offsets + 1]
+        third = positions[offsets + 2]
+
+        normals = calculateNormalArrays(first, second, third)
+        self.normals[rows] = normals
+
+        # calculatePlaneConstants()
+        self.planes[rows, 0:3] = normals
+        self.planes[rows, 3] = -(first[:, 0] * normals[:, 0]
+                                 + first[:, 1] * normals[:, 1]
+                                 + first[:, 2] * normals[:, 2])
+
+        with numpy.errstate(all='ignore'):
+            self.areas[rows] = self._calculateAreas(sizes, offsets, positions)
+            self.centroids[rows] = self._calculateCentroids(
+                normals, sizes, offsets, positions)
+
+    def _calculateAreas(self, sizes, offsets, positions):
+        # Heron's formula for the fan of triangles of each face
+        numTriangles = sizes - 2
+        triangleFaces = numpy.repeat(numpy.arange(len(sizes)), numTriangles)
+        fanIndex = numpy.arange(len(triangleFaces)) \
+            - numpy.repeat(numpy.cumsum(numTriangles) - numTriangles,
+                           numTriangles)
+        firstCorner = offsets[triangleFaces]
+        v1 = positions[firstCorner]
+        v2 = positions[firstCorner + fanIndex + 1]
+        v3 = positions[firstCorner + fanIndex + 2]
+        dist1 = _magnitudes(v2 - v3)
+        dist2 = _magnitudes(v1 - v3)
+        dist3 = _magnitudes(v1 - v2)
+        s = (dist1 + dist2 + dist3) / 2
+        triangleAreas = numpy.sqrt(numpy.maximum(
+            s * (s - dist1) * (s - dist2) * (s - dist3), 0.0))
+        # add the triangles of each face in order
+        areas = numpy.zeros(len(sizes))
+        for i in range(0, int(numTriangles.max())):
+            triangles = fanIndex == i
+            areas[triangleFaces[triangles]] += triangleAreas[triangles]
+        return areas
+
+    def _calculateCentroids(self, normals, sizes, offsets, positions):
+        # the same steps as MeshFace.getCentroid()
+        numFaces = len(sizes)
+        normalSines = [ ]
+        inverseSines = [ ]
+        for normal in normals.tolist():
+            normalRot = Vector(normal[0], normal[1], normal[2]).rotation()
+            normalSines.append(normalRot.getSines())
+            inverseSines.append((-normalRot).getSines())
+        normalSines = numpy.array(normalSines).T
+        inverseSines = numpy.array(inverseSines)
+
+        cornerFaces = numpy.repeat(numpy.arange(numFaces), sizes)
+        corners = numpy.concatenate([numpy.arange(offset, offset + size)
+                                     for offset, size in zip(offsets, sizes)])
+        x, y, z = _inverseRotateArrays(*positions[corners].T,
+                                       *inverseSines[cornerFaces].T)
+        cornerIndex = numpy.arange(len(corners)) \
+            - numpy.repeat(numpy.cumsum(sizes) - sizes, sizes)
+        # the index of the previous corner of the same face
+        previous = numpy.where(cornerIndex == 0,
+                               numpy.arange(len(corners)) + sizes[cornerFaces],
+                               numpy.arange(len(corners))) - 1
+        x0 = y[previous]
+        y0 = z[previous]
+        x1 = y
+        y1 = z
+        a = x0 * y1 - x1 * y0
+        sumX = (x0 + x1) * a
+        sumY = (y0 + y1) * a
+
+        signedArea = numpy.zeros(numFaces)
+        centroidX = numpy.zeros(numFaces)
+        centroidY = numpy.zeros(numFaces)
+        for i in range(0, int(sizes.max())):
+            faceCorners = cornerIndex == i
+            faces = cornerFaces[faceCorners]
+            signedArea[faces] += a[faceCorners]
+            centroidX[faces] += sumX[faceCorners]
+            centroidY[faces] += sumY[faceCorners]
+        centroidZ = numpy.zeros(numFaces)
+
+        signedArea *= 0.5
+        divisor = 6.0 * signedArea
+        # move centroid back into position
+        centroidX = centroidX / divisor + x[numpy.cumsum(sizes) - sizes]
+        centroidY = centroidY / divisor
+        centroidZ = centroidZ / divisor
+        x, y, z = _rotateArrays(centroidX, centroidY, centroidZ, *normalSines)
+        centroids = numpy.stack([x, y, z], axis=1)
+        # Vector division raises ZeroDivisionError for these
+        centroids[numpy.abs(divisor) <= ISCLOSE_ABS_TOL] = numpy.nan
+        return centroids
+
+    def getRow(self, face):
+        """
+        Get the row of the face in the arrays.
+        """
+        return self.faceRows[face]
+
+    def getNormal(self, face):
+        """
+        Get the normal of the face, like ``MeshFace.getNormal``.
+        """
+        normal = self.normalList[self.faceRows[face]]
+        if normal[0] != normal[0]: # NaN
+            return None
+        return Vector(normal[0], normal[1], normal[2])
+
+    def getPlane(self, face):
+        """
+        Get the plane constants of the face, like ``MeshFace.getPlane``.
+        """
+        plane = self.planeList[self.faceRows[face]]
+        if plane[0] != plane[0]: # NaN
+            return None
+        return tuple(plane)
+
+    def getArea(self, face):
+        """
+        Get the area of the face, like ``MeshFace.getArea``.
+        """
+        area = self.areaList[self.faceRows[face]]
+        if area != area: # NaN
+            return None
+        return area
+
+    def getCentroid(self, face):
+        """
+        Get the centroid of the face, like ``MeshFace.getCentroid``. Return None
+        if the centroid couldn't be calculated.
+        """
+        centroid = self.centroidList[self.faceRows[face]]
+        if centroid[0] != centroid[0]: # NaN
+            return None
+        return Vector(centroid[0], centroid[1], centroid[2])
+
+
+def _magnitudes(vectors):
+    # Vector.magnitude() for each row
+    return numpy.sqrt(vectors[:, 0] ** 2.0 + vectors[:, 1] ** 2.0
+                      + vectors[:, 2] ** 2.0)
+
+
+class PositionHash:
+    """
+    A spatial hash for finding positions that are close to each other (see
+    ``Vector.isClose``) without comparing every pair of positions. Positions
+    are sorted into a grid of cells larger than the ``isclose`` tolerance, so
+    close positions are always in the same or neighboring cells.
+    """
+
+    def __init__(self, maxCoordinate=0.0):
+        """
+        ``maxCoordinate`` is the largest absolute value of any coordinate that
+        will be added, if it is known. The tolerance of ``isclose`` is relative
+        to the size of the numbers, so the cells must be large enough for the
+        largest one. If larger coordinates are added, the cells are resized.
+        """
+        self.maxCoordinate = maxCoordinate
+        self.cells = { }
+        self._updateCellSize()
+
+    def _updateCellSize(self):
+        tolerance = max(ISCLOSE_ABS_TOL, ISCLOSE_REL_TOL * self.maxCoordinate)
+        # twice the tolerance, to leave a margin for rounding errors
+        self.cellSize = tolerance * 2.0
+
+    def _cellCoordinate(self, n):
+        if math.isinf(n) or math.isnan(n):
+            return n
+        return math.floor(n / self.cellSize)
+
+    def _cell(self, position):
+        return (self._cellCoordinate(position.x),
+                self._cellCoordinate(position.y),
+                self._cellCoordinate(position.z))
+
+    def add(self, position, item):
+        """
+        Add an item at the given position (a Vector).
+        """
+        maxCoordinate = max(abs(position.x), abs(position.y), abs(position.z))
+        if maxCoordinate > self.maxCoordinate and not math.isinf(maxCoordinate):
+            # leave room to grow, so this doesn't happen every time
+            self.maxCoordinate = maxCoordinate * 2.0
+            self._updateCellSize()
+            oldCells = self.cells
+            self.cells = { }
+            for cell in oldCells.values():
+                for otherPosition, otherItem in cell:
+                    self._addToCell(otherPosition, otherItem)
+        self._addToCell(position, item)
+
+    def _addToCell(self, position, item):
+        cell = self._cell(position)
+        try:
+            self.cells[cell].append((position, item))
+        except KeyError:
+            self.cells[cell] = [(position, item)]
+
+    def remove(self, position, item):
+        """
+        Remove an item that was added at the given position.
+        """
+        cell = self.cells[self._cell(position)]
+        for i in range(0, len(cell)):
+            if cell[i][1] == item:
+                del cell[i]
+                return
+
+    def findClose(self, position):
+        """
+        Return a list of all items at positions close to the given position.
+        """
+        found = [ ]
+        x, y, z = self._cell(position)
+        for cellX in _neighborCoordinates(x):
+            for cellY in _neighborCoordinates(y):
+                for cellZ in _neighborCoordinates(z):
+                    try:
+                        cell = self.cells[(cellX, cellY, cellZ)]
+                    except KeyError:
+                        continue
+                    for otherPosition, item in cell:
+                        if position.isClose(otherPosition):
+                            found.append(item)
+        return found
+
+
+class PositionEdgeSet:
+    """
+    An ordered set of edges, each a tuple of 2 position Vectors. An edge is not
+    added if an edge with close positions (in either order) already exists.
+    Edges are indexed with a PositionHash, so edges connected to a position can
+    be found without searching every edge.
+    """
+
+    def __init__(self):
+        self.positionHash = PositionHash()
+        # maps numbers to edges, in the order they were added
+        self.edges = collections.OrderedDict()
+        self.nextNumber = 0
+
+    def __len__(self):
+        return len(self.edges)
+
+    def add(self, edge):
+        """
+        Add the edge, unless a matching edge already exists. Return True if the
+        edge was added.
+        """
+        for number in self.positionHash.findClose(edge[0]):
+            existingEdge = self.edges[number]
+            if existingEdge[0].isClose(edge[0]) and \
+               existingEdge[1].isClose(edge[1]):
+                return False
+            if existingEdge[0].isClose(edge[1]) and \
+               existingEdge[1].isClose(edge[0]):
+                return False
+        number = self.nextNumber
+        self.nextNumber += 1
+        self.edges[number] = edge
+        self.positionHash.add(edge[0], number)
+        self.positionHash.add(edge[1], number)
+        return True
+
+    def popFirst(self):
+        """
+        Remove and return the first edge that was added.
+        """
+        number = next(iter(self.edges))
+        return self._pop(number)
+
+    def popConnected(self, position):
+        """
+        Find the first edge that was added with either position close to the
+        given position. Remove and return it, or return None if there is none.
+        """
+        numbers = self.positionHash.findClose(position)
+        if len(numbers) == 0:
+            return None
+        return self._pop(min(numbers))
+
+    def _pop(self, number):
+        edge = self.edges.pop(number)
+        self.positionHash.remove(edge[0], number)
+        self.positionHash.remove(edge[1], number)
+        return edge
+
+
+class MeshEdgeIndex:
+    """
+    An index of the edges of a Mesh, for finding the faces on either side of an
+    edge without searching. Every face has a "half-edge" from each vertex to the
+    next (counterclockwise); an edge shared by 2 faces is usually made of 2
+    opposite half-edges. Use ``Mesh.getEdgeIndex`` to get the index for a mesh;
+    it is kept up to date as faces are added, removed and changed.
+    """
+
+    def __init__(self, faces=()):
+        # maps tuples of 2 MeshVertex's to dicts, which map each face with that
+        # half-edge to the number of times the face has it
+        self.halfEdges = { }
+        # maps faces to the list of half-edges added for them
+        self.faceEdges = { }
+        for face in faces:
+            self.addFace(face)
+
+    def addFace(self, face):
+        """
+        Add the half-edges of a face.
+        """
+        vertices = [v.vertex for v in face.getVertices()]
+        if len(vertices) < 2:
+            edges = [ ]
+        else:
+            # -1 is a valid index
+            edges = [(vertices[i - 1], vertices[i])
+                     for i in range(0, len(vertices))]
+        self.faceEdges[face] = edges
+        for edge in edges:
+            try:
+                faces = self.halfEdges[edge]
+            except KeyError:
+                faces = self.halfEdges[edge] = { }
+            faces[face] = faces.get(face, 0) + 1
+
+    def removeFace(self, face):
+        """
+        Remove the half-edges of a face, as they were when it was last added.
+        """
+        edges = self.faceEdges.pop(face, None)
+        if edges is None:
+            return
+        for edge in edges:
+            faces = self.halfEdges[edge]
+            if faces[face] == 1:
+                del faces[face]
+                if len(faces) == 0:
+                    del self.halfEdges[edge]
+            else:
+                faces[face] -= 1
+
+    def updateFace(self, face):
+        """
+        Update the half-edges of a face after its vertices have changed.
+        """
+        self.removeFace(face)
+        self.addFace(face)
+
+    def getHalfEdgeFaces(self, v1, v2):
+        """
+        Get a list of faces that have ``v2`` directly after ``v1``.
+        """
+        return list(self.halfEdges.get((v1, v2), ()))
+
+    def getEdgeFaces(self, v1, v2):
+        """
+        Get a list of faces that have an edge between the two MeshVertex's, in
+        either direction.
+        """
+        faces = dict(self.halfEdges.get((v1, v2), { }))
+        faces.update(self.halfEdges.get((v2, v1), { }))
+        return list(faces)
+
+    def hasEdge(self, v1, v2):
+        """
+        Check if any face has an edge between the two MeshVertex's.
+        """
+        return (v1, v2) in self.halfEdges or (v2, v1) in self.halfEdges
+
+    def getAdjacentFaces(self, face):
+        """
+        Get a list of the other faces that share an edge with the face.
+        """
+        faces = { }
+        for v1, v2 in self.faceEdges.get(face, ()):
+            faces.update(self.halfEdges.get((v2, v1), { }))
+            faces.update(self.halfEdges.get((v1, v2), { }))
+        faces.pop(face, None)
+        return list(faces)
+
+
+def _neighborCoordinates(n):
+    if isinstance(n, float): # infinite or NaN
+        return (n, )
+    return (n - 1, n, n + 1)
+
+def _maxCoordinate(vertices):
+    maxCoordinate = 0.0
+    for v in vertices:
+        for n in v.getPosition().getTuple():
+            n = abs(n)
+            if n > maxCoordinate and not math.isinf(n):
+                maxCoordinate = n
+    return maxCoordinate
+
 
 class Mesh:
 
     def __init__(self):
         self.vertices = [ ] # list of MeshVertex's
         self.faces = [ ] # list of MeshFace's
+        self.edgeIndex = None # a MeshEdgeIndex, created by getEdgeIndex
+        self._initCache()
+
+    def _initCache(self):
+        # incremented every time the mesh is modified
+        self.version = 0
+        # values computed from the mesh, valid for cacheVersion
+        self.cache = { }
+        self.cacheVersion = 0
+
+    def __getstate__(self):
+        # the edge index and cache are not saved; they can be rebuilt when they
+        # are needed
+        state = self.__dict__.copy()
+        for key in ('edgeIndex', 'version', 'cache', 'cacheVersion'):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.edgeIndex = None
+        self._initCache()
+
+    def modified(self):
+        """
+        Called when any vertex or face of the mesh has changed. Increments the
+        version, which invalidates cached values.
+        """
+        self.version += 1
+
+    def getVersion(self):
+        """
+        Get the version number of the mesh, which changes every time the mesh is
+        modified.
+        """
+        return self.version
+
+    def getCached(self, name, function):
+        """
+        Get a value computed from the mesh, which is cached until the mesh is
+        modified. ``name`` identifies the value, and ``function`` is called with
+        no arguments to compute it if it isn't cached.
+        """
+        if self.cacheVersion != self.version:
+            self.cache = { }
+            self.cacheVersion = self.version
+        try:
+            return self.cache[name]
+        except KeyError:
+            value = function()
+            self.cache[name] = value
+            return value
+
+    def getCachedIfCurrent(self, name):
+        """
+        Get a value cached by ``getCached``, or None if it isn't cached or the
+        mesh has been modified.
+        """
+        if self.cacheVersion != self.version:
+            return None
+        return self.cache.get(name)
+
+    def getAttributeTable(self):
+        """
+        Get a MeshAttributeTable for every face of the mesh, which is cached
+        until the mesh is modified. While it is cached, ``MeshFace`` methods
+        like ``getPlane`` and ``getArea`` will use it instead of calculating
+        values for each face.
+        """
+        return self.getCached('attributes',
+                              lambda: MeshAttributeTable(self.faces))
+
+    def getBounds(self):
+        """
+        Return a tuple of 2 Vectors: (min_coordinates, max_coordinates) of all
+        the vertices. If the mesh is empty, both are (0, 0, 0). The result is
+        cached.
+        """
+        return self.getCached('bounds', self._calculateBounds)
+
+    def _calculateBounds(self):
+        if len(self.vertices) == 0:
+            return Vector(0, 0, 0), Vector(0, 0, 0)
+        firstVertexPos = self.vertices[0].getPosition()
+        lowX = firstVertexPos.x
+        lowY = firstVertexPos.y
+        lowZ = firstVertexPos.z
+        highX = firstVertexPos.x
+        highY = firstVertexPos.y
+        highZ = firstVertexPos.z
+        for v in self.vertices:
+            pos = v.getPosition()
+            if pos.x < lowX:
+                lowX = pos.x
+            if pos.x > highX:
+                highX = pos.x
+            if pos.y < lowY:
+                lowY = pos.y
+            if pos.y > highY:
+                highY = pos.y
+            if pos.z < lowZ:
+                lowZ = pos.z
+            if pos.z > highZ:
+                highZ = pos.z
+        return Vector(lowX, lowY, lowZ), Vector(highX, highY, highZ)
+
+    def getBoundingSphere(self):
+        """
+        Return a tuple of the center (a Vector) and radius of a sphere that
+        contains every vertex. The center is the center of the bounds. The
+        result is cached.
+        """
+        return self.getCached('boundingSphere', self._calculateBoundingSphere)
+
+    def _calculateBoundingSphere(self):
+        low, high = self.getBounds()
+        center = (low + high) / 2
+        radiusSquare = 0.0
+        for v in self.vertices:
+            distanceSquare = (v.getPosition() - center).magnitudeSquare()
+            if distanceSquare > radiusSquare:
+                radiusSquare = distanceSquare
+        return center, math.sqrt(radiusSquare)
+
+    def getCentroid(self):
+        """
+        Return the average position of all the vertices, or (0, 0, 0) if the
+        mesh is empty. The result is cached.
+        """
+        return self.getCached('centroid', self._calculateCentroid)
+
+    def _calculateCentroid(self):
+        if len(self.vertices) == 0:
+            return Vector(0, 0, 0)
+        total = Vector(0, 0, 0)
+        for v in self.vertices:
+            total += v.getPosition()
+        return total / len(self.vertices)
 
     def clone(self):
         """
@@ -400,16 +1232,31 @@ class Mesh:
         mesh's
         """
         self.vertices = [v.clone() for v in other.vertices]
+        for v in self.vertices:
+            v.mesh = self
         self.faces = [ ]
+        self.edgeIndex = None
+        self.modified()
+        newVertices = {id(oldVertex): newVertex for oldVertex, newVertex
+                       in zip(other.vertices, self.vertices)}
+        makeFaceVertex = MeshFaceVertex._make # faster than the constructor
 
         for face in other.faces:
             newFace = MeshFace()
-
-            for vertex in face.getVertices():
-                vertexIndex = other.vertices.index(vertex.vertex)
-                newFace.addVertex(self.vertices[vertexIndex],
-                                  vertex.textureVertex)
-            newFace.copyMaterialInfo(face)
+            # texture vertices are copied instead of recalculated
+            newFace.vertices = [
+                makeFaceVertex((newVertices[id(vertex.vertex)],
+                                vertex.textureVertex))
+                for vertex in face.getVertices()]
+            # same as copyMaterialInfo, without recalculating texture vertices
+            newFace.material = face.material
+            if newFace.material is not None:
+                newFace.material.addReference()
+            newFace.textureShift = face.textureShift
+            newFace.textureRotate = face.textureRotate
+            newFace.textureScale = face.textureScale
+            newFace.normal = face.normal
+            newFace.normalUpdated = face.normalUpdated
             self.addFace(newFace)
 
     def getVertices(self):
@@ -430,6 +1277,8 @@ class Mesh:
             vertex = MeshVertex(Vector(0,0,0))
         vertex.clearReferences()
         self.vertices.append(vertex)
+        vertex.mesh = self
+        self.modified()
         return vertex
 
     def removeVertex(self, vertex, removeFaces=True):
@@ -439,13 +1288,12 @@ class Mesh:
         could be dangerous!
         """
         if removeFaces:
-            faces = [ ]
             for face in vertex.getReferences():
-                faces.append(face)
-            for face in faces:
                 self.removeFace(face)
         if vertex in self.vertices:
             self.vertices.remove(vertex)
+            vertex.mesh = None
+        self.modified()
 
     def getFaces(self):
         """
@@ -465,6 +1313,10 @@ class Mesh:
         self.faces.append(face)
         for v in face.getVertices():
             v.vertex.addReference(face)
+        face.mesh = self
+        if self.edgeIndex is not None:
+            self.edgeIndex.addFace(face)
+        self.modified()
         return face
 
     def removeFace(self, face):
@@ -473,9 +1325,23 @@ class Mesh:
         It is useless after that.
         """
         self.faces.remove(face)
+        if self.edgeIndex is not None:
+            self.edgeIndex.removeFace(face)
+        face.mesh = None
+        self.modified()
         face.clearVertices()
         face.setMaterial(None)
 
+    def getEdgeIndex(self):
+        """
+        Get a MeshEdgeIndex for finding the faces around each edge. It is
+        created the first time this is called, and is updated automatically
+        after that.
+        """
+        if self.edgeIndex is None:
+            self.edgeIndex = MeshEdgeIndex(self.faces)
+        return self.edgeIndex
+
     def removeMaterials(self):
         """
         Clear all materials for all faces.
@@ -501,6 +1367,8 @@ class Mesh:
                 verticesToRemove.append(v)
         for v in verticesToRemove:
             self.vertices.remove(v)
+            v.mesh = None
+        self.modified()
 
     def combineDuplicateVertices(self):
         """
@@ -520,29 +1388,35 @@ class Mesh:
             for v in verticesToRemove:
                 face.removeVertex(v)
 
-        i = 0
-        verticesToDelete = [ ]
-        while i < len(self.vertices):
-            v1 = self.vertices[i]
-            if v1 in verticesToDelete:
-                i += 1
+        positionHash = PositionHash(_maxCoordinate(self.vertices))
+        for i, v in enumerate(self.vertices):
+            positionHash.add(v.getPosition(), i)
+
+        # vertices are combined in the same order as comparing every pair of
+        # vertices: each vertex absorbs all later vertices close to it
+        deletedIndices = set()
+        for i, v1 in enumerate(self.vertices):
+            if i in deletedIndices:
                 continue
-            for j in range(i + 1, len(self.vertices)):
+            closeIndices = sorted(j for j in
+                                  positionHash.findClose(v1.getPosition())
+                                  if j > i and j not in deletedIndices)
+            for j in closeIndices:
                 v2 = self.vertices[j]
-                if v2 in verticesToDelete:
-                    continue
-                if v1.getPosition().isClose(v2.getPosition()):
-                    # replace all instances of v2 in every face with v1
-                    for face in list(v2.getReferences()):
-                        for vertex in list(face.getVertices()):
-                            if vertex.vertex == v2:
-                                face.replaceVertex(vertex, MeshFaceVertex(
-                                    vertex=v1, textureVertex=Vector(0,0)))
-                    verticesToDelete.append(v2)
-            i += 1
-
-        for v in verticesToDelete:
-            self.vertices.remove(v)
+                # replace all instances of v2 in every face with v1
+                for face in v2.getReferences():
+                    for vertex in list(face.getVertices()):
+                        if vertex.vertex == v2:
+                            face.replaceVertex(vertex, MeshFaceVertex(
+                                vertex=v1, textureVertex=Vector(0,0)))
+                deletedIndices.add(j)
+
+        if len(deletedIndices) != 0:
+            for i in deletedIndices:
+                self.vertices[i].mesh = None
+            self.vertices = [v for i, v in enumerate(self.vertices)
+                             if i not in deletedIndices]
+            self.modified()
 
     def addMissingVertices(self):
         for f in self.faces:
@@ -551,6 +1425,8 @@ class Mesh:
                 if v not in self.vertices:
                     self.vertices.append(v)
                     v.addReference(f)
+                    v.mesh = self
+                    self.modified()
 
     def isEmpty(self):
         """
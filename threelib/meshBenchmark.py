@@ -0,0 +1,290 @@
+__author__ = "jacobvanthoog"
+
+# run from the root directory with: python3 -m threelib.meshBenchmark
+
+import time
+import math
+from threelib.vectorMath import Vector
+from threelib.mesh import *
+from threelib.compactMesh import CompactMesh
+from threelib.world import subdivideMesh, subdivideMeshFace
+
+
+def makeSeparateQuads(size):
+    # a grid of quads which don't share any vertices, with tiny offsets that
+    # are within the isclose tolerance
+    mesh = Mesh()
+    for x in range(0, size):
+        for y in range(0, size):
+            face = mesh.addFace()
+            for vx, vy in ((x, y), (x + 1, y), (x + 1, y + 1), (x, y + 1)):
+                face.addVertex(mesh.addVertex(MeshVertex(
+                    Vector((vx + 1) * 1000.0 + 1e-7 * (x + 7 * y),
+                           vy * 1000.0, 0))))
+    return mesh
+
+def bruteForceCombine(mesh):
+    # compare every pair of vertices, like the original algorithm
+    verticesToDelete = [ ]
+    for i in range(0, len(mesh.vertices)):
+        v1 = mesh.vertices[i]
+        if v1 in verticesToDelete:
+            continue
+        for v2 in mesh.vertices[i + 1:]:
+            if v2 in verticesToDelete:
+                continue
+            if v1.getPosition().isClose(v2.getPosition()):
+                for face in list(v2.getReferences()):
+                    for vertex in list(face.getVertices()):
+                        if vertex.vertex == v2:
+                            face.replaceVertex(vertex, MeshFaceVertex(
+                                vertex=v1, textureVertex=Vector(0,0)))
+                verticesToDelete.append(v2)
+    for v in verticesToDelete:
+        mesh.vertices.remove(v)
+
+def makeGrid(size):
+    # a grid of quads which share vertices
+    mesh = Mesh()
+    vertices = [[mesh.addVertex(MeshVertex(Vector(x, y, 0)))
+                 for y in range(0, size + 1)] for x in range(0, size + 1)]
+    for x in range(0, size):
+        for y in range(0, size):
+            mesh.addFace().addVertex(vertices[x][y]) \
+                .addVertex(vertices[x + 1][y]) \
+                .addVertex(vertices[x + 1][y + 1]) \
+                .addVertex(vertices[x][y + 1])
+    return mesh
+
+def slowClone(mesh):
+    # the original algorithm, which searches the vertex list for every vertex
+    # and recalculates texture vertices
+    newMesh = Mesh()
+    newMesh.vertices = [v.clone() for v in mesh.vertices]
+    for face in mesh.faces:
+        newFace = MeshFace()
+        for vertex in face.getVertices():
+            vertexIndex = mesh.vertices.index(vertex.vertex)
+            newFace.addVertex(newMesh.vertices[vertexIndex],
+                              vertex.textureVertex)
+        newFace.copyMaterialInfo(face)
+        newMesh.addFace(newFace)
+    return newMesh
+
+class ListReferenceVertex(MeshVertex):
+    # the original MeshVertex, which stored references in a list
+
+    def addReference(self, face):
+        if face not in self.references:
+            self.references.append(face)
+
+    def removeReference(self, face):
+        if face in self.references:
+            self.references.remove(face)
+
+    def clearReferences(self):
+        self.references = [ ]
+
+    def getReferences(self):
+        return self.references
+
+def makeFan(size, vertexClass):
+    # a fan of triangles which all share the center vertex
+    mesh = Mesh()
+    center = mesh.addVertex(vertexClass(Vector(0, 0, 0)))
+    outer = [mesh.addVertex(vertexClass(Vector(math.cos(i), math.sin(i), 0)))
+             for i in range(0, size + 1)]
+    for i in range(0, size):
+        mesh.addFace().addVertex(center, Vector(0, 0)) \
+            .addVertex(outer[i], Vector(0, 0)) \
+            .addVertex(outer[i + 1], Vector(0, 0))
+    return mesh
+
+def replaceCenterVertices(mesh):
+    center = mesh.getVertices()[0]
+    newCenter = mesh.addVertex(center.clone())
+    for face in reversed(mesh.getFaces()):
+        face.replaceVertex(face.getVertices()[0],
+                           MeshFaceVertex(newCenter, Vector(0, 0)))
+
+def removeAllFaces(mesh):
+    # the last faces are the slowest to find in a list
+    for face in list(reversed(mesh.getFaces())):
+        mesh.removeFace(face)
+
+def scaleVertices(mesh):
+    for v in mesh.getVertices():
+        v.setPosition(v.getPosition() * Vector(1.5, 2, 1))
+
+def scaleVerticesBatch(mesh):
+    with MeshEditBatch():
+        scaleVertices(mesh)
+
+def addUniqueEdges(edges):
+    # the original clipping algorithm, which compares every pair of edges
+    edgeList = [ ]
+    for edge in edges:
+        for existingEdge in edgeList:
+            if existingEdge[0].isClose(edge[0]) and \
+               existingEdge[1].isClose(edge[1]):
+                break
+            if existingEdge[0].isClose(edge[1]) and \
+               existingEdge[1].isClose(edge[0]):
+                break
+        else:
+            edgeList.append(edge)
+
+def addEdgesToSet(edges):
+    edgeSet = PositionEdgeSet()
+    for edge in edges:
+        edgeSet.add(edge)
+
+def makeCircleEdges(size):
+    # every edge is added twice, in opposite directions
+    points = [Vector(math.cos(i * 2 * math.pi / size) * 256,
+                     math.sin(i * 2 * math.pi / size) * 256, 0)
+              for i in range(0, size)]
+    edges = [(points[i - 1], points[i]) for i in range(0, size)]
+    return edges + [(b, a) for a, b in edges]
+
+def findEdgeFacesByReferences(mesh):
+    # search vertex references for faces with both vertices of each edge
+    for face in mesh.getFaces():
+        for i in range(0, len(face.getVertices())):
+            v1 = face.getVertices()[i - 1].vertex
+            v2 = face.getVertices()[i].vertex
+            [f for f in v1.getReferences() if f in v2.getReferences()]
+
+def findEdgeFacesByIndex(mesh):
+    index = mesh.getEdgeIndex()
+    for face in mesh.getFaces():
+        for i in range(0, len(face.getVertices())):
+            index.getEdgeFaces(face.getVertices()[i - 1].vertex,
+                               face.getVertices()[i].vertex)
+
+def subdivideEachFace(mesh, maxSize):
+    # the original algorithm used when adding objects to the world
+    mesh = mesh.clone()
+    for face in list(mesh.getFaces()):
+        subdivideMeshFace(mesh, face, maxSize)
+    mesh.combineDuplicateVertices()
+
+
+def timeCall(function, *args):
+    startTime = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - startTime
+
+
+print("combineDuplicateVertices")
+print("{:>10} {:>12} {:>12}".format("vertices", "spatial hash", "all pairs"))
+for size in (8, 16, 32, 64, 128):
+    mesh = makeSeparateQuads(size)
+    numVertices = len(mesh.getVertices())
+    hashTime = timeCall(mesh.combineDuplicateVertices)
+    if size <= 16:
+        bruteForceTime = "{:12.4f}".format(
+            timeCall(bruteForceCombine, makeSeparateQuads(size)))
+    else:
+        bruteForceTime = "{:>12}".format("-") # too slow
+    print("{:10d} {:12.4f} {}".format(numVertices, hashTime, bruteForceTime))
+
+print()
+print("clone")
+print("{:>10} {:>12} {:>12} {:>12}".format("faces", "clone", "original",
+                                          "compact"))
+for size in (16, 32, 64, 128, 224):
+    mesh = makeGrid(size)
+    cloneTime = timeCall(mesh.clone)
+    if size <= 64:
+        slowTime = "{:12.4f}".format(timeCall(slowClone, mesh))
+    else:
+        slowTime = "{:>12}".format("-") # too slow
+    compactTime = timeCall(CompactMesh.fromMesh(mesh).clone)
+    print("{:10d} {:12.4f} {} {:12.4f}".format(
+        len(mesh.getFaces()), cloneTime, slowTime, compactTime))
+
+print()
+print("vertex references")
+print("{:>10} {:>12} {:>12} {:>12} {:>12}".format(
+    "valence", "replace", "replace list", "remove", "remove list"))
+for size in (1000, 4000, 16000):
+    times = [ ]
+    for vertexClass in (MeshVertex, ListReferenceVertex):
+        times.append(timeCall(replaceCenterVertices,
+                              makeFan(size, vertexClass)))
+    for vertexClass in (MeshVertex, ListReferenceVertex):
+        times.append(timeCall(removeAllFaces, makeFan(size, vertexClass)))
+    print("{:10d} {:12.4f} {:12.4f} {:12.4f} {:12.4f}".format(size, *times))
+
+print()
+print("scale all vertices")
+print("{:>10} {:>12} {:>12}".format("faces", "batch", "no batch"))
+for size in (16, 64, 128):
+    batchTime = timeCall(scaleVerticesBatch, makeGrid(size))
+    noBatchTime = timeCall(scaleVertices, makeGrid(size))
+    print("{:10d} {:12.4f} {:12.4f}".format(size * size, batchTime,
+                                            noBatchTime))
+
+print()
+print("unique clip edges")
+print("{:>10} {:>12} {:>12}".format("edges", "edge set", "list"))
+for size in (100, 400, 1600):
+    edges = makeCircleEdges(size)
+    setTime = timeCall(addEdgesToSet, edges)
+    listTime = timeCall(addUniqueEdges, edges)
+    print("{:10d} {:12.4f} {:12.4f}".format(len(edges), setTime, listTime))
+
+print()
+print("find the faces of every edge")
+print("{:>10} {:>12} {:>12}".format("valence", "edge index", "references"))
+for size in (100, 400, 1600):
+    mesh = makeFan(size, MeshVertex)
+    indexTime = timeCall(findEdgeFacesByIndex, mesh)
+    referencesTime = timeCall(findEdgeFacesByReferences, mesh)
+    print("{:10d} {:12.4f} {:12.4f}".format(size, indexTime, referencesTime))
+
+print()
+print("bounds, 1000 queries")
+print("{:>10} {:>12} {:>12}".format("vertices", "cached", "uncached"))
+for size in (16, 64, 128):
+    mesh = makeGrid(size)
+    cachedTime = timeCall(lambda: [mesh.getBounds() for i in range(0, 1000)])
+    uncachedTime = timeCall(
+        lambda: [mesh._calculateBounds() for i in range(0, 1000)])
+    print("{:10d} {:12.4f} {:12.4f}".format(len(mesh.getVertices()),
+                                            cachedTime, uncachedTime))
+
+def faceAttributesScalar(mesh):
+    for face in mesh.getFaces():
+        face.normalUpdated = False
+        face.getPlane()
+        face.getArea()
+        face.getCentroid()
+
+def faceAttributesTable(mesh):
+    mesh.getAttributeTable()
+    faceAttributesScalar(mesh)
+
+print()
+print("face planes, areas and centroids")
+print("{:>10} {:>12} {:>12}".format("faces", "table", "per face"))
+for size in (16, 64, 128):
+    mesh = makeGrid(size)
+    tableTime = timeCall(faceAttributesTable, mesh)
+    mesh.modified()
+    scalarTime = timeCall(faceAttributesScalar, mesh)
+    print("{:10d} {:12.4f} {:12.4f}".format(size * size, tableTime,
+                                            scalarTime))
+
+print()
+print("subdivide faces larger than 144 (area of each face is 1600)")
+print("{:>10} {:>12} {:>12}".format("faces", "batch", "each face"))
+for size in (4, 16, 32):
+    mesh = makeGrid(size)
+    for v in mesh.getVertices():
+        v.setPosition(v.getPosition() * 40)
+    batchTime = timeCall(subdivideMesh, mesh, 144)
+    eachFaceTime = timeCall(subdivideEachFace, mesh, 144)
+    print("{:10d} {:12.4f} {:12.4f}".format(size * size, batchTime,
+                                            eachFaceTime))
@@ -0,0 +1,480 @@
+__author__ = "jacobvanthoog"
+
+# run from the root directory with: python3 -m threelib.meshTest
+
+import math
+import numpy
+from threelib.vectorMath import Vector, Rotate, isclose
+from threelib.mesh import *
+from threelib.compactMesh import CompactMesh
+from threelib.materials import MaterialReference
+
+
+def makeBox(scale=1):
+    mesh = Mesh()
+    a = mesh.addVertex(MeshVertex(Vector(-scale, -scale, -scale)))
+    b = mesh.addVertex(MeshVertex(Vector( scale, -scale, -scale)))
+    c = mesh.addVertex(MeshVertex(Vector(-scale,  scale, -scale)))
+    d = mesh.addVertex(MeshVertex(Vector( scale,  scale, -scale)))
+    e = mesh.addVertex(MeshVertex(Vector(-scale, -scale,  scale)))
+    f = mesh.addVertex(MeshVertex(Vector( scale, -scale,  scale)))
+    g = mesh.addVertex(MeshVertex(Vector(-scale,  scale,  scale)))
+    h = mesh.addVertex(MeshVertex(Vector( scale,  scale,  scale)))
+    mesh.addFace().addVertex(e).addVertex(f).addVertex(h).addVertex(g)
+    mesh.addFace().addVertex(f).addVertex(b).addVertex(d).addVertex(h)
+    mesh.addFace().addVertex(g).addVertex(h).addVertex(d).addVertex(c)
+    mesh.addFace().addVertex(a).addVertex(c).addVertex(d).addVertex(b)
+    mesh.addFace().addVertex(e).addVertex(g).addVertex(c).addVertex(a)
+    mesh.addFace().addVertex(f).addVertex(e).addVertex(a).addVertex(b)
+    return mesh
+
+def meshesEqual(a, b):
+    if len(a.getVertices()) != len(b.getVertices()) \
+            or len(a.getFaces()) != len(b.getFaces()):
+        return False
+    for v1, v2 in zip(a.getVertices(), b.getVertices()):
+        if v1.getPosition() != v2.getPosition():
+            return False
+    aIndices = {id(v): i for i, v in enumerate(a.getVertices())}
+    bIndices = {id(v): i for i, v in enumerate(b.getVertices())}
+    for f1, f2 in zip(a.getFaces(), b.getFaces()):
+        if len(f1.getVertices()) != len(f2.getVertices()):
+            return False
+        for v1, v2 in zip(f1.getVertices(), f2.getVertices()):
+            if aIndices[id(v1.vertex)] != bIndices[id(v2.vertex)]:
+                return False
+            if v1.textureVertex != v2.textureVertex:
+                return False
+        if f1.getMaterial() is not f2.getMaterial() \
+                or f1.textureShift != f2.textureShift \
+                or f1.textureRotate != f2.textureRotate \
+                or f1.textureScale != f2.textureScale:
+            return False
+    return True
+
+
+# test CompactMesh conversion
+
+box = makeBox(3)
+material = MaterialReference("test")
+box.getFaces()[2].setMaterial(material)
+box.getFaces()[4].textureRotate = 0.5
+box.addVertex(MeshVertex(Vector(7, 8, 9))) # unused vertex
+
+compact = CompactMesh.fromMesh(box)
+assert compact.numVertices() == 9
+assert compact.numFaces() == 6
+assert compact.numCorners() == 24
+assert list(compact.getFaceIndices(1)) == [5, 1, 3, 7]
+assert compact.getFaceMaterial(2) is material
+assert compact.getFaceMaterial(3) is None
+
+triangles, triangleFaces = compact.triangulate()
+assert len(triangles) == 12
+assert list(triangles[2]) == [4, 5, 6]
+assert list(triangleFaces[:4]) == [0, 0, 1, 1]
+
+converted = compact.toMesh()
+assert meshesEqual(box, converted)
+assert material.numReferences() == 2
+for v in converted.getVertices()[:8]:
+    assert v.numReferences() == 3
+
+
+# test combineDuplicateVertices
+
+def makeSeparateQuads(size, offset=0.0):
+    """
+    A grid of quads which don't share any vertices. The vertices of each quad
+    are offset by a different multiple of ``offset``.
+    """
+    mesh = Mesh()
+    for x in range(0, size):
+        for y in range(0, size):
+            face = mesh.addFace()
+            for vx, vy in ((x, y), (x + 1, y), (x + 1, y + 1), (x, y + 1)):
+                face.addVertex(mesh.addVertex(MeshVertex(
+                    Vector((vx + 1) * 1000.0 + offset * (x + 7 * y), vy * 1000.0, 0))))
+    return mesh
+
+def bruteForceCombine(mesh):
+    # compare every pair of vertices, like the original algorithm
+    verticesToDelete = [ ]
+    for i in range(0, len(mesh.vertices)):
+        v1 = mesh.vertices[i]
+        if v1 in verticesToDelete:
+            continue
+        for v2 in mesh.vertices[i + 1:]:
+            if v2 in verticesToDelete:
+                continue
+            if v1.getPosition().isClose(v2.getPosition()):
+                for face in list(v2.getReferences()):
+                    for vertex in list(face.getVertices()):
+                        if vertex.vertex == v2:
+                            face.replaceVertex(vertex, MeshFaceVertex(
+                                vertex=v1, textureVertex=Vector(0,0)))
+                verticesToDelete.append(v2)
+    for v in verticesToDelete:
+        mesh.vertices.remove(v)
+
+for offset in (0.0, 1e-7, 1e-6):
+    a = makeSeparateQuads(6, offset)
+    b = makeSeparateQuads(6, offset)
+    a.combineDuplicateVertices()
+    bruteForceCombine(b)
+    assert meshesEqual(a, b)
+# offsets within tolerance are combined, larger offsets are not
+a = makeSeparateQuads(6, 1e-7)
+a.combineDuplicateVertices()
+assert len(a.getVertices()) == 49
+a = makeSeparateQuads(6, 1e-3)
+a.combineDuplicateVertices()
+assert len(a.getVertices()) == 6 * 6 * 4
+
+box = makeBox(3)
+box.addVertex(MeshVertex(Vector(3, 3, 3 + 1e-9)))
+box.addVertex(MeshVertex(Vector(float('inf'), 0, 0)))
+box.addVertex(MeshVertex(Vector(float('inf'), 0, 0)))
+box.combineDuplicateVertices()
+assert len(box.getVertices()) == 9
+
+
+# test clone
+
+box = makeBox(3)
+material = MaterialReference("test")
+box.getFaces()[2].setMaterial(material)
+box.getFaces()[4].setTextureTransform(Vector(1, 2), 0.5, Vector(16, 8))
+box.getFaces()[0].getNormal()
+clone = box.clone()
+assert meshesEqual(box, clone)
+assert material.numReferences() == 2
+for v1, v2 in zip(box.getVertices(), clone.getVertices()):
+    assert v1 is not v2
+    assert v2.numReferences() == 3
+assert clone.getFaces()[0].getNormal() == Vector(0, 0, 1)
+
+compactClone = CompactMesh.fromMesh(box).clone()
+assert meshesEqual(box, compactClone.toMesh())
+
+
+# test references
+
+box = makeBox()
+vertex = box.getVertices()[0]
+faces = vertex.getReferences()
+assert faces == [box.getFaces()[3], box.getFaces()[4], box.getFaces()[5]]
+faces.append(None) # a copy
+assert vertex.numReferences() == 3
+box.removeFace(box.getFaces()[4])
+assert vertex.getReferences() == [box.getFaces()[3], box.getFaces()[4]]
+
+# test converting references from a list (version 1.9)
+
+from threelib import files
+from threelib.edit.state import EditorState
+from threelib.edit.objects import SolidMeshObject
+import threelib.edit.fileVersions.converters
+
+state = EditorState()
+state.objects.append(SolidMeshObject())
+for v in state.objects[0].getMesh().getVertices():
+    v.references = list(v.references)
+    del v.mesh
+for face in state.objects[0].getMesh().getFaces():
+    del face.mesh
+state.MINOR_VERSION = 9
+state = files._convertStateToCurrentVersion(state)
+assert state.MINOR_VERSION == EditorState.CURRENT_MINOR_VERSION
+for v in state.objects[0].getMesh().getVertices():
+    assert isinstance(v.references, dict)
+    assert v.numReferences() == 3
+for face in state.objects[0].getMesh().getFaces():
+    assert face.mesh is state.objects[0].getMesh()
+for v in state.objects[0].getMesh().getVertices():
+    assert v.mesh is state.objects[0].getMesh()
+
+
+# test MeshEditBatch
+
+wide = MaterialReference("wide")
+wide.aspectRatio = 2.0
+wide.setLoaded()
+tall = MaterialReference("tall")
+tall.aspectRatio = 0.25
+tall.setLoaded()
+
+def makeTexturedBoxes():
+    boxes = [makeBox(3), makeBox(0.5)]
+    for box in boxes:
+        faces = box.getFaces()
+        faces[0].setMaterial(wide)
+        faces[1].setMaterial(tall)
+        faces[2].setTextureTransform(Vector(3, -2), 0.7, Vector(16, -8))
+        faces[3].setTextureTransform(Vector(0.5, 1, 2), -2.5, Vector(4, 64))
+        faces[4].setMaterial(wide)
+        faces[4].setTextureTransform(Vector(1, 1), 1.0, Vector(0.1, 0.3))
+    return boxes
+
+def transformBoxes(boxes):
+    for box in boxes:
+        for v in box.getVertices():
+            v.setPosition(v.getPosition().rotate(Rotate(0.3, -1.2, 2.0))
+                          * Vector(1.5, 0.25, 3) + Vector(100, -7, 0.125))
+        for face in box.getFaces():
+            face.calculateTextureVertices()
+
+a = makeTexturedBoxes()
+b = makeTexturedBoxes()
+transformBoxes(a)
+with MeshEditBatch():
+    with MeshEditBatch():
+        transformBoxes(b)
+    assert len(MeshEditBatch.dirtyFaces) == 12
+assert len(MeshEditBatch.dirtyFaces) == 0
+for boxA, boxB in zip(a, b):
+    assert meshesEqual(boxA, boxB)
+
+a = makeTexturedBoxes()
+b = makeTexturedBoxes()
+for faceA, faceB in zip(a[0].getFaces(), b[0].getFaces()):
+    faceA.textureRotate = faceB.textureRotate = 0.2
+    faceA.calculateTextureVertices()
+calculateFacesTextureVertices(b[0].getFaces())
+assert meshesEqual(a[0], b[0])
+
+
+# test MeshEdgeIndex
+
+def edgeIndexIsCurrent(mesh):
+    built = MeshEdgeIndex(mesh.getFaces())
+    index = mesh.getEdgeIndex()
+    return index.faceEdges == built.faceEdges \
+        and index.halfEdges == built.halfEdges
+
+box = makeBox()
+a, b, c, d, e, f, g, h = box.getVertices()
+index = box.getEdgeIndex()
+assert index.getEdgeFaces(a, b) == [box.getFaces()[5], box.getFaces()[3]]
+assert index.getHalfEdgeFaces(b, a) == [box.getFaces()[3]]
+assert index.hasEdge(h, g)
+assert not index.hasEdge(a, h)
+assert index.getEdgeFaces(a, h) == [ ]
+assert set(index.getAdjacentFaces(box.getFaces()[0])) \
+    == set(box.getFaces()[1:3] + box.getFaces()[4:])
+
+# divide an edge
+middle = box.addVertex(MeshVertex(Vector(0, -1, -1)))
+box.getFaces()[3].addVertex(middle, index=4)
+box.getFaces()[5].addVertex(middle, index=3)
+assert not index.hasEdge(a, b)
+assert set(index.getEdgeFaces(a, middle)) \
+    == {box.getFaces()[3], box.getFaces()[5]}
+assert edgeIndexIsCurrent(box)
+
+box.getFaces()[1].reverse()
+face = box.getFaces()[2]
+face.replaceVertex(face.getVertices()[0], MeshFaceVertex(a, Vector(0, 0)))
+box.removeFace(box.getFaces()[0])
+box.addFace().addVertex(e).addVertex(f).addVertex(g)
+assert edgeIndexIsCurrent(box)
+assert face.mesh is box
+assert box.clone().getFaces()[0].mesh is not box
+
+# test PositionEdgeSet
+
+edges = PositionEdgeSet()
+assert edges.add((Vector(0, 0, 0), Vector(1, 0, 0)))
+assert edges.add((Vector(1, 0, 0), Vector(1e6, 1, 0)))
+assert not edges.add((Vector(1, 1e-12, 0), Vector(0, 0, 0)))
+assert edges.add((Vector(0, 0, 0), Vector(0, 1, 0)))
+assert len(edges) == 3
+assert edges.popConnected(Vector(1e6 + 1e-4, 1, 0)) \
+    == (Vector(1, 0, 0), Vector(1e6, 1, 0))
+assert edges.popConnected(Vector(5, 5, 5)) is None
+assert edges.popFirst() == (Vector(0, 0, 0), Vector(1, 0, 0))
+assert edges.popConnected(Vector(0, 0, 0)) == (Vector(0, 0, 0), Vector(0, 1, 0))
+assert len(edges) == 0
+
+
+# test cached bounds
+
+import pickle
+
+box = makeBox(2)
+assert box.getBounds() == (Vector(-2, -2, -2), Vector(2, 2, 2))
+assert box.getBounds() is box.getBounds()
+assert box.getBoundingSphere() == (Vector(0, 0, 0), math.sqrt(12))
+assert box.getCentroid() == Vector(0, 0, 0)
+version = box.getVersion()
+unused = box.addVertex(MeshVertex(Vector(0, 0, 0)))
+assert box.getVersion() != version
+unused.setPosition(Vector(0, 0, 10))
+assert box.getBounds() == (Vector(-2, -2, -2), Vector(2, 2, 10))
+assert box.getCentroid() == Vector(0, 0, 10.0 / 9.0)
+box.removeVertex(unused)
+assert box.getBounds()[1] == Vector(2, 2, 2)
+box.getVertices()[0].setPosition(Vector(-3, -2, -2))
+assert box.getBounds()[0] == Vector(-3, -2, -2)
+
+version = box.getVersion()
+box.getFaces()[0].setTextureTransform(Vector(1, 1), 0, Vector(8, 8))
+assert box.getVersion() != version
+
+box = pickle.loads(pickle.dumps(box))
+assert box.getVersion() == 0
+assert box.cache == { }
+assert box.getBounds()[0] == Vector(-3, -2, -2)
+assert Mesh().getBounds() == (Vector(0, 0, 0), Vector(0, 0, 0))
+
+
+# test MeshAttributeTable
+
+def faceAttributes(mesh):
+    attributes = [ ]
+    for face in mesh.getFaces():
+        face.normalUpdated = False
+        if face.getNormal() is None:
+            attributes.append((None, None, None, None))
+        else:
+            attributes.append((face.getNormal(), face.getPlane(),
+                               face.getArea(), face.getCentroid()))
+    return attributes
+
+def attributesClose(a, b):
+    for (n1, p1, a1, c1), (n2, p2, a2, c2) in zip(a, b):
+        if n1 is None or n2 is None:
+            if not (n1 is None and n2 is None and p1 is None and p2 is None
+                    and a1 is None and a2 is None):
+                return False
+            continue
+        if not (n1.isClose(n2) and c1.isClose(c2) and isclose(a1, a2)
+                and all(isclose(x, y) for x, y in zip(p1, p2))):
+            return False
+    return True
+
+mesh = makeBox(3)
+for vertex in mesh.getVertices():
+    vertex.setPosition(vertex.getPosition().rotate(Rotate(0.3, 0.7, 1.1))
+                       + Vector(5, -2, 1))
+pentagon = mesh.addFace()
+for i in range(0, 5):
+    pentagon.addVertex(mesh.addVertex(MeshVertex(
+        Vector(math.cos(i * 1.2566) * 4, 1, math.sin(i * 1.2566) * 4))))
+line = mesh.addFace()
+line.addVertex(mesh.getVertices()[0]).addVertex(mesh.getVertices()[1])
+
+scalarAttributes = faceAttributes(mesh)
+table = mesh.getAttributeTable()
+assert mesh.getAttributeTable() is table
+assert mesh.getCachedIfCurrent('attributes') is table
+assert attributesClose(faceAttributes(mesh), scalarAttributes)
+assert table.getArea(line) is None and table.getNormal(line) is None
+assert isclose(table.getArea(mesh.getFaces()[0]), 36)
+assert isclose(table.areas[table.getRow(pentagon)], pentagon.getArea())
+
+# modifying the mesh invalidates the table
+mesh.getVertices()[0].setPosition(Vector(0, 0, 0))
+assert mesh.getCachedIfCurrent('attributes') is None
+scalarAttributes = faceAttributes(mesh)
+assert mesh.getAttributeTable() is not table
+assert attributesClose(faceAttributes(mesh), scalarAttributes)
+
+
+# test subdivision
+
+from threelib.world import subdivideMesh, subdivideMeshFace
+
+def roundedFaces(mesh):
+    # faces as tuples of rounded positions and texture vertices, sorted
+    def rounded(vector):
+        return tuple(round(c, 6) for c in vector.getTuple())
+    return sorted(tuple((rounded(v.vertex.getPosition()),
+                         rounded(v.textureVertex)) for v in face.getVertices())
+                  for face in mesh.getFaces())
+
+def subdivideEachFace(mesh, maxSize):
+    # the original algorithm
+    mesh = mesh.clone()
+    for face in list(mesh.getFaces()):
+        subdivideMeshFace(mesh, face, maxSize)
+    mesh.combineDuplicateVertices()
+    return mesh
+
+boxes = makeTexturedBoxes()
+transformBoxes(boxes[1:])
+for box, maxSize in ((boxes[0], 5), (boxes[1], 0.5), (boxes[1], 100)):
+    expected = subdivideEachFace(box, maxSize)
+    subdivided = subdivideMesh(box, maxSize)
+    assert len(subdivided.getVertices()) == len(expected.getVertices())
+    assert roundedFaces(subdivided) == roundedFaces(expected)
+    assert all(face.getArea() <= maxSize or len(face.getVertices()) > 3
+               for face in subdivided.getFaces())
+assert len(subdivideMesh(boxes[1], 100).getFaces()) == 6
+assert boxes[0].getFaces()[0].getMaterial() \
+    is subdivideMesh(boxes[0], 5).getFaces()[0].getMaterial()
+
+# only faces that lights can reach
+from threelib.world import LightBounds, findLitFaces
+
+box = CompactMesh.fromMesh(makeBox(64))
+white = ((0, 0, 0), (1, 1, 1), (1, 1, 1))
+above = LightBounds(Vector(0, 0, 100), (0, 0.03, 0), white)
+top = [True, False, False, False, False, False]
+assert findLitFaces(box, [above]).tolist() == top
+assert findLitFaces(box, [LightBounds(Vector(0, 0, 20000), (0, 0.03, 0),
+                                      white)]).tolist() == [False] * 6
+# ambient light reaches faces facing away from it
+assert findLitFaces(box, [LightBounds(
+    Vector(0, 0, 100), (0, 0.03, 0),
+    ((0.2, 0.2, 0.2), (1, 1, 1), (1, 1, 1)))]).all()
+# spot lights
+assert not findLitFaces(box, [LightBounds(Vector(0, 0, 200), (1, 0, 0), white,
+                                          Vector(0, 0, 1), math.pi / 4)]).any()
+assert findLitFaces(box, [LightBounds(Vector(0, 0, 200), (1, 0, 0), white,
+                                      Vector(0, 0, -1), math.pi / 4)]).tolist() \
+    == top
+assert findLitFaces(box, [above.transformed(
+    Vector(0, 0, -50), Rotate(0, math.pi, 0))]).tolist() \
+    == [False, False, False, True, False, False]
+# a rotation which isn't its own inverse
+yawed = LightBounds(Vector(0, 100, 0), (0, 0.03, 0), white)
+assert yawed.transformed(Vector(0, 0, 0), Rotate(0, 0, math.pi / 2)) \
+    .position.isClose(Vector(100, 0, 0))
+rotation = Rotate(0.3, 0.4, math.pi / 2)
+offset = Vector(10, -20, 30)
+spot = LightBounds(Vector(100, 0, 0).rotate(rotation) + offset, (1, 0, 0),
+                   white, Vector(-1, 0, 0).rotate(rotation), math.pi / 4)
+local = spot.transformed(offset, rotation)
+assert local.position.isClose(Vector(100, 0, 0))
+assert local.direction.isClose(Vector(-1, 0, 0))
+lit = findLitFaces(box, [local]).tolist()
+assert lit.count(True) == 1
+assert lit == findLitFaces(box, [LightBounds(
+    Vector(100, 0, 0), (1, 0, 0), white, Vector(-1, 0, 0),
+    math.pi / 4)]).tolist()
+
+maxArea = numpy.where(findLitFaces(box, [above]), 144, numpy.inf)
+assert box.countTriangles() == 12
+assert box.countTriangles(maxArea) == box.subdivide(maxArea).countTriangles() \
+    == 128 + 10
+assert box.estimateTriangles(maxArea) == 128 + 10
+assert box.estimateTriangles(numpy.inf) == 12
+
+
+# test VectorArray with mesh vertices
+
+from threelib.vectorMath import VectorArray
+
+box = makeBox(2)
+positions = VectorArray.fromVertices(box.getVertices())
+assert positions.toVectors() == [v.getPosition() for v in box.getVertices()]
+assert positions.getBounds() == box.getBounds()
+version = box.getVersion()
+with MeshEditBatch():
+    (positions * 2 + Vector(1, 0, 0)).setVertexPositions(box.getVertices())
+assert box.getVersion() != version
+assert box.getBounds() == (Vector(-3, -4, -4), Vector(5, 4, 4))
+
+
+print("Done.")
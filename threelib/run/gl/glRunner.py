@@ -5,6 +5,7 @@ from threelib.world import RayCollisionRequest
 from threelib.sim.lighting import *
 from threelib.vectorMath import Vector
 from threelib.vectorMath import Rotate
+from threelib.textureAtlas import batchFaces, countBinds, countBatchBinds
 
 import math
 
@@ -38,8 +39,29 @@ class GLRunner(GameInterface):
             if 'farclip' in self.gameConfig['camera']:
                 self.farClip = float(self.gameConfig['camera']['farclip'])
 
+        self.textureFilter = 'nearest'
+        self.mipmapFilter = 'box'
+        self.atlasTextureSize = 0
+        if 'graphics' in self.gameConfig:
+            if 'texturefilter' in self.gameConfig['graphics']:
+                self.textureFilter = \
+                    self.gameConfig['graphics']['texturefilter']
+            if 'mipmapfilter' in self.gameConfig['graphics']:
+                self.mipmapFilter = \
+                    self.gameConfig['graphics']['mipmapfilter']
+            if 'atlastexturesize' in self.gameConfig['graphics']:
+                self.atlasTextureSize = \
+                    int(self.gameConfig['graphics']['atlastexturesize'])
+
+        # texture binds in the current frame, with and without the texture
+        # atlas. They are printed when they change.
+        self.textureBinds = [0, 0]
+        self.printedTextureBinds = None
+
     def init(self):
         self._fullscreenMessage("Loading...")
+        self.instance.setTextureFilter(self.textureFilter, self.mipmapFilter)
+        self.instance.setTextureAtlasSize(self.atlasTextureSize)
         super().init()
 
         self._resetProjection()
@@ -235,6 +257,7 @@ class GLRunner(GameInterface):
             glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         # end for each ray collision request
 
+        self.textureBinds = [0, 0]
 
         if self.world.skyCamera is not None:
             glPushMatrix()
@@ -284,6 +307,11 @@ class GLRunner(GameInterface):
             glPopMatrix()
             glMatrixMode(GL_MODELVIEW)
 
+        if self.textureBinds != self.printedTextureBinds:
+            print("Texture binds per frame:", self.textureBinds[0],
+                  "(" + str(self.textureBinds[1]), "without the atlas)")
+            self.printedTextureBinds = self.textureBinds
+
         # Frame rate text
         self.instance.drawText(str(self.instance.getFps()) + " FPS",
                                GLUT_BITMAP_9_BY_15,
@@ -312,6 +340,7 @@ class GLRunner(GameInterface):
                 if hasattr(renderMesh, 'displayList'):
                     if renderMesh.displayList is not None:
                         glCallList(renderMesh.displayList)
+                        self._countTextureBinds(renderMesh.textureBinds)
                         glPopMatrix()
                         continue
 
@@ -324,31 +353,35 @@ class GLRunner(GameInterface):
                     displayList = True
                     glNewList(renderMesh.displayList, GL_COMPILE_AND_EXECUTE)
 
-            currentMat = None
-            glDisable(GL_TEXTURE_2D)
-            glColor(0.8, 0.8, 0.8)
+            normals = { }
             for f in renderMesh.getMesh().getFaces():
                 normal = f.getNormal()
-                if normal == None:
-                    continue
+                if normal != None:
+                    normals[f] = normal
+            # faces are drawn in groups which use the same texture
+            batches = batchFaces(normals.keys(),
+                                 self.instance.getTextureAtlas())
+            renderMesh.textureBinds = (countBatchBinds(batches),
+                                       countBinds(normals.keys()))
+            self._countTextureBinds(renderMesh.textureBinds)
 
-                faceMat = f.getMaterial()
-                if faceMat is not currentMat:
-                    if faceMat is None or not faceMat.isLoaded():
-                        glDisable(GL_TEXTURE_2D)
-                    else:
-                        glEnable(GL_TEXTURE_2D)
-                        glBindTexture(GL_TEXTURE_2D, faceMat.getNumber())
-                    currentMat = faceMat
-
-                glNormal(normal.y, normal.z, normal.x)
-                glBegin(GL_POLYGON)
-                for v in f.getVertices():
-                    pos = v.vertex.getPosition()
-                    texPos = v.textureVertex
-                    glTexCoord(texPos.x, texPos.y)
-                    glVertex(pos.y, pos.z, pos.x)
-                glEnd()
+            glDisable(GL_TEXTURE_2D)
+            glColor(0.8, 0.8, 0.8)
+            for texture, polygons in batches:
+                if texture is None:
+                    glDisable(GL_TEXTURE_2D)
+                else:
+                    glEnable(GL_TEXTURE_2D)
+                    glBindTexture(GL_TEXTURE_2D, texture.getNumber())
+
+                for f, polygon in polygons:
+                    normal = normals[f]
+                    glNormal(normal.y, normal.z, normal.x)
+                    glBegin(GL_POLYGON)
+                    for pos, texPos in polygon:
+                        glTexCoord(texPos[0], texPos[1])
+                        glVertex(pos.y, pos.z, pos.x)
+                    glEnd()
 
             if displayList:
                 glEndList()
@@ -356,6 +389,10 @@ class GLRunner(GameInterface):
             glPopMatrix()
         glDisable(GL_TEXTURE_2D)
 
+    def _countTextureBinds(self, binds):
+        self.textureBinds = [self.textureBinds[0] + binds[0],
+                             self.textureBinds[1] + binds[1]]
+
 
     def updateLights(self):
         for light in self.world.directionalLights:
@@ -96,8 +96,13 @@ class CollisionMesh(threelib.sim.base.Entity):
         # rotate mesh with X/Y rotation only
         self.mesh = self.unrotatedMesh.clone()
         meshRotation = self.getRotation().setZ(0)
-        for vertex in self.mesh.getVertices():
-            vertex.setPosition(vertex.getPosition().rotate(meshRotation))
+        vertices = self.mesh.getVertices()
+        positions = meshRotation.rotateVectors(
+            [vertex.getPosition() for vertex in vertices])
+        for vertex, position in zip(vertices, positions):
+            vertex.setPosition(position)
+        # normals and planes are used every frame, calculate them all at once
+        self.mesh.getAttributeTable()
 
         # split mesh faces into "top" and "bottom" based on normal
         self.topFaces = [ ]
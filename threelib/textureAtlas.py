@@ -0,0 +1,365 @@
+__author__ = "jacobvanthoog"
+
+# A texture atlas packs small textures into a few large textures, called pages,
+# so faces with different materials can be drawn without binding a new texture
+# for each material.
+#
+# Faces repeat their textures (GL_REPEAT), but OpenGL 1 can only repeat a whole
+# texture, not a region of a page. So faces are split along the edges of each
+# repetition of their texture (see splitPolygon), and each piece is drawn with
+# coordinates inside the region of the page. Faces that would be split into
+# too many pieces are drawn with the material's own texture instead.
+#
+# Each region is surrounded by a border of pixels copied from the opposite
+# sides of the texture, so filtering near the edges of a region blends the
+# same pixels GL_REPEAT would.
+
+import math
+import numpy
+from threelib.materials import Texture, isPowerOf2
+
+PAGE_SIZE = 1024
+PADDING = 4
+
+# faces are split into at most this many pieces to be drawn from an atlas
+MAX_FACE_PIECES = 16
+
+# texture coordinates this close to the edge of a repetition aren't split
+_SPLIT_TOLERANCE = 1e-6
+
+_CHANNELS = {'RGB': 3, 'RGBA': 4}
+
+
+class AtlasRegion:
+    """
+    The location of a texture in an AtlasPage.
+    """
+
+    def __init__(self, page, x, y, xLen, yLen):
+        self.page = page
+        self.x = x
+        self.y = y
+        self.xLen = xLen
+        self.yLen = yLen
+
+    def getPage(self):
+        """
+        Get the AtlasPage containing the texture.
+        """
+        return self.page
+
+    def toAtlas(self, u, v):
+        """
+        Convert texture coordinates within one repetition of the texture (from
+        0 to 1) to coordinates in the page. Return a tuple.
+        """
+        size = self.page.size
+        return ((self.x + u * self.xLen) / size,
+                (self.y + v * self.yLen) / size)
+
+
+class AtlasPage:
+    """
+    A square texture containing many smaller textures of the same data type.
+    """
+
+    def __init__(self, dataType, size=PAGE_SIZE):
+        self.dataType = dataType
+        self.size = size
+        self.pixels = numpy.zeros((size, size, _CHANNELS[dataType]),
+                                  dtype=numpy.uint8)
+        # shelves are rows of textures, as lists of [y, height, next x]
+        self.shelves = [ ]
+        self.number = 0
+        self.changed = True
+
+    def getDataType(self):
+        """
+        The data type of the page (see ``Texture.getDataType``).
+        """
+        return self.dataType
+
+    def getNumber(self):
+        """
+        Return the number stored with ``setNumber``.
+        """
+        return self.number
+
+    def setNumber(self, number):
+        """
+        Set an ID number for 3d rendering, like
+        ``MaterialReference.setNumber``.
+        """
+        self.number = number
+
+    def getTexture(self):
+        """
+        Get a Texture with the pixels of the page. It shares memory with the
+        page, so it changes when textures are added.
+        """
+        return Texture(self.pixels, self.dataType, self.size, self.size)
+
+    def allocate(self, xLen, yLen):
+        """
+        Find space for a rectangle of the specified size, including padding.
+        Return the (x, y) position of the rectangle, or None if the page is
+        full.
+        """
+        if xLen > self.size or yLen > self.size:
+            return None
+        # the shortest shelf the rectangle fits in
+        best = None
+        for shelf in self.shelves:
+            if shelf[1] >= yLen and shelf[2] + xLen <= self.size \
+                    and (best is None or shelf[1] < best[1]):
+                best = shelf
+        if best is None:
+            if len(self.shelves) == 0:
+                top = 0
+            else:
+                top = self.shelves[-1][0] + self.shelves[-1][1]
+            if top + yLen > self.size:
+                return None
+            best = [top, yLen, 0]
+            self.shelves.append(best)
+        position = (best[2], best[0])
+        best[2] += xLen
+        return position
+
+    def draw(self, region, texture):
+        """
+        Copy the pixels of a Texture into a region of the page, surrounded by
+        padding which wraps around the texture.
+        """
+        x = region.x - PADDING
+        y = region.y - PADDING
+        image = texture.getData().reshape(
+            (texture.getYLen(), texture.getXLen(), -1))
+        self.pixels[y:y + region.yLen + PADDING * 2,
+                    x:x + region.xLen + PADDING * 2] = \
+            numpy.pad(image, ((PADDING, PADDING), (PADDING, PADDING), (0, 0)),
+                      mode='wrap')
+        self.changed = True
+
+
+class TextureAtlas:
+    """
+    Packs the textures of materials into AtlasPages. Only textures with power of
+    2 sizes up to ``maxTextureSize`` are packed; a ``maxTextureSize`` of 0
+    disables the atlas.
+    """
+
+    def __init__(self, maxTextureSize=0, pageSize=PAGE_SIZE):
+        self.maxTextureSize = min(maxTextureSize, pageSize - PADDING * 2)
+        self.pageSize = pageSize
+        self.pages = [ ]
+        self.regions = { } # maps MaterialReferences to AtlasRegions
+
+    def canAdd(self, texture):
+        """
+        Check if a Texture is small enough to be packed.
+        """
+        return texture is not None \
+            and texture.getDataType() in _CHANNELS \
+            and isPowerOf2(texture.getXLen()) \
+            and isPowerOf2(texture.getYLen()) \
+            and texture.getXLen() <= self.maxTextureSize \
+            and texture.getYLen() <= self.maxTextureSize
+
+    def add(self, material, texture):
+        """
+        Add the Texture of a material to the atlas, or replace it. Return the
+        AtlasRegion, or None if the texture can't be packed. If a replaced
+        texture has a different size, it is moved to a new region; its old
+        region isn't reused.
+        """
+        if not self.canAdd(texture):
+            self.remove(material)
+            return None
+        region = self.regions.get(material)
+        if region is not None and region.page.dataType \
+                == texture.getDataType() and region.xLen == texture.getXLen() \
+                and region.yLen == texture.getYLen():
+            region.page.draw(region, texture)
+            return region
+
+        paddedX = texture.getXLen() + PADDING * 2
+        paddedY = texture.getYLen() + PADDING * 2
+        position = None
+        for page in self.pages:
+            if page.dataType == texture.getDataType():
+                position = page.allocate(paddedX, paddedY)
+                if position is not None:
+                    break
+        if position is None:
+            page = AtlasPage(texture.getDataType(), self.pageSize)
+            self.pages.append(page)
+            position = page.allocate(paddedX, paddedY)
+        region = AtlasRegion(page, position[0] + PADDING,
+                             position[1] + PADDING,
+                             texture.getXLen(), texture.getYLen())
+        page.draw(region, texture)
+        self.regions[material] = region
+        return region
+
+    def remove(self, material):
+        """
+        Stop using the atlas for a material. Its region isn't reused.
+        """
+        self.regions.pop(material, None)
+
+    def getRegion(self, material):
+        """
+        Get the AtlasRegion of a material, or None if it isn't in the atlas.
+        """
+        return self.regions.get(material)
+
+    def getPages(self):
+        """
+        Get a list of every AtlasPage.
+        """
+        return self.pages
+
+    def getChangedPages(self):
+        """
+        Get a list of the AtlasPages that have changed since the last time this
+        was called.
+        """
+        changed = [page for page in self.pages if page.changed]
+        for page in changed:
+            page.changed = False
+        return changed
+
+    def clear(self):
+        """
+        Remove every page and material.
+        """
+        self.pages = [ ]
+        self.regions = { }
+
+
+def splitPolygon(points, maxPieces=MAX_FACE_PIECES):
+    """
+    Split a convex polygon along the edges of each repetition of its texture.
+    ``points`` is a list of tuples of a position (which has a ``lerp`` method,
+    like a Vector) and (u, v) texture coordinates. Return a list of tuples of
+    the (u, v) index of the repetition, and a polygon in the same format as
+    ``points`` with texture coordinates relative to the repetition (from 0 to
+    1). Return None if the polygon would be split into more than ``maxPieces``
+    pieces.
+    """
+    us = [uv[0] for position, uv in points]
+    vs = [uv[1] for position, uv in points]
+    u0 = math.floor(min(us) + _SPLIT_TOLERANCE)
+    u1 = max(math.ceil(max(us) - _SPLIT_TOLERANCE), u0 + 1)
+    v0 = math.floor(min(vs) + _SPLIT_TOLERANCE)
+    v1 = max(math.ceil(max(vs) - _SPLIT_TOLERANCE), v0 + 1)
+    if (u1 - u0) * (v1 - v0) > maxPieces:
+        return None
+
+    pieces = [ ]
+    for tileU, column in _splitAxis(points, 0, u0, u1):
+        for tileV, piece in _splitAxis(column, 1, v0, v1):
+            # edges that pass through a corner leave pieces with no area
+            if _textureArea(piece) > _SPLIT_TOLERANCE:
+                pieces.append(((tileU, tileV), piece))
+    if len(pieces) == 0:
+        # the texture coordinates have no area, so nothing was kept
+        pieces = [((u0, v0), points)]
+    return [(tile, [(position, (uv[0] - tile[0], uv[1] - tile[1]))
+                    for position, uv in piece])
+            for tile, piece in pieces]
+
+def _textureArea(points):
+    area = 0.0
+    for i in range(0, len(points)):
+        u1, v1 = points[i - 1][1]
+        u2, v2 = points[i][1]
+        area += u1 * v2 - u2 * v1
+    return abs(area) / 2
+
+def _splitAxis(points, axis, start, end):
+    # yield the tile index and the part of the polygon in each tile along one
+    # axis, with the tiles from start to end
+    remaining = points
+    for tile in range(start, end - 1):
+        inside = _clip(remaining, axis, tile + 1, -1)
+        remaining = _clip(remaining, axis, tile + 1, 1)
+        if len(inside) >= 3:
+            yield tile, inside
+    if len(remaining) >= 3:
+        yield end - 1, remaining
+
+def _clip(points, axis, line, side):
+    # Sutherland-Hodgman clipping: keep the part of the polygon where
+    # (coordinate - line) * side >= 0
+    result = [ ]
+    for i in range(0, len(points)):
+        a = points[i - 1]
+        b = points[i]
+        aDist = (a[1][axis] - line) * side
+        bDist = (b[1][axis] - line) * side
+        if (aDist >= 0) != (bDist >= 0):
+            amount = aDist / (aDist - bDist)
+            result.append((a[0].lerp(b[0], amount),
+                           (a[1][0] + (b[1][0] - a[1][0]) * amount,
+                            a[1][1] + (b[1][1] - a[1][1]) * amount)))
+        if bDist >= 0:
+            result.append(b)
+    return result
+
+
+def batchFaces(faces, atlas=None, maxPieces=MAX_FACE_PIECES):
+    """
+    Group MeshFaces by the texture they are drawn with, so each texture only has
+    to be bound once. Return a list of tuples of a texture, and a list of
+    tuples of a face and a polygon. The texture is an AtlasPage, a
+    MaterialReference, or None for faces without a loaded material. Each
+    polygon is a list of tuples of a position Vector and (s, t) texture
+    coordinates. Faces in the atlas may be split into multiple polygons.
+    """
+    batches = { }
+    for face in faces:
+        material = face.getMaterial()
+        if material is None or not material.isLoaded():
+            material = None
+        points = [(v.vertex.getPosition(),
+                   (v.textureVertex.x, v.textureVertex.y))
+                  for v in face.getVertices()]
+
+        region = None
+        if atlas is not None and material is not None:
+            region = atlas.getRegion(material)
+        if region is not None:
+            pieces = splitPolygon(points, maxPieces)
+            if pieces is not None:
+                polygons = batches.setdefault(region.page, [ ])
+                for tile, piece in pieces:
+                    polygons.append((face, [
+                        (position, region.toAtlas(uv[0], uv[1]))
+                        for position, uv in piece]))
+                continue
+        batches.setdefault(material, [ ]).append((face, points))
+    return list(batches.items())
+
+def countBinds(faces):
+    """
+    Count the textures that would be bound to draw MeshFaces in order, binding a
+    texture every time the material changes.
+    """
+    binds = 0
+    currentMat = None
+    for face in faces:
+        faceMat = face.getMaterial()
+        if faceMat is not currentMat:
+            if faceMat is not None and faceMat.isLoaded():
+                binds += 1
+            currentMat = faceMat
+    return binds
+
+def countBatchBinds(batches):
+    """
+    Count the textures that would be bound to draw the result of
+    ``batchFaces``.
+    """
+    return sum(1 for texture, polygons in batches if texture is not None)
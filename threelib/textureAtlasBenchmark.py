@@ -0,0 +1,58 @@
+__author__ = "jacobvanthoog"
+
+# run from the root directory with: python3 -m threelib.textureAtlasBenchmark
+
+import time
+import numpy
+from threelib.vectorMath import Vector
+from threelib.mesh import *
+from threelib.materials import Texture, MaterialReference
+from threelib.textureAtlas import *
+
+
+def makeMaterials(numMaterials, random):
+    atlas = TextureAtlas(maxTextureSize=64)
+    materials = [ ]
+    for i in range(0, numMaterials):
+        material = MaterialReference("material" + str(i))
+        material.setLoaded(True)
+        size = 2 ** random.randint(3, 8) # 8 to 128 pixels
+        atlas.add(material, Texture(
+            random.randint(0, 256, size * size * 3, numpy.uint8),
+            "RGB", size, size))
+        materials.append(material)
+    return atlas, materials
+
+def makeMesh(size, materials, uvScale, random):
+    # a grid of quads with random materials, each covering uvScale repetitions
+    # of its texture
+    mesh = Mesh()
+    for x in range(0, size):
+        for y in range(0, size):
+            face = mesh.addFace()
+            face.setMaterial(materials[random.randint(0, len(materials))])
+            shift = random.uniform(0, 1, 2)
+            for vx, vy in ((0, 0), (1, 0), (1, 1), (0, 1)):
+                face.addVertex(
+                    mesh.addVertex(MeshVertex(Vector(x + vx, y + vy, 0))),
+                    Vector(shift[0] + vx * uvScale, shift[1] + vy * uvScale))
+    return mesh
+
+
+print("{:>24} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+    "texture binds per frame", "in order", "batched", "polygons",
+    "batch time", "editor"))
+random = numpy.random.RandomState(0)
+for numMaterials, size, uvScale in ((10, 30, 0.5), (100, 30, 0.5),
+                                    (100, 30, 2.5), (100, 30, 8)):
+    atlas, materials = makeMaterials(numMaterials, random)
+    faces = makeMesh(size, materials, uvScale, random).getFaces()
+    startTime = time.perf_counter()
+    batches = batchFaces(faces, atlas)
+    batchTime = time.perf_counter() - startTime
+    numPolygons = sum(len(polygons) for texture, polygons in batches)
+    editorBinds = countBatchBinds(batchFaces(faces, atlas, maxPieces=1))
+    print("{:>24} {:10} {:10} {:10} {:10.4f} {:10}".format(
+        "{} materials, {} uv".format(numMaterials, uvScale),
+        countBinds(faces), countBatchBinds(batches), numPolygons, batchTime,
+        editorBinds))
@@ -0,0 +1,184 @@
+__author__ = "jacobvanthoog"
+
+# run from the root directory with: python3 -m threelib.textureAtlasTest
+
+import numpy
+from threelib.vectorMath import Vector
+from threelib.mesh import *
+from threelib.materials import Texture, MaterialReference
+from threelib.textureAtlas import *
+
+
+def makeTexture(xLen, yLen, dataType="RGB", seed=0):
+    channels = len(dataType)
+    random = numpy.random.RandomState(seed)
+    return Texture(random.randint(0, 256, xLen * yLen * channels, numpy.uint8),
+                   dataType, xLen, yLen)
+
+def polygonArea(polygon):
+    # area in texture space
+    area = 0.0
+    for i in range(0, len(polygon)):
+        u1, v1 = polygon[i - 1][1]
+        u2, v2 = polygon[i][1]
+        area += u1 * v2 - u2 * v1
+    return abs(area) / 2
+
+def makeMaterial(name, loaded=True):
+    material = MaterialReference(name)
+    material.setLoaded(loaded)
+    return material
+
+
+# test packing
+
+atlas = TextureAtlas(maxTextureSize=64, pageSize=256)
+materials = [makeMaterial("m" + str(i)) for i in range(0, 40)]
+textures = [makeTexture((8, 16, 32, 64)[i % 4], (64, 8, 16, 32)[i % 3],
+                        seed=i) for i in range(0, 40)]
+for material, texture in zip(materials, textures):
+    assert atlas.add(material, texture) is not None
+assert len(atlas.getPages()) > 1
+assert len(atlas.getChangedPages()) == len(atlas.getPages())
+assert atlas.getChangedPages() == [ ]
+
+for page in atlas.getPages():
+    # padded regions don't overlap
+    used = numpy.zeros((page.size, page.size), dtype=int)
+    for material, texture in zip(materials, textures):
+        region = atlas.getRegion(material)
+        if region.getPage() is not page:
+            continue
+        used[region.y - PADDING:region.y + region.yLen + PADDING,
+             region.x - PADDING:region.x + region.xLen + PADDING] += 1
+    assert used.max() == 1
+
+for material, texture in zip(materials, textures):
+    region = atlas.getRegion(material)
+    pixels = region.getPage().pixels
+    image = texture.getData().reshape((texture.getYLen(), texture.getXLen(),
+                                       3))
+    assert numpy.array_equal(pixels[region.y:region.y + region.yLen,
+                                    region.x:region.x + region.xLen], image)
+    # the padding repeats the texture
+    assert numpy.array_equal(pixels[region.y - 1, region.x:region.x + 2],
+                             image[-1, 0:2])
+    assert numpy.array_equal(pixels[region.y + region.yLen, region.x - 1],
+                             image[0, -1])
+    assert region.toAtlas(0, 0) == (region.x / 256, region.y / 256)
+    assert region.toAtlas(1, 1) == ((region.x + region.xLen) / 256,
+                                    (region.y + region.yLen) / 256)
+
+# replacing a texture with the same size keeps its region
+region = atlas.getRegion(materials[0])
+newTexture = makeTexture(textures[0].getXLen(), textures[0].getYLen(),
+                         seed=100)
+assert atlas.add(materials[0], newTexture) is region
+assert atlas.getChangedPages() == [region.getPage()]
+assert numpy.array_equal(
+    region.getPage().pixels[region.y:region.y + region.yLen,
+                            region.x:region.x + region.xLen].ravel(),
+    newTexture.getData())
+# a different size moves it
+assert atlas.add(materials[0], makeTexture(4, 4)) is not region
+# textures that are too large, or not a power of 2, aren't packed
+assert atlas.add(materials[0], makeTexture(128, 4)) is None
+assert atlas.getRegion(materials[0]) is None
+assert atlas.add(materials[1], makeTexture(12, 4)) is None
+assert atlas.getRegion(materials[1]) is None
+# RGBA textures go on a separate page
+region = atlas.add(materials[2], makeTexture(8, 8, "RGBA"))
+assert region.getPage().getDataType() == "RGBA"
+texture = region.getPage().getTexture()
+assert texture.getDataType() == "RGBA" and texture.getXLen() == 256
+assert len(texture.getData()) == 256 * 256 * 4
+assert TextureAtlas(0).add(materials[0], makeTexture(4, 4)) is None
+atlas.clear()
+assert atlas.getPages() == [ ] and atlas.getRegion(materials[3]) is None
+
+
+# test splitting polygons
+
+def makePoints(uvs):
+    return [(Vector(u * 10, v * 10, 1), (u, v)) for u, v in uvs]
+
+# inside one repetition
+pieces = splitPolygon(makePoints([(1.25, 2.25), (1.75, 2.25), (1.5, 2.75)]))
+assert len(pieces) == 1
+tile, piece = pieces[0]
+assert tile == (1, 2)
+assert [uv for position, uv in piece] == [(0.25, 0.25), (0.75, 0.25),
+                                          (0.5, 0.75)]
+# touching the edges isn't split
+pieces = splitPolygon(makePoints([(-1, 0), (0, 0), (0, 1), (-1, 1)]))
+assert len(pieces) == 1 and pieces[0][0] == (-1, 0)
+
+# a quad covering 3 x 2 repetitions
+quad = makePoints([(-0.5, 0.5), (2.5, 0.5), (2.5, 2.5), (-0.5, 2.5)])
+pieces = splitPolygon(quad)
+assert sorted(tile for tile, piece in pieces) == [
+    (u, v) for u in range(-1, 3) for v in range(0, 3)]
+assert abs(sum(polygonArea(piece) for tile, piece in pieces) - 6.0) < 1e-9
+for tile, piece in pieces:
+    for position, uv in piece:
+        assert -1e-9 <= uv[0] <= 1 + 1e-9 and -1e-9 <= uv[1] <= 1 + 1e-9
+        # positions are interpolated with the texture coordinates
+        assert position.isClose(Vector((uv[0] + tile[0]) * 10,
+                                       (uv[1] + tile[1]) * 10, 1))
+assert splitPolygon(quad, maxPieces=11) is None
+assert len(splitPolygon(quad, maxPieces=12)) == 12
+
+# a triangle crossing a corner doesn't include empty repetitions
+pieces = splitPolygon(makePoints([(0.5, 0.5), (1.5, 0.5), (0.5, 1.5)]))
+assert sorted(tile for tile, piece in pieces) == [(0, 0), (0, 1), (1, 0)]
+assert abs(sum(polygonArea(piece) for tile, piece in pieces) - 0.5) < 1e-9
+
+
+# test batching faces
+
+def makeMesh(faceMaterials, uvSize=0.5):
+    mesh = Mesh()
+    for i, material in enumerate(faceMaterials):
+        face = mesh.addFace()
+        # setMaterial recalculates the texture vertices, so it's called first
+        face.setMaterial(material)
+        for x, y in ((0, 0), (1, 0), (1, 1), (0, 1)):
+            face.addVertex(mesh.addVertex(MeshVertex(Vector(i, x, y))),
+                           Vector(x * uvSize, y * uvSize))
+    return mesh
+
+small = [makeMaterial("small" + str(i)) for i in range(0, 3)]
+large = makeMaterial("large")
+unloaded = makeMaterial("unloaded", False)
+atlas = TextureAtlas(maxTextureSize=64)
+for material in small:
+    atlas.add(material, makeTexture(16, 16))
+atlas.add(large, makeTexture(128, 128))
+faceMaterials = [small[0], small[1], large, small[2], None, small[0],
+                 unloaded, small[1], large, small[2]]
+faces = makeMesh(faceMaterials).getFaces()
+assert countBinds(faces) == 8
+
+batches = batchFaces(faces, atlas)
+assert [texture for texture, polygons in batches] == \
+    [atlas.getPages()[0], large, None]
+assert countBatchBinds(batches) == 2
+assert [face for face, polygon in batches[0][1]] == \
+    [f for f in faces if f.getMaterial() in small]
+assert [face for face, polygon in batches[2][1]] == \
+    [f for f in faces if f.getMaterial() in (None, unloaded)]
+for face, polygon in batches[0][1]:
+    region = atlas.getRegion(face.getMaterial())
+    assert polygon[2][1] == region.toAtlas(0.5, 0.5)
+for face, polygon in batches[1][1]:
+    assert polygon[2][1] == (0.5, 0.5)
+
+# faces that repeat their textures are split, or use their own texture
+faces = makeMesh(small, uvSize=2).getFaces()
+batches = batchFaces(faces, atlas)
+assert len(batches) == 1 and len(batches[0][1]) == 3 * 4
+batches = batchFaces(faces, atlas, maxPieces=1)
+assert [texture for texture, polygons in batches] == small
+assert countBatchBinds(batchFaces(faces)) == 3
+
+print("Done.")
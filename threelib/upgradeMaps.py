@@ -0,0 +1,102 @@
+__author__ = "jacobvanthoog"
+
+# Upgrade every map in the maps folder of a game directory to the current
+# version and file format, so they don't have to be converted every time
+# they're loaded.
+#
+# run from the root directory with:
+#     python3 -m threelib.upgradeMaps gameDir [-cache] [-compress=codec]
+#
+# -cache leaves the maps unchanged, and only saves the converted maps in the
+# cache directory of the game (see files.loadMapState). -compress saves the
+# upgraded maps with a compression codec (see mapCompression).
+
+import sys
+from pathlib import Path
+from threelib import files
+from threelib import mapCompression
+from threelib.edit import journal
+import threelib.edit.fileVersions.converters
+
+
+def upgradeMap(path, cacheOnly=False, codec=None):
+    """
+    Upgrade the map at the specified file Path, if it was saved by an older
+    version of three. If ``cacheOnly`` is True, the converted map is saved in
+    the cache instead of replacing the map. ``codec`` is the same as for
+    ``files.saveMapState``. Return True if the map was upgraded, or False if
+    it was already up to date.
+    """
+    if not files.mapNeedsConverting(path):
+        return False
+    if cacheOnly:
+        if files.convertedMapIsCached(path):
+            return False
+        files.loadMapState(path)
+        # legacy maps which are already the current version aren't cached
+        return files.convertedMapIsCached(path)
+    state = files.loadMapState(path, useCache=False)
+    if state is None:
+        return False
+    # the changes in the journal are saved with the map
+    files.saveMapState(path, state, codec=codec)
+    if journal.journalPath(path).exists():
+        journal.journalPath(path).unlink()
+    return True
+
+def listMaps():
+    """
+    Get a list of Paths to every map file in the maps folder of the game
+    directory.
+    """
+    return sorted(path for path in files.getMapDir().iterdir()
+                  if path.is_file() and not path.name.startswith(".")
+                  and path.suffix not in (".journal", ".saving"))
+
+def main(args):
+    gameDir = None
+    cacheOnly = False
+    codec = None
+    for arg in args:
+        if arg == "-cache":
+            cacheOnly = True
+        elif arg.startswith("-compress="):
+            codec = arg[len("-compress="):]
+            if codec not in mapCompression.codecs:
+                print("Unknown compression codec:", codec)
+                return
+        elif gameDir is None and not arg.startswith("-"):
+            gameDir = arg
+        else:
+            print("Invalid argument", arg)
+            return
+    if gameDir is None:
+        print("upgradeMaps takes a game directory path with a maps folder")
+        print("Use -cache to only save converted maps in the cache")
+        print("Use -compress=zlib or -compress=lzma to compress the maps")
+        return
+
+    try:
+        files.setGameDir(Path(gameDir))
+        maps = listMaps()
+    except FileNotFoundError:
+        print("Game directory not found")
+        return
+
+    numUpgraded = 0
+    for path in maps:
+        try:
+            upgraded = upgradeMap(path, cacheOnly, codec)
+        except Exception as e:
+            print(path.name + ": couldn't be upgraded:", e)
+            continue
+        if upgraded:
+            numUpgraded += 1
+            print(path.name + ": upgraded")
+        else:
+            print(path.name + ": already up to date")
+    print("Upgraded", numUpgraded, "of", len(maps), "maps")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
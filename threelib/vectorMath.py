@@ -3,6 +3,7 @@ __author__ = "jacobvanthoog"
 import numbers
 import math
 import decimal
+import numpy
 
 def setDecimalMode(enabled=True):
     if enabled:
@@ -27,7 +28,9 @@ def fixRotation(n):
     """
     Limit rotation to be between 0 and 2pi.
     """
-    n = toNumber(n)
+    n = float(n)
+    if 0.0 <= n < CIRCLE:
+        return n # already in range, the result would be the same
     if n < 0:
         circles = math.ceil(-n / CIRCLE)
         n += circles * CIRCLE
@@ -55,7 +58,11 @@ def numToStr(num):
     else:
         return "{0:.3f}".format(num)
 
-def isclose(a, b, rel_tol=1e-9, abs_tol=1e-9):
+# default tolerances for isclose
+ISCLOSE_REL_TOL = 1e-9
+ISCLOSE_ABS_TOL = 1e-9
+
+def isclose(a, b, rel_tol=ISCLOSE_REL_TOL, abs_tol=ISCLOSE_ABS_TOL):
     """
     Based on https://www.python.org/dev/peps/pep-0485/
 
@@ -139,6 +146,7 @@ class Vector:
     """
     An immutable 2-dimensional or 3-dimensional vector.
     """
+    __slots__ = ('x', 'y', 'z')
 
     @staticmethod
     def normal(v1, v2, v3):
@@ -165,9 +173,18 @@ class Vector:
         Create a vector from 2 or 3 numbers, which are automatically converted
         to floats.
         """
-        self.x = toNumber(x)
-        self.y = toNumber(y)
-        self.z = toNumber(z)
+        self.x = float(x)
+        self.y = float(y)
+        self.z = float(z)
+
+    def __reduce__(self):
+        return (Vector, (self.x, self.y, self.z))
+
+    def __setstate__(self, state):
+        # Vectors pickled before __slots__ was used have a dictionary
+        self.x = state['x']
+        self.y = state['y']
+        self.z = state['z']
 
     def __repr__(self):
         return tripleTupleToString(self.getTuple())
@@ -214,25 +231,25 @@ class Vector:
         """
         Return a copy of this vector with a new x value.
         """
-        return Vector(newX, self.y, self.z)
+        return _vector(float(newX), self.y, self.z)
 
     def setY(self, newY):
         """
         Return a copy of this vector with a new y value.
         """
-        return Vector(self.x, newY, self.z)
+        return _vector(self.x, float(newY), self.z)
 
     def setZ(self, newZ):
         """
         Return a copy of this vector with a new z value.
         """
-        return Vector(self.x, self.y, newZ)
+        return _vector(self.x, self.y, float(newZ))
 
     def __neg__(self):
-        return Vector(-self.x, -self.y, -self.z)
+        return _vector(-self.x, -self.y, -self.z)
 
     def __add__(self, v):
-        return Vector(self.x + v.x, self.y + v.y, self.z + v.z)
+        return _vector(self.x + v.x, self.y + v.y, self.z + v.z)
 
     def __radd__(self, other):
         if other == 0:
@@ -241,30 +258,34 @@ class Vector:
             return self.__add__(other)
 
     def __sub__(self, v):
-        return Vector(self.x - v.x, self.y - v.y, self.z - v.z)
+        return _vector(self.x - v.x, self.y - v.y, self.z - v.z)
 
     def __mul__(self, v):
-        if isinstance(v, numbers.Number):
-            return Vector(self.x * v, self.y * v, self.z * v)
+        # checking for float first is much faster than numbers.Number
+        if type(v) is float or isinstance(v, numbers.Number):
+            v = float(v)
+            return _vector(self.x * v, self.y * v, self.z * v)
         else:
-            return Vector(self.x * v.x, self.y * v.y, self.z * v.z)
+            return _vector(self.x * v.x, self.y * v.y, self.z * v.z)
 
     def __rmul__(self, v):
         return self.__mul__(v)
 
     def __truediv__(self, v):
-        if isinstance(v, numbers.Number):
+        if type(v) is float or isinstance(v, numbers.Number):
             if isclose(v, 0):
                 raise ZeroDivisionError
-            return Vector(self.x / v, self.y / v, self.z / v)
+            v = float(v)
+            return _vector(self.x / v, self.y / v, self.z / v)
         else:
-            return Vector(self.x / v.x, self.y / v.y, self.z / v.z)
+            return _vector(self.x / v.x, self.y / v.y, self.z / v.z)
 
     def __rtruediv__(self, v):
         if isinstance(v, numbers.Number):
-            return Vector(v / self.x, v / self.y, v / self.z)
+            v = float(v)
+            return _vector(v / self.x, v / self.y, v / self.z)
         else:
-            return Vector(v.x / self.x, v.y / self.y, v.z / self.z / v.z)
+            return _vector(v.x / self.x, v.y / self.y, v.z / self.z / v.z)
 
     def dot(self, v):
         """
@@ -303,7 +324,7 @@ class Vector:
         newX = self.y * v.z - self.z * v.y
         newY = self.z * v.x - self.x * v.z
         newZ = self.x * v.y - self.y * v.x
-        return Vector(newX, newY, newZ)
+        return _vector(newX, newY, newZ)
 
     def lerp(self, v, amount):
         """
@@ -404,9 +425,9 @@ class Vector:
         """
         sinX = math.sin(amount)
         cosX = math.cos(amount)
-        return Vector( self.x * cosX - self.y * sinX,
+        return _vector(self.x * cosX - self.y * sinX,
                        self.y * cosX + self.x * sinX,
-                       self.z )
+                       self.z)
 
     def rotate2Around(self, amount, center):
         """
@@ -430,18 +451,18 @@ class Vector:
         """
         if isclose(self.z, 0):
             raise ZeroDivisionError
-        return Vector(self.x / self.z, self.y / self.z)
+        return _vector(self.x / self.z, self.y / self.z, 0.0)
 
     def rotation(self):
         """
         Get the direction of this 3d vector as a Rotation.
         The rotation will not have a "roll" or x-rotation component.
         """
-        xy = Vector(self.x, self.y)
-        xyz = Vector(xy.magnitude(), self.z)
-        yRot = xyz.direction2()
-        zRot = xy.direction2()
-        return Rotate(0, yRot, zRot)
+        # same as Vector(self.x, self.y).magnitude()
+        xyMagnitude = math.sqrt(self.x ** 2.0 + self.y ** 2.0 + 0.0)
+        yRot = fixRotation(math.atan2(self.z, xyMagnitude))
+        zRot = fixRotation(math.atan2(self.y, self.x))
+        return _rotate(0.0, yRot, zRot)
 
     def directionTowards(self, v):
         """
@@ -454,24 +475,20 @@ class Vector:
         """
         Return a copy of this vector rotated by the specified Rotate.
         """
-        v = self
+        # each axis is rotated like rotate2(), with the same operations
+        sinX, cosX, sinY, cosY, sinZ, cosZ = _rotationSines(amount)
+        x = self.x
+        y = self.y
+        z = self.z
 
         # roll (x)
-        xRot = Vector(v.y, v.z)
-        xRot = xRot.rotate2(amount.x)
-        v = Vector(v.x, xRot.x, xRot.y)
-
+        y, z = y * cosX - z * sinX, z * cosX + y * sinX
         # pitch (y)
-        yRot = Vector(v.x, v.z)
-        yRot = yRot.rotate2(amount.y)
-        v = Vector(yRot.x, v.y, yRot.y)
-
+        x, z = x * cosY - z * sinY, z * cosY + x * sinY
         # yaw (z)
-        zRot = Vector(v.x, v.y)
-        zRot = zRot.rotate2(amount.z)
-        v = Vector(zRot.x, zRot.y, v.z)
+        x, y = x * cosZ - y * sinZ, y * cosZ + x * sinZ
 
-        return v
+        return _vector(x, y, z)
 
     def inverseRotate(self, amount):
         """
@@ -481,24 +498,19 @@ class Vector:
         opposite order. This is useful for undoing rotations;
         ``vector.rotate(r).inverseRotate(-r)`` returns the original vector.
         """
-        v = self
+        sinX, cosX, sinY, cosY, sinZ, cosZ = _rotationSines(amount)
+        x = self.x
+        y = self.y
+        z = self.z
 
         # yaw (z)
-        zRot = Vector(v.x, v.y)
-        zRot = zRot.rotate2(amount.z)
-        v = Vector(zRot.x, zRot.y, v.z)
-
+        x, y = x * cosZ - y * sinZ, y * cosZ + x * sinZ
         # pitch (y)
-        yRot = Vector(v.x, v.z)
-        yRot = yRot.rotate2(amount.y)
-        v = Vector(yRot.x, v.y, yRot.y)
-
+        x, z = x * cosY - z * sinY, z * cosY + x * sinY
         # roll (x)
-        xRot = Vector(v.y, v.z)
-        xRot = xRot.rotate2(amount.x)
-        v = Vector(v.x, xRot.x, xRot.y)
+        y, z = y * cosX - z * sinX, z * cosX + y * sinX
 
-        return v
+        return _vector(x, y, z)
 
     def rotateAround(self, amount, center):
         """
@@ -518,6 +530,8 @@ class Rotate:
     """
     An immutable rotation in 3d space.
     """
+    # _sines and _matrix are calculated when they are first needed
+    __slots__ = ('x', 'y', 'z', '_sines', '_matrix')
 
     @staticmethod
     def fromTuple(t):
@@ -538,6 +552,15 @@ class Rotate:
         self.y = fixRotation(y)
         self.z = fixRotation(z)
 
+    def __reduce__(self):
+        return (Rotate, (self.x, self.y, self.z))
+
+    def __setstate__(self, state):
+        # Rotates pickled before __slots__ was used have a dictionary
+        self.x = state['x']
+        self.y = state['y']
+        self.z = state['z']
+
     def __repr__(self):
         return tripleTupleToString(self.getDegreesTuple())
 
@@ -566,6 +589,96 @@ class Rotate:
         """
         return self.x, self.y, self.z
 
+    def getSines(self):
+        """
+        Get a tuple of the sine and cosine of the rotation around each axis:
+        (sin x, cos x, sin y, cos y, sin z, cos z). They are only calculated
+        once for each Rotate.
+        """
+        try:
+            return self._sines
+        except AttributeError:
+            self._sines = (math.sin(self.x), math.cos(self.x),
+                           math.sin(self.y), math.cos(self.y),
+                           math.sin(self.z), math.cos(self.z))
+            return self._sines
+
+    def toMatrix(self):
+        """
+        Get a Matrix3 that rotates Vectors like ``Vector.rotate(self)``, within
+        floating point rounding error. It is only calculated once for each
+        Rotate.
+        """
+        try:
+            return self._matrix
+        except AttributeError:
+            x = BASE_ROTATION_V.rotate(self)
+            y = Vector(0, 1, 0).rotate(self)
+            z = Vector(0, 0, 1).rotate(self)
+            # the rotated axes are the columns of the matrix
+            self._matrix = Matrix3(((x.x, y.x, z.x),
+                                    (x.y, y.y, z.y),
+                                    (x.z, y.z, z.z)))
+            return self._matrix
+
+    def rotateVectors(self, vectors):
+        """
+        Rotate a list of Vectors by this Rotate. Return a list of Vectors
+        exactly the same as ``[v.rotate(self) for v in vectors]``.
+        """
+        sinX, cosX, sinY, cosY, sinZ, cosZ = self.getSines()
+        rotated = [ ]
+        for v in vectors:
+            x = v.x
+            y = v.y
+            z = v.z
+            y, z = y * cosX - z * sinX, z * cosX + y * sinX
+            x, z = x * cosY - z * sinY, z * cosY + x * sinY
+            x, y = x * cosZ - y * sinZ, y * cosZ + x * sinZ
+            rotated.append(_vector(x, y, z))
+        return rotated
+
+    def inverseRotateVectors(self, vectors):
+        """
+        Return a list of Vectors exactly the same as
+        ``[v.inverseRotate(self) for v in vectors]``.
+        """
+        sinX, cosX, sinY, cosY, sinZ, cosZ = self.getSines()
+        rotated = [ ]
+        for v in vectors:
+            x = v.x
+            y = v.y
+            z = v.z
+            x, y = x * cosZ - y * sinZ, y * cosZ + x * sinZ
+            x, z = x * cosY - z * sinY, z * cosY + x * sinY
+            y, z = y * cosX - z * sinX, z * cosX + y * sinX
+            rotated.append(_vector(x, y, z))
+        return rotated
+
+    def rotateArray(self, points):
+        """
+        Rotate a (n, 3) NumPy array of points by this Rotate. The result is
+        exactly the same as ``Vector.rotate`` for each point.
+        """
+        sinX, cosX, sinY, cosY, sinZ, cosZ = self.getSines()
+        x, y, z = numpy.asarray(points, dtype=numpy.float64).T
+        y, z = y * cosX - z * sinX, z * cosX + y * sinX
+        x, z = x * cosY - z * sinY, z * cosY + x * sinY
+        x, y = x * cosZ - y * sinZ, y * cosZ + x * sinZ
+        return numpy.stack([x, y, z], axis=1)
+
+    def inverseRotateArray(self, points):
+        """
+        Like ``rotateArray``, but the same as ``Vector.inverseRotate`` for each
+        point.
+        """
+        sinX, cosX, sinY, cosY, sinZ, cosZ = self.getSines()
+        x, y, z = numpy.asarray(points, dtype=numpy.float64).T
+        x, y = x * cosZ - y * sinZ, y * cosZ + x * sinZ
+        x, z = x * cosY - z * sinY, z * cosY + x * sinY
+        y, z = y * cosX - z * sinX, z * cosX + y * sinX
+        return numpy.stack([x, y, z], axis=1)
+
     def getDegreesTuple(self):
         """
         Similar to ``getTuple()``, uses degrees instead of radians
@@ -591,19 +704,19 @@ class Rotate:
         """
         Return a copy of this Rotate with a new x value.
         """
-        return Rotate(newX, self.y, self.z)
+        return _rotate(fixRotation(newX), self.y, self.z)
 
     def setY(self, newY):
         """
         Return a copy of this Rotate with a new y value.
         """
-        return Rotate(self.x, newY, self.z)
+        return _rotate(self.x, fixRotation(newY), self.z)
 
     def setZ(self, newZ):
         """
         Return a copy of this Rotate with a new z value.
         """
-        return Rotate(self.x, self.y, newZ)
+        return _rotate(self.x, self.y, fixRotation(newZ))
 
     def __neg__(self):
         return Rotate(-self.x, -self.y, -self.z)
@@ -618,7 +731,7 @@ class Rotate:
             return self.__add__(other)
 
     def __sub__(self, v):
-        return Vector(self.x - v.x, self.y - v.y, self.z - v.z)
+        return _vector(self.x - v.x, self.y - v.y, self.z - v.z)
 
     def __mul__(self, v):
         if isinstance(v, numbers.Number):
@@ -665,6 +778,431 @@ class Rotate:
 
         return vector.rotation().setX(roll)
 
+class Matrix3:
+    """
+    An immutable 3x3 matrix, usually for rotation. Get the matrix for a Rotate
+    with ``Rotate.toMatrix()``. Multiplying a Matrix3 by a Vector transforms
+    the Vector; multiplying 2 matrices combines them, so that
+    ``(a * b) * v == a * (b * v)``.
+    """
+    __slots__ = ('rows', )
+
+    @staticmethod
+    def identity():
+        """
+        Get a matrix which doesn't change Vectors.
+        """
+        return IDENTITY_M
+
+    def __init__(self, rows):
+        """
+        Create a matrix from a tuple of 3 rows, each a tuple of 3 numbers.
+        """
+        self.rows = tuple(tuple(float(n) for n in row) for row in rows)
+
+    def __reduce__(self):
+        return (Matrix3, (self.rows, ))
+
+    def __repr__(self):
+        return ' / '.join(tripleTupleToString(row) for row in self.rows)
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return self.rows == other.rows
+        else:
+            return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def isClose(self, other):
+        """
+        Return True if the matrices are close enough that any differences are
+        probably a floating point math error.
+        """
+        for row, otherRow in zip(self.rows, other.rows):
+            for a, b in zip(row, otherRow):
+                if not isclose(a, b):
+                    return False
+        return True
+
+    def getTuple(self):
+        """
+        Return a tuple of the 3 rows, each a tuple of 3 numbers.
+        """
+        return self.rows
+
+    def getColumn(self, i):
+        """
+        Get a column of the matrix as a Vector. For a rotation matrix, this is
+        the direction that axis ``i`` points after rotation.
+        """
+        return _vector(self.rows[0][i], self.rows[1][i], self.rows[2][i])
+
+    def __mul__(self, other):
+        if isinstance(other, Matrix3):
+            columns = tuple(zip(*other.rows))
+            return _matrix(tuple(
+                tuple(row[0] * column[0] + row[1] * column[1]
+                      + row[2] * column[2] for column in columns)
+                for row in self.rows))
+        else:
+            return self.transform(other)
+
+    def transform(self, v):
+        """
+        Multiply a Vector by this matrix.
+        """
+        (a, b, c), (d, e, f), (g, h, i) = self.rows
+        return _vector(a * v.x + b * v.y + c * v.z,
+                       d * v.x + e * v.y + f * v.z,
+                       g * v.x + h * v.y + i * v.z)
+
+    def transformVectors(self, vectors):
+        """
+        Multiply a list of Vectors by this matrix. Return a list of Vectors.
+        """
+        (a, b, c), (d, e, f), (g, h, i) = self.rows
+        return [_vector(a * v.x + b * v.y + c * v.z,
+                        d * v.x + e * v.y + f * v.z,
+                        g * v.x + h * v.y + i * v.z) for v in vectors]
+
+    def transformArray(self, points):
+        """
+        Multiply a (n, 3) NumPy array of points by this matrix. Return a
+        (n, 3) array.
+        """
+        return numpy.asarray(points, dtype=numpy.float64) \
+            @ numpy.array(self.rows).T
+
+    def transpose(self):
+        """
+        Swap the rows and columns of the matrix. For a rotation matrix, this is
+        the same as the inverse.
+        """
+        return _matrix(tuple(zip(*self.rows)))
+
+    def determinant(self):
+        (a, b, c), (d, e, f), (g, h, i) = self.rows
+        return a * (e * i - f * h) - b * (d * i - f * g) + c * (d * h - e * g)
+
+    def inverse(self):
+        """
+        Get the matrix that undoes this one. Raise a ZeroDivisionError if the
+        matrix has no inverse.
+        """
+        (a, b, c), (d, e, f), (g, h, i) = self.rows
+        det = self.determinant()
+        if isclose(det, 0):
+            raise ZeroDivisionError
+        return _matrix((((e * i - f * h) / det, (c * h - b * i) / det,
+                         (b * f - c * e) / det),
+                        ((f * g - d * i) / det, (a * i - c * g) / det,
+                         (c * d - a * f) / det),
+                        ((d * h - e * g) / det, (b * g - a * h) / det,
+                         (a * e - b * d) / det)))
+
+
+class VectorArray:
+    """
+    A list of Vectors stored as a (n, 3) NumPy array, for operating on many
+    points at once. Supports most of the same operations as Vector; each is
+    applied to every Vector in the array. Values that would be a single number
+    for a Vector (like ``dot`` or ``magnitude``) are NumPy arrays with one
+    value for each Vector.
+
+    The other operand of an operation can be a VectorArray of the same length,
+    a single Vector (applied to every Vector in the array), or a number. Don't
+    modify ``array`` directly; VectorArrays are treated as immutable like
+    Vectors.
+    """
+    __slots__ = ('array', )
+
+    @staticmethod
+    def fromVectors(vectors):
+        """
+        Create a VectorArray from a list of Vectors.
+        """
+        return VectorArray([v.getTuple() for v in vectors])
+
+    @staticmethod
+    def fromVertices(vertices):
+        """
+        Create a VectorArray of the positions of a list of MeshVertices.
+        """
+        return VectorArray([v.getPosition().getTuple() for v in vertices])
+
+    def __init__(self, points):
+        """
+        Create a VectorArray from a (n, 3) array, or a list of tuples of 3
+        numbers.
+        """
+        self.array = numpy.array(points, dtype=numpy.float64).reshape(-1, 3)
+
+    def __reduce__(self):
+        return (VectorArray, (self.array, ))
+
+    def __repr__(self):
+        return "VectorArray(" + ", ".join(
+            tripleTupleToString(t) for t in self.array.tolist()) + ")"
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, i):
+        """
+        Get a single Vector with an integer index, or a VectorArray with a
+        slice or NumPy index array.
+        """
+        if isinstance(i, numbers.Integral):
+            x, y, z = self.array[i].tolist()
+            return _vector(x, y, z)
+        return _vectorArray(self.array[i])
+
+    def __iter__(self):
+        return iter(self.toVectors())
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return numpy.array_equal(self.array, other.array)
+        else:
+            return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def isClose(self, other):
+        """
+        Return a NumPy array of bools, True for each Vector that is close
+        enough to the other that any differences are probably a floating point
+        math error. Uses the same tolerances as ``isclose``.
+        """
+        return numpy.all(iscloseArray(self.array, _arrayOperand(other)),
+                         axis=1)
+
+    def allClose(self, other):
+        """
+        Return True if every Vector is close to the other (see ``isClose``).
+        """
+        return bool(numpy.all(self.isClose(other)))
+
+    def toVectors(self):
+        """
+        Convert to a list of Vectors.
+        """
+        return [_vector(x, y, z) for x, y, z in self.array.tolist()]
+
+    def setVertexPositions(self, vertices):
+        """
+        Set the position of each MeshVertex in a list to the matching Vector.
+        """
+        for vertex, (x, y, z) in zip(vertices, self.array.tolist()):
+            vertex.setPosition(_vector(x, y, z))
+
+    def __neg__(self):
+        return _vectorArray(-self.array)
+
+    def __add__(self, v):
+        return _vectorArray(self.array + _arrayOperand(v))
+
+    def __radd__(self, v):
+        return self.__add__(v)
+
+    def __sub__(self, v):
+        return _vectorArray(self.array - _arrayOperand(v))
+
+    def __rsub__(self, v):
+        return _vectorArray(_arrayOperand(v) - self.array)
+
+    def __mul__(self, v):
+        return _vectorArray(self.array * _arrayOperand(v))
+
+    def __rmul__(self, v):
+        return self.__mul__(v)
+
+    def __truediv__(self, v):
+        v = _arrayOperand(v)
+        if numpy.any(iscloseArray(v, 0.0)):
+            raise ZeroDivisionError
+        return _vectorArray(self.array / v)
+
+    def dot(self, v):
+        """
+        Return an array of the dot product of each pair of vectors.
+        """
+        return numpy.sum(self.array * _arrayOperand(v), axis=1)
+
+    def cross(self, v):
+        """
+        Return the cross product of each pair of vectors.
+        """
+        return _vectorArray(numpy.cross(self.array, _arrayOperand(v)))
+
+    def project(self, v):
+        """
+        Project each vector onto another. Returns an array of numbers.
+        """
+        v = _arrayOperand(v)
+        vMag = _magnitudes(numpy.broadcast_to(v, self.array.shape))
+        zero = iscloseArray(vMag, 0.0)
+        vMag[zero] = 1.0
+        projected = numpy.sum(self.array * (v / vMag[:, None]), axis=1)
+        projected[zero] = 0.0
+        return projected
+
+    def projectOnPlane(self, normal):
+        """
+        Project each vector onto the plane with the given normal (or normals).
+
+        Magnitude of normal MUST be 1!
+        """
+        return _vectorArray(self.array - self.project(normal)[:, None]
+                            * _arrayOperand(normal))
+
+    def magnitude(self):
+        """
+        Return an array of the magnitude of each vector.
+        """
+        return _magnitudes(self.array)
+
+    def magnitudeSquare(self):
+        """
+        Return an array of the square of the magnitude of each vector.
+        """
+        return numpy.sum(self.array * self.array, axis=1)
+
+    def setMagnitude(self, newMag):
+        """
+        Change the magnitude of each vector, keeping the same direction.
+        Vectors close to zero are unchanged, like ``Vector.setMagnitude``.
+        """
+        currentMag = self.magnitude()
+        zero = iscloseArray(currentMag, 0.0)
+        currentMag[zero] = 1.0
+        factor = numpy.broadcast_to(
+            numpy.asarray(newMag, dtype=numpy.float64), currentMag.shape) \
+            / currentMag
+        factor[zero] = 1.0
+        return _vectorArray(self.array * factor[:, None])
+
+    def normalize(self):
+        """
+        Give each vector a magnitude of 1. Same as ``setMagnitude(1.0)``.
+        """
+        return self.setMagnitude(1.0)
+
+    def lerp(self, v, amount):
+        """
+        Interpolate from each vector to another, like ``Vector.lerp``.
+        """
+        return self + (_vectorArray(_arrayOperand(v) - self.array) * amount)
+
+    def distanceTo(self, v):
+        """
+        Return an array of the distance from each vector to another.
+        """
+        return _magnitudes(self.array - _arrayOperand(v))
+
+    def rotate(self, amount):
+        """
+        Rotate each vector by a Rotate. Exactly the same as ``Vector.rotate``.
+        """
+        return _vectorArray(amount.rotateArray(self.array))
+
+    def inverseRotate(self, amount):
+        """
+        Exactly the same as ``Vector.inverseRotate`` for each vector.
+        """
+        return _vectorArray(amount.inverseRotateArray(self.array))
+
+    def rotateAround(self, amount, center):
+        return (self - center).rotate(amount) + center
+
+    def transform(self, matrix):
+        """
+        Multiply each vector by a Matrix3.
+        """
+        return _vectorArray(matrix.transformArray(self.array))
+
+    def getBounds(self):
+        """
+        Get a tuple of 2 Vectors, the minimum and maximum of the coordinates.
+        The array must not be empty.
+        """
+        return (_vector(*self.array.min(axis=0).tolist()),
+                _vector(*self.array.max(axis=0).tolist()))
+
+
+def iscloseArray(a, b, rel_tol=ISCLOSE_REL_TOL, abs_tol=ISCLOSE_ABS_TOL):
+    """
+    ``isclose`` for each pair of numbers in two NumPy arrays (or an array and
+    a number). Returns an array of bools.
+    """
+    a = numpy.asarray(a, dtype=numpy.float64)
+    b = numpy.asarray(b, dtype=numpy.float64)
+    with numpy.errstate(invalid='ignore'):
+        diff = numpy.abs(b - a)
+        close = (diff <= numpy.abs(rel_tol * b)) \
+            | (diff <= numpy.abs(rel_tol * a)) | (diff <= abs_tol)
+    return (a == b) | (close & ~numpy.isinf(a) & ~numpy.isinf(b))
+
+def _arrayOperand(v):
+    # convert the other operand of a VectorArray operation to something that
+    # can be broadcast against a (n, 3) array
+    if isinstance(v, VectorArray):
+        return v.array
+    if isinstance(v, Vector):
+        return numpy.array((v.x, v.y, v.z))
+    if isinstance(v, numbers.Number):
+        return float(v)
+    v = numpy.asarray(v, dtype=numpy.float64)
+    if v.ndim == 1:
+        # one number for each vector
+        return v[:, None]
+    return v
+
+def _magnitudes(array):
+    return numpy.sqrt(numpy.sum(array * array, axis=1))
+
+def _vectorArray(array):
+    # create a VectorArray from a (n, 3) float64 array, without copying
+    a = _newObject(VectorArray)
+    a.array = array
+    return a
+
+def _rotationSines(rotate):
+    # sines and cosines of each axis, for Rotates or anything else with x, y
+    # and z values
+    if type(rotate) is Rotate:
+        return rotate.getSines()
+    return (math.sin(rotate.x), math.cos(rotate.x),
+            math.sin(rotate.y), math.cos(rotate.y),
+            math.sin(rotate.z), math.cos(rotate.z))
+
+_newObject = object.__new__
+
+def _vector(x, y, z):
+    # create a Vector from 3 floats, without converting them
+    v = _newObject(Vector)
+    v.x = x
+    v.y = y
+    v.z = z
+    return v
+
+def _matrix(rows):
+    # create a Matrix3 from a tuple of tuples of floats
+    m = _newObject(Matrix3)
+    m.rows = rows
+    return m
+
+def _rotate(x, y, z):
+    # create a Rotate from 3 floats which are already between 0 and 2pi
+    r = _newObject(Rotate)
+    r.x = x
+    r.y = y
+    r.z = z
+    return r
+
 ZERO_V = Vector(0, 0, 0)
 
 FORWARD_V = Vector(-1, 0, 0)
@@ -677,3 +1215,5 @@ UP_V = Vector(0, 0, 1)
 BASE_ROTATION_V = Vector(1, 0, 0)
 
 ZERO_R = Rotate(0, 0, 0)
+
+IDENTITY_M = Matrix3(((1, 0, 0), (0, 1, 0), (0, 0, 1)))
@@ -0,0 +1,61 @@
+__author__ = "jacobvanthoog"
+
+# run from the root directory with: python3 -m threelib.vectorMathBenchmark
+
+import timeit
+import numpy
+from threelib.vectorMath import Vector, Rotate, VectorArray
+
+
+def rotateEachAxis(v, r):
+    # the original rotate(), which used rotate2() for each axis
+    xRot = Vector(v.y, v.z).rotate2(r.x)
+    v = Vector(v.x, xRot.x, xRot.y)
+    yRot = Vector(v.x, v.z).rotate2(r.y)
+    v = Vector(yRot.x, v.y, yRot.y)
+    zRot = Vector(v.x, v.y).rotate2(r.z)
+    return Vector(zRot.x, zRot.y, v.z)
+
+def inverseRotateEachAxis(v, r):
+    zRot = Vector(v.x, v.y).rotate2(r.z)
+    v = Vector(zRot.x, zRot.y, v.z)
+    yRot = Vector(v.x, v.z).rotate2(r.y)
+    v = Vector(yRot.x, v.y, yRot.y)
+    xRot = Vector(v.y, v.z).rotate2(r.x)
+    return Vector(v.x, xRot.x, xRot.y)
+
+def benchmark(name, function, number=200000):
+    print("{:>24} {:8.4f}".format(name, timeit.timeit(function,
+                                                      number=number)))
+
+
+a = Vector(3, 4, 5)
+b = Vector(-1, 2.5, 8)
+c = Vector(2, -3, 0.5)
+r = Rotate(0.3, 1.2, -2.1)
+print("{:>24} {:>8}".format("200000 calls", "seconds"))
+benchmark("Vector()", lambda: Vector(1, 2, 3))
+benchmark("add", lambda: a + b)
+benchmark("multiply", lambda: a * 2.5)
+benchmark("cross", lambda: a.cross(b))
+benchmark("rotate", lambda: a.rotate(r))
+benchmark("rotate each axis", lambda: rotateEachAxis(a, r))
+benchmark("inverseRotate", lambda: a.inverseRotate(r))
+benchmark("inverseRotate each axis", lambda: inverseRotateEachAxis(a, r))
+benchmark("rotation", lambda: a.rotation())
+benchmark("matrix transform", lambda: r.toMatrix() * a)
+
+points = [Vector(i, i * 2, -i) for i in range(0, 1000)]
+array = numpy.array([p.getTuple() for p in points])
+print("{:>24} {:>8}".format("1000 points, 200 calls", "seconds"))
+benchmark("rotate each", lambda: [p.rotate(r) for p in points], 200)
+benchmark("rotateVectors", lambda: r.rotateVectors(points), 200)
+benchmark("rotateArray", lambda: r.rotateArray(array), 200)
+benchmark("transformArray", lambda: r.toMatrix().transformArray(array), 200)
+vectorArray = VectorArray(array)
+benchmark("cross each", lambda: [p.cross(c) for p in points], 200)
+benchmark("VectorArray cross", lambda: vectorArray.cross(c), 200)
+benchmark("normalize each", lambda: [p.normalize() for p in points], 200)
+benchmark("VectorArray normalize", lambda: vectorArray.normalize(), 200)
+benchmark("VectorArray convert", lambda: VectorArray.fromVectors(points)
+          .toVectors(), 200)
@@ -2,6 +2,9 @@ __author__ = "jacobvanthoog"
 
 from vectorMath import Vector
 from vectorMath import Rotate
+from vectorMath import Matrix3
+from vectorMath import VectorArray
+from vectorMath import isclose, iscloseArray
 import math
 
 # test constructors and basic operations
@@ -78,7 +81,158 @@ a = a + b
 assert round(math.degrees(b.direction2Towards(a))) == 30
 assert round(math.degrees(a.direction2Towards(b))) == 30 + 180
 
-
-
+# test 3d rotations
+
+def rotateEachAxis(v, r):
+    # the original rotate(), which used rotate2() for each axis
+    xRot = Vector(v.y, v.z).rotate2(r.x)
+    v = Vector(v.x, xRot.x, xRot.y)
+    yRot = Vector(v.x, v.z).rotate2(r.y)
+    v = Vector(yRot.x, v.y, yRot.y)
+    zRot = Vector(v.x, v.y).rotate2(r.z)
+    return Vector(zRot.x, zRot.y, v.z)
+
+def inverseRotateEachAxis(v, r):
+    zRot = Vector(v.x, v.y).rotate2(r.z)
+    v = Vector(zRot.x, zRot.y, v.z)
+    yRot = Vector(v.x, v.z).rotate2(r.y)
+    v = Vector(yRot.x, v.y, yRot.y)
+    xRot = Vector(v.y, v.z).rotate2(r.x)
+    return Vector(v.x, xRot.x, xRot.y)
+
+for i in range(0, 100):
+    a = Vector(math.sin(i) * 100, math.cos(i * 3) * 10, i - 50)
+    r = Rotate(i * 0.7, i * -1.3, i * 2.9)
+    assert a.rotate(r) == rotateEachAxis(a, r)
+    assert a.inverseRotate(r) == inverseRotateEachAxis(a, r)
+    assert a.rotate(r).inverseRotate(-r).isClose(a)
+
+a = Vector(0, 0, 1).rotation()
+assert a.x == 0 and round(math.degrees(a.y)) == 90 and a.z == 0
+a = Rotate(-math.pi / 2, 0, math.pi * 5).setY(-math.pi)
+assert a.isClose(Rotate(math.pi * 1.5, math.pi, math.pi))
+
+# test rotation matrices and bulk rotation
+
+import numpy
+
+points = [Vector(math.sin(i) * 100, math.cos(i * 3) * 10, i - 50)
+          for i in range(0, 20)]
+for i in range(0, 20):
+    r = Rotate(i * 0.7, i * -1.3, i * 2.9)
+    assert r.rotateVectors(points) == [p.rotate(r) for p in points]
+    assert r.inverseRotateVectors(points) == [p.inverseRotate(r)
+                                              for p in points]
+    array = numpy.array([p.getTuple() for p in points])
+    assert r.rotateArray(array).tolist() == \
+        [list(p.rotate(r).getTuple()) for p in points]
+    assert r.inverseRotateArray(array).tolist() == \
+        [list(p.inverseRotate(r).getTuple()) for p in points]
+
+    m = r.toMatrix()
+    assert r.toMatrix() is m
+    assert abs(m.determinant() - 1) < 1e-9
+    assert m.inverse().isClose(m.transpose())
+    for p in points:
+        assert (m * p).isClose(p.rotate(r))
+        assert (m.transpose() * p.rotate(r)).isClose(p)
+    for p, q in zip(m.transformVectors(points), m.transformArray(array)):
+        assert p.isClose(Vector(*q))
+
+    r2 = Rotate(i * -0.4, i * 0.9, 1)
+    combined = r2.toMatrix() * m
+    for p in points:
+        assert (combined * p).isClose(p.rotate(r).rotate(r2))
+    assert (m * m.inverse()).isClose(Matrix3.identity())
+
+a = Matrix3(((2, 0, 0), (0, 4, 0), (1, 0, 0.5)))
+assert a.determinant() == 4
+assert (a * a.inverse()).isClose(Matrix3.identity())
+assert a * Vector(1, 2, 3) == Vector(2, 8, 2.5)
+assert a.getColumn(0) == Vector(2, 0, 1)
+try:
+    Matrix3(((1, 2, 3), (2, 4, 6), (0, 0, 1))).inverse()
+    assert False
+except ZeroDivisionError:
+    pass
+
+# test VectorArray
+
+vectors = [Vector(math.sin(i) * 100, math.cos(i * 3) * 10, i - 10)
+           for i in range(0, 20)] + [Vector(0, 0, 0)]
+others = [Vector(i * 0.5, -i, 3) for i in range(0, 21)]
+a = VectorArray.fromVectors(vectors)
+b = VectorArray.fromVectors(others)
+c = Vector(2, -3, 0.5)
+r = Rotate(0.3, 1.2, -2.1)
+n = Vector(1, 2, 2).normalize()
+
+def allClose(array, vectorList):
+    return len(array) == len(vectorList) and all(
+        p.isClose(q) for p, q in zip(array.toVectors(), vectorList))
+
+assert len(a) == 21 and a.toVectors() == vectors and list(a) == vectors
+assert a[3] == vectors[3] and a[2:5].toVectors() == vectors[2:5]
+assert a == VectorArray.fromVectors(vectors) and a != b
+assert (a + b).toVectors() == [p + q for p, q in zip(vectors, others)]
+assert (a - c).toVectors() == [p - c for p in vectors]
+assert (-a).toVectors() == [-p for p in vectors]
+assert (a * 2.5).toVectors() == [p * 2.5 for p in vectors]
+assert (2.5 * a).toVectors() == [p * 2.5 for p in vectors]
+assert (a * c).toVectors() == [p * c for p in vectors]
+assert (a / 4).toVectors() == [p / 4 for p in vectors]
+assert sum(vectors) == Vector(*a.array.sum(axis=0))
+try:
+    a / 0
+    assert False
+except ZeroDivisionError:
+    pass
+assert a.dot(b).tolist() == [p.dot(q) for p, q in zip(vectors, others)]
+assert a.cross(c).toVectors() == [p.cross(c) for p in vectors]
+assert all(isclose(m, p.magnitude())
+           for m, p in zip(a.magnitude(), vectors))
+assert allClose(a.normalize(), [p.normalize() for p in vectors])
+assert allClose(a.setMagnitude(3), [p.setMagnitude(3) for p in vectors])
+assert all(isclose(d, p.project(q))
+           for d, p, q in zip(a.project(b), vectors, others))
+assert allClose(a.projectOnPlane(n), [p.projectOnPlane(n) for p in vectors])
+assert allClose(a.lerp(b, 0.25), [p.lerp(q, 0.25)
+                                  for p, q in zip(vectors, others)])
+assert a.rotate(r).toVectors() == [p.rotate(r) for p in vectors]
+assert a.inverseRotate(r).toVectors() == [p.inverseRotate(r) for p in vectors]
+assert allClose(a.rotateAround(r, c), [p.rotateAround(r, c) for p in vectors])
+assert allClose(a.transform(r.toMatrix()), [p.rotate(r) for p in vectors])
+assert a.getBounds() == (Vector(*a.array.min(axis=0)),
+                         Vector(*a.array.max(axis=0)))
+assert a.isClose(a + 1e-12).all() and a.allClose(a.rotate(r).inverseRotate(-r))
+assert a.isClose(b).tolist() == [p.isClose(q) for p, q in zip(vectors, others)]
+
+numbers = [0.0, 1e-10, -1e-10, 1.0, 1.0 + 1e-10, 1.0 + 1e-8, 1e12,
+           1e12 + 100, 1e12 + 1000, math.inf, -math.inf]
+for x in numbers:
+    assert iscloseArray(numbers, x).tolist() == \
+        [isclose(y, x) for y in numbers]
+
+# test pickling
+
+import pickle
+
+a = Vector(1.5, -2, 3)
+r = Rotate(1, 2, 3)
+assert pickle.loads(pickle.dumps((a, r))) == (a, r)
+assert not hasattr(a, '__dict__') and not hasattr(r, '__dict__')
+# pickled with protocols 2 and 0, before Vector and Rotate used __slots__
+oldPickles = [b'\x80\x02cvectorMath\nVector\nq\x00)\x81q\x01}q\x02(X\x01\x00\x00'
+    b'\x00xq\x03G?\xf8\x00\x00\x00\x00\x00\x00X\x01\x00\x00\x00yq\x04G\xc0\x00'
+    b'\x00\x00\x00\x00\x00\x00X\x01\x00\x00\x00zq\x05G@\x08\x00\x00\x00\x00\x00'
+    b'\x00ubcvectorMath\nRotate\nq\x06)\x81q\x07}q\x08(h\x03G?\xf0\x00\x00\x00'
+    b'\x00\x00\x00h\x04G@\x00\x00\x00\x00\x00\x00\x00h\x05G@\x08\x00\x00\x00'
+    b'\x00\x00\x00ub\x86q\t.',
+    b'(ccopy_reg\n_reconstructor\np0\n(cvectorMath\nVector\np1\nc__builtin__'
+    b'\nobject\np2\nNtp3\nRp4\n(dp5\nVx\np6\nF1.5\nsVy\np7\nF-2.0\nsVz\np8'
+    b'\nF3.0\nsbg0\n(cvectorMath\nRotate\np9\ng2\nNtp10\nRp11\n(dp12\ng6\nF1.0'
+    b'\nsg7\nF2.0\nsg8\nF3.0\nsbtp13\n.']
+for data in oldPickles:
+    assert pickle.loads(data) == (a, r)
 
 print("Done.")
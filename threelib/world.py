@@ -1,9 +1,14 @@
 __author__ = "jacobvanthoog"
 
+import math
+import numpy
 from threelib.sim.base import Simulator
 from threelib.sim.base import Entity
+from threelib.sim.lighting import PositionalLight
 import threelib.script
 from threelib.mesh import *
+from threelib.compactMesh import CompactMesh
+from threelib.vectorMath import ISCLOSE_ABS_TOL
 
 class World:
     """
@@ -188,15 +193,20 @@ class World:
         if not type(objects).__name__ == 'list':
             objects = [objects]
 
-        numRenderMeshes = len(self.renderMeshes) # before more are added
+        # lights that were already in the world
+        numLights = len(self.positionalLights) + len(self.spotLights)
 
         objectEntities = {}
+        objectRenderMeshes = [ ] # tuples of (editor object, RenderMesh)
 
         for o in objects:
             if o.getTemplateName() != "" and createTemplates:
                 threelib.script.setVariableValue(o.getTemplateName(), o)
             else:
+                numRenderMeshes = len(self.renderMeshes)
                 objectEntities[o] = o.addToWorld(self)
+                for renderMesh in self.renderMeshes[numRenderMeshes:]:
+                    objectRenderMeshes.append((o, renderMesh))
 
         # add children
         for editorObject, entity in objectEntities.items():
@@ -216,14 +226,167 @@ class World:
                 len(self.spotLights) > 0:
             # subdivide renderMesh faces
             print("Subdividing faces...")
-            for renderMesh in self.renderMeshes[numRenderMeshes:]:
-                mesh = renderMesh.getMesh().clone()
-                renderMesh.setMesh(mesh)
-                faces = list(
-                    mesh.getFaces())  # prevent problems as new faces are added
-                for face in faces:
-                    subdivideMeshFace(mesh, face, self.renderMeshSubdivideSize)
-                mesh.combineDuplicateVertices()
+            lights = self._staticLightBounds(objectEntities, numLights)
+            numTriangles = 0
+            savedTriangles = 0
+            for o, renderMesh in objectRenderMeshes:
+                mesh = CompactMesh.fromMesh(renderMesh.getMesh())
+                maxArea = self.renderMeshSubdivideSize
+                if lights is not None and o.isStatic():
+                    # only subdivide faces that can be lit
+                    lit = findLitFaces(mesh, [light.transformed(
+                        o.getPosition(), o.getRotation()) for light in lights])
+                    maxArea = numpy.where(lit, maxArea, numpy.inf)
+                    # estimated, because subdividing the faces that aren't
+                    # lit to count them would take as long as before
+                    savedTriangles += mesh.estimateTriangles(numpy.where(
+                        lit, numpy.inf, self.renderMeshSubdivideSize)) \
+                        - mesh.countTriangles()
+                mesh = mesh.subdivide(maxArea)
+                numTriangles += mesh.countTriangles()
+                renderMesh.setMesh(mesh.toMesh())
+            print(numTriangles, "triangles after subdividing, about",
+                  savedTriangles, "saved for faces that lights can't reach")
+
+    def _staticLightBounds(self, objectEntities, numLights):
+        # LightBounds of all positional and spot lights in the world, or None
+        # if any of them could move or weren't created by editor objects
+        if numLights != 0:
+            return None # added before, no way to know where they will be
+        lights = [ ]
+        for o, entity in objectEntities.items():
+            if isinstance(entity, PositionalLight):
+                if not o.isStatic():
+                    return None
+                lights.append(o.getLightBounds())
+        if len(lights) != len(self.positionalLights) + len(self.spotLights):
+            return None # created by scripts
+        return lights
+
+
+class LightBounds:
+    """
+    The region that a positional or spot light can illuminate, used to find
+    faces that need to be subdivided for the lighting to look smooth.
+    """
+
+    # one step of an 8-bit color
+    MIN_INTENSITY = 1.0 / 256.0
+
+    def __init__(self, position, attenuation, colors, direction=None,
+                 cutoff=math.pi):
+        """
+        ``attenuation`` is a tuple of the (constant, linear, quadratic)
+        attenuation, ``colors`` is a tuple of the (ambient, diffuse, specular)
+        colors. A spot light has a ``direction`` Vector and a ``cutoff`` angle
+        in radians.
+        """
+        self.position = position
+        self.attenuation = attenuation
+        self.colors = colors
+        self.direction = direction
+        self.cutoff = cutoff
+
+    def transformed(self, position, rotation):
+        """
+        Get the LightBounds relative to an object with the given position and
+        rotation.
+        """
+        # objects are placed with Vector.rotate(rotation), which this undoes
+        direction = self.direction
+        if direction is not None:
+            direction = direction.inverseRotate(-rotation)
+        return LightBounds((self.position - position).inverseRotate(-rotation),
+                           self.attenuation, self.colors, direction,
+                           self.cutoff)
+
+    def reachesFaces(self, centers, radii, points, normals, deviations):
+        """
+        Check which faces the light could reach. Faces outside of the light's
+        range or spot cone, or facing away from a light with no ambient color,
+        can't be reached. The arguments are arrays with a row for each face:
+        the center and radius of its bounding sphere, a point on its plane, its
+        normal, and the largest distance of any vertex from the plane. Return
+        a boolean array.
+        """
+        position = numpy.array(self.position.getTuple())
+        toLight = position - centers
+        distances = numpy.sqrt(numpy.sum(toLight ** 2, axis=1))
+        nearest = numpy.maximum(distances - radii, 0.0)
+        constant, linear, quadratic = self.attenuation
+        ambient, diffuse, specular = self.colors
+        intensity = max(ambient) + max(diffuse) + max(specular)
+        attenuation = constant + linear * nearest \
+            + quadratic * nearest * nearest
+        reached = attenuation * LightBounds.MIN_INTENSITY <= intensity
+
+        if max(ambient) <= 0:
+            # the light is behind the plane of the face at every vertex
+            planeDistances = numpy.sum(normals * (position - points), axis=1)
+            reached &= planeDistances >= -deviations - ISCLOSE_ABS_TOL
+
+        if self.direction is not None and self.cutoff < math.pi:
+            direction = numpy.array(self.direction.getTuple())
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                angles = numpy.arccos(numpy.clip(
+                    -numpy.sum(toLight * direction, axis=1) / distances,
+                    -1.0, 1.0))
+                sphereAngles = numpy.arcsin(numpy.clip(radii / distances,
+                                                       0.0, 1.0))
+            reached &= (distances <= radii) \
+                | (angles - sphereAngles <= self.cutoff)
+
+        return reached
+
+
+def findLitFaces(compactMesh, lights):
+    """
+    Return a boolean array of which faces of a CompactMesh could be reached by
+    any of a list of LightBounds (see ``LightBounds.reachesFaces``). Faces with
+    fewer than 3 vertices are always False.
+    """
+    sizes = compactMesh.getFaceSizes()
+    lit = numpy.zeros(len(sizes), dtype=bool)
+    if len(lights) == 0 or numpy.all(sizes < 3):
+        return lit
+    nonEmpty = sizes > 0
+    starts = compactMesh.faceOffsets[:-1][nonEmpty]
+    cornerPositions = compactMesh.getCornerPositions()
+    cornerFaces = compactMesh.getCornerFaces()
+
+    # bounding spheres
+    centers = numpy.zeros((len(sizes), 3))
+    centers[nonEmpty] = (numpy.minimum.reduceat(cornerPositions, starts)
+        + numpy.maximum.reduceat(cornerPositions, starts)) / 2
+    radii = numpy.zeros(len(sizes))
+    radii[nonEmpty] = numpy.maximum.reduceat(numpy.sqrt(numpy.sum(
+        (cornerPositions - centers[cornerFaces]) ** 2, axis=1)), starts)
+
+    # planes
+    points = numpy.zeros((len(sizes), 3))
+    normals = numpy.zeros((len(sizes), 3))
+    faces = numpy.nonzero(sizes >= 3)[0]
+    faceStarts = compactMesh.faceOffsets[faces]
+    points[faces] = cornerPositions[faceStarts]
+    normals[faces] = calculateNormalArrays(points[faces],
+                                           cornerPositions[faceStarts + 1],
+                                           cornerPositions[faceStarts + 2])
+    deviations = numpy.zeros(len(sizes))
+    deviations[nonEmpty] = numpy.maximum.reduceat(numpy.abs(numpy.sum(
+        normals[cornerFaces] * (cornerPositions - points[cornerFaces]),
+        axis=1)), starts)
+
+    centers = centers[faces]
+    radii = radii[faces]
+    points = points[faces]
+    normals = normals[faces]
+    deviations = deviations[faces]
+    faceLit = numpy.zeros(len(faces), dtype=bool)
+    for light in lights:
+        faceLit |= light.reachesFaces(centers, radii, points, normals,
+                                      deviations)
+    lit[faces] = faceLit
+    return lit
 
 
 class Resource:
@@ -290,6 +453,14 @@ def buildWorld(editorState):
         world.camera = Entity()
         world.simulator.addObject(world.camera)
 
+def subdivideMesh(mesh, maxSize):
+    """
+    Create a copy of the mesh with faces split into triangles no larger than
+    ``maxSize`` (see ``CompactMesh.subdivide``). The original mesh is not
+    changed. Much faster than calling ``subdivideMeshFace`` for every face.
+    """
+    return CompactMesh.fromMesh(mesh).subdivide(maxSize).toMesh()
+
 def subdivideMeshFace(mesh, face, maxSize):
     area = face.getArea()
     if area > maxSize: